@@ -0,0 +1,44 @@
+"""
+Runtime of the revenue per visitor bootstrap.
+
+Generates lognormal order values (rounded to cents) for a control and a variant and times bootstrap_rpv with
+an increasing number of worker processes. The resampled statistics are the same for every number of workers.
+
+Run it from the repository root:
+    python benchmarks/bootstrap.py
+    python benchmarks/bootstrap.py --orders 1000000 --visitors 10000000 --resamples 10000 --workers 1 4 8
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from modules.bootstrap_functions import bootstrap_rpv
+from modules.bootstrap_functions import revenue_value_counts
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Runtime of the revenue per visitor bootstrap.')
+    parser.add_argument('--orders', type = int, default = 1_000_000, help = 'Orders per group (default: 1000000)')
+    parser.add_argument('--visitors', type = int, default = 10_000_000, help = 'Visitors per group (default: 10000000)')
+    parser.add_argument('--resamples', type = int, default = 10_000, help = 'Bootstrap resamples (default: 10000)')
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, os.cpu_count() or 1], help = 'Numbers of worker processes to time (default: 1 and all CPUs)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    control = revenue_value_counts(rng.lognormal(3.0, 1.0, args.orders))
+    variant = revenue_value_counts(rng.lognormal(3.02, 1.0, args.orders))
+    print(f'compress {args.orders} orders per group: {time.perf_counter() - start:.2f} s '
+          f'({control[0].size} and {variant[0].size} unique values)')
+
+    for num_workers in sorted(set(args.workers)):
+        result = bootstrap_rpv(*control, args.visitors, *variant, args.visitors, num_resamples = args.resamples, num_workers = num_workers)
+        print(f'{result.num_workers:>3} worker(s): {result.seconds:7.2f} s  '
+              f'diff {result.diff:.4f}  CI [{result.ci_low:.4f}, {result.ci_high:.4f}]  p-value {result.pvalue:.4f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Cold-start benchmark of the Streamlit pages.
+
+Every page is run in a fresh Python process with Streamlit's AppTest: the home page is run first (Streamlit and
+the shared modules are loaded), then the timer measures switching to the page and running it, which includes all
+imports done by the page. The heavy dependencies loaded by the run are listed next to the time.
+
+Run it from the repository root:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --repeat 5 --output import_time.json
+    python benchmarks/import_time.py --baseline import_time.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAIN_SCRIPT = 'streamlit_app.py'
+HEAVY_MODULES = ['pandas', 'scipy.stats', 'statsmodels', 'htbuilder', 'matplotlib']
+
+def run_page(page):
+    # Runs in the child process
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(REPO_ROOT)
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(REPO_ROOT, MAIN_SCRIPT), default_timeout = 60)
+    if page == MAIN_SCRIPT:
+        before = set(sys.modules)
+        start = time.perf_counter()
+        at.run()
+    else:
+        at.run()
+        before = set(sys.modules)
+        start = time.perf_counter()
+        at.switch_page(page)
+        at.run()
+    elapsed = time.perf_counter() - start
+    loaded = [module for module in HEAVY_MODULES if module in sys.modules and module not in before]
+    print(json.dumps({'seconds' : elapsed, 'loaded' : loaded, 'exception' : len(at.exception) > 0}))
+
+def measure(page, repeat):
+    runs = []
+    for i in range(repeat):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--child', page]
+            , capture_output = True
+            , text = True
+            , check = True
+            , cwd = REPO_ROOT
+            )
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    return {
+        'seconds' : statistics.median(run['seconds'] for run in runs)
+        , 'loaded' : runs[-1]['loaded']
+        , 'exception' : any(run['exception'] for run in runs)
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Cold-start time per Streamlit page.')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'Fresh processes per page, the median is reported (default: 3)')
+    parser.add_argument('--output', default = None, help = 'Write the results as json to this file')
+    parser.add_argument('--baseline', default = None, help = 'json file of an earlier run to compare with')
+    parser.add_argument('--child', default = None, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_page(args.child)
+        return
+
+    pages = [MAIN_SCRIPT] + sorted(os.path.relpath(path, REPO_ROOT) for path in glob.glob(os.path.join(REPO_ROOT, 'pages', '*.py')))
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline, encoding = 'utf-8') as file:
+            baseline = json.load(file)
+
+    results = {}
+    for page in pages:
+        results[page] = measure(page, args.repeat)
+        line = f"{page:<45} {results[page]['seconds'] * 1000:8.1f} ms"
+        if page in baseline:
+            change = (results[page]['seconds'] / baseline[page]['seconds'] - 1) * 100
+            line += f"  ({change:+.1f} % vs. baseline)"
+        line += f"  loaded: {', '.join(results[page]['loaded']) or '-'}"
+        if results[page]['exception']:
+            line += '  [page raised an exception]'
+        print(line)
+
+    if args.output is not None:
+        with open(args.output, 'w', encoding = 'utf-8') as file:
+            json.dump(results, file, indent = 2)
+
+if __name__ == '__main__':
+    main()
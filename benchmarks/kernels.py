@@ -0,0 +1,280 @@
+"""
+Wall time and peak memory of the statistics kernels.
+
+Every kernel runs on synthetic data for a grid of visitors (10k to 50M) and variants (1 to 50). Kernels whose cost
+does not depend on the visitors (e.g. the closed-form MDE) only run for the first number of visitors, kernels whose
+cost does not depend on the variants only for the first number of variants. The data is generated before the timer
+starts. The wall time is the fastest of --repeat runs, the peak memory is measured with tracemalloc in one extra run
+(it sees the allocations of Python, NumPy and pandas, not those of Arrow).
+
+Run it from the repository root:
+    python benchmarks/kernels.py
+    python benchmarks/kernels.py --output benchmarks/baselines/kernels.json
+    python benchmarks/kernels.py --baseline my_kernels.json
+    python benchmarks/kernels.py --visitors 10000 1000000 50000000 --variants 1 10 50 --kernel rpv
+50M visitors need about 16 GB of memory for the visitor level kernels. The run is compared with the reference
+baseline in benchmarks/baselines/ unless --baseline names another file or --no-baseline is given. The exit code is 1
+if a kernel is slower or needs more memory than in the baseline, see report.py.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from report import default_baseline
+from report import load_results
+from report import print_environment
+from report import print_report
+from report import save_results
+
+CONVERSION_RATE = 0.03
+NUM_EXPERIMENTS = 100 # experiments in the table of the batch analysis
+
+## Synthetic data
+### Order values are log-normal and rounded to cents, like shop data. The pre-experiment revenue is correlated with
+### the revenue during the experiment, so CUPED has something to reduce.
+def variant_names(variants):
+    return ['Control'] + [f'Variant {i}' for i in range(1, variants + 1)]
+
+def make_orders(visitors, rng):
+    num_orders = max(2, int(visitors * CONVERSION_RATE))
+
+    return np.round(rng.lognormal(3.5, 1.0, num_orders), 2)
+
+def make_visitor_table(visitors, variants, rng):
+    import pandas as pd
+    converted = rng.random(visitors) < CONVERSION_RATE
+    pre_revenue = np.where(rng.random(visitors) < CONVERSION_RATE, np.round(rng.lognormal(3.5, 1.0, visitors), 2), 0.0)
+    revenue = np.where(converted, np.round(rng.lognormal(3.5, 1.0, visitors), 2), 0.0) + 0.5 * pre_revenue
+
+    return pd.DataFrame(
+        {'variant' : np.asarray(variant_names(variants))[rng.integers(0, variants + 1, visitors)]
+        , 'revenue' : revenue
+        , 'pre_revenue' : pre_revenue
+        })
+
+def make_assignments(visitors, variants, rng):
+    import pandas as pd
+    names = np.asarray(variant_names(variants))
+
+    return pd.DataFrame(
+        {'experiment_a' : names[rng.integers(0, variants + 1, visitors)]
+        , 'experiment_b' : names[rng.integers(0, variants + 1, visitors)]
+        , 'conversions' : (rng.random(visitors) < CONVERSION_RATE).astype(np.int64)
+        })
+
+def make_experiment_table(visitors, variants, rng):
+    import pandas as pd
+    arms = variants + 1
+    nobs = rng.multinomial(visitors, np.full(arms, 1 / arms), NUM_EXPERIMENTS).ravel()
+    conversions = rng.binomial(nobs, CONVERSION_RATE)
+    # Sums of log-normal orders with the moments of a single order
+    aov, aov_sq = np.exp(3.5 + 0.5), np.exp(2 * 3.5 + 2 * 1.0)
+
+    return pd.DataFrame(
+        {'experiment' : np.repeat([f'Experiment {i}' for i in range(NUM_EXPERIMENTS)], arms)
+        , 'variant' : np.tile(variant_names(variants), NUM_EXPERIMENTS)
+        , 'visitors' : nobs
+        , 'conversions' : conversions
+        , 'revenue_sum' : conversions * aov
+        , 'revenue_sum_sq' : conversions * aov_sq
+        })
+
+## Kernels
+### Every setup function generates the data and returns the function to time. The axes tell which sizes change the cost.
+def setup_mde_cr(visitors, variants, rng):
+    from modules.stat_functions import mde_curve
+    # One baseline per experiment of a portfolio, every day of a year
+    baselines = rng.uniform(0.005, 0.1, 10 * variants)
+
+    return lambda: mde_curve(visitors / 7, np.arange(1, 366), baselines, num_variants = variants)
+
+def setup_mde_cont(visitors, variants, rng):
+    from modules.stat_functions import mde_curve
+    means = rng.uniform(1.0, 5.0, 10 * variants)
+
+    return lambda: mde_curve(visitors / 7, np.arange(1, 366), means, std_dev = 4 * means, num_variants = variants)
+
+def setup_runtime_cr(visitors, variants, rng):
+    from modules.stat_functions import runtime_curve
+
+    return lambda: runtime_curve(visitors / 7, np.arange(0.005, 0.3, 0.0005), 0.03, num_variants = variants)
+
+def setup_check_numeric_columns(visitors, variants, rng):
+    import pandas as pd
+    from modules.stat_functions import check_numeric_columns
+    # Text, as read from a file with a non-numeric cell, so every value has to be parsed
+    orders = pd.DataFrame({'revenue' : make_orders(visitors, rng).astype(str).astype(object)})
+
+    return lambda: check_numeric_columns(orders, [0])
+
+def setup_validate_revenue(visitors, variants, rng):
+    import pandas as pd
+    from modules.stat_functions import validate_revenue
+    orders = pd.Series(make_orders(visitors, rng))
+
+    return lambda: validate_revenue(orders)
+
+def setup_stream_revenue_csv(visitors, variants, rng):
+    from modules.stat_functions import stream_revenue_csv
+    content = ('revenue\n' + '\n'.join(map(str, make_orders(visitors, rng))) + '\n').encode()
+
+    return lambda: stream_revenue_csv(io.BytesIO(content))
+
+def setup_rpv(visitors, variants, rng):
+    from modules.stat_functions import revenue_sufficient_stats
+    from modules.stat_functions import rpv_stats
+    orders = make_orders(visitors, rng)
+    def kernel():
+        num_orders, revenue_sum, revenue_sum_sq = revenue_sufficient_stats(orders)
+        return rpv_stats(visitors, revenue_sum, revenue_sum_sq, num_orders)
+
+    return kernel
+
+def setup_rpv_zero_padding(visitors, variants, rng):
+    # Reference: the revenue per visitor as it was calculated before the sufficient statistics, one 0 per visitor without an order
+    orders = make_orders(visitors, rng)
+    def kernel():
+        padded = np.concatenate([orders, np.zeros(visitors - orders.size)])
+        return padded.mean(), padded.var(ddof = 1)
+
+    return kernel
+
+def setup_revenue_sketch(visitors, variants, rng):
+    from modules.winsor_functions import revenue_sketch
+    from modules.winsor_functions import sketch_quantile
+    orders = make_orders(visitors, rng)
+
+    return lambda: sketch_quantile(revenue_sketch(orders), 99)
+
+def setup_srm_chisquare(visitors, variants, rng):
+    from modules.srm_functions import srm_test
+    arms = variants + 1
+    counts = rng.multinomial(visitors, np.full(arms, 1 / arms), NUM_EXPERIMENTS)
+
+    return lambda: srm_test(counts, method = 'chisquare')
+
+def setup_interaction_chisquare(visitors, variants, rng):
+    from modules.interaction_functions import detect_interactions
+    assignments = make_assignments(visitors, variants, rng)
+
+    return lambda: detect_interactions(assignments, ['experiment_a', 'experiment_b'])
+
+def setup_analyse_experiments(visitors, variants, rng):
+    from modules.batch_functions import analyse_experiments
+    table = make_experiment_table(visitors, variants, rng)
+
+    return lambda: analyse_experiments(table)
+
+def setup_cuped(visitors, variants, rng):
+    from modules.cuped_functions import cuped_sufficient_stats
+    from modules.cuped_functions import cuped_test
+    table = make_visitor_table(visitors, variants, rng)
+
+    return lambda: cuped_test(cuped_sufficient_stats(table, 'revenue', 'pre_revenue', 'variant'))
+
+def setup_ratio(visitors, variants, rng):
+    from modules.ratio_functions import ratio_sufficient_stats
+    from modules.ratio_functions import ratio_test
+    table = make_visitor_table(visitors, variants, rng)
+    # Average order value: revenue / orders, every visitor with revenue has one order
+    table['orders'] = (table['revenue'] > 0).astype(np.int64)
+
+    return lambda: ratio_test(ratio_sufficient_stats(table, 'revenue', 'orders', 'variant'))
+
+def setup_bayes(visitors, variants, rng):
+    from modules.bayes_functions import bayes_test
+    # The visitors of every arm, so that every arm has orders
+    table = make_experiment_table(visitors * (variants + 1), variants, rng).head(variants + 1)
+
+    return lambda: bayes_test(table, metric = 'revenue_per_visitor')
+
+KERNELS = {
+    'mde_cr' : (setup_mde_cr, ['variants'])
+    , 'mde_cont' : (setup_mde_cont, ['variants'])
+    , 'runtime_cr' : (setup_runtime_cr, [])
+    , 'check_numeric_columns' : (setup_check_numeric_columns, ['visitors'])
+    , 'validate_revenue' : (setup_validate_revenue, ['visitors'])
+    , 'stream_revenue_csv' : (setup_stream_revenue_csv, ['visitors'])
+    , 'rpv_sufficient_stats' : (setup_rpv, ['visitors'])
+    , 'rpv_zero_padding' : (setup_rpv_zero_padding, ['visitors'])
+    , 'revenue_sketch' : (setup_revenue_sketch, ['visitors'])
+    , 'srm_chisquare' : (setup_srm_chisquare, ['variants'])
+    , 'interaction_chisquare' : (setup_interaction_chisquare, ['visitors', 'variants'])
+    , 'analyse_experiments' : (setup_analyse_experiments, ['variants'])
+    , 'cuped' : (setup_cuped, ['visitors', 'variants'])
+    , 'ratio' : (setup_ratio, ['visitors', 'variants'])
+    , 'bayes' : (setup_bayes, ['variants'])
+    }
+
+def measure(kernel, repeat):
+    """
+    Measure the wall time and the peak memory of a kernel.
+
+    Parameters:
+    kernel (callable): Function without arguments
+    repeat (int): Number of timed runs, the fastest is reported
+
+    Returns:
+    dict: {'seconds' : float, 'peak_mib' : float}
+    """
+    kernel() # warm-up, e.g. lazy imports
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        kernel()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    kernel()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds' : min(seconds), 'peak_mib' : peak / 1024 ** 2}
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Wall time and peak memory of the statistics kernels.')
+    parser.add_argument('--visitors', type = int, nargs = '+', default = [10_000, 1_000_000], help = 'Visitors per run (default: 10000 1000000)')
+    parser.add_argument('--variants', type = int, nargs = '+', default = [1, 10, 50], help = 'Variants besides the control (default: 1 10 50)')
+    parser.add_argument('--kernel', nargs = '+', default = None, help = f"Kernels to run, a name or its start (default: all of {', '.join(KERNELS)})")
+    parser.add_argument('--repeat', type = int, default = 5, help = 'Timed runs per case, the fastest is reported (default: 5)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'Seed of the synthetic data (default: 0)')
+    parser.add_argument('--output', default = None, help = 'Write the results as json to this file, e.g. as a baseline')
+    parser.add_argument('--baseline', default = default_baseline('kernels'), help = 'json file of an earlier run to compare with (default: the reference in benchmarks/baselines/)')
+    parser.add_argument('--no-baseline', action = 'store_true', help = 'Do not compare with a baseline')
+    args = parser.parse_args()
+
+    kernels = [name for name in KERNELS if args.kernel is None or any(name.startswith(prefix) for prefix in args.kernel)]
+    if not kernels:
+        parser.error(f"no kernel matches {', '.join(args.kernel)}")
+    baseline, baseline_environment = load_results(None if args.no_baseline else args.baseline)
+    print_environment(baseline_environment)
+
+    results = {}
+    for name in kernels:
+        setup, axes = KERNELS[name]
+        for visitors in (args.visitors if 'visitors' in axes else args.visitors[:1]):
+            for variants in (args.variants if 'variants' in axes else args.variants[:1]):
+                case = f'{name} (visitors={visitors}, variants={variants})'
+                kernel = setup(visitors, variants, np.random.default_rng(args.seed))
+                results[case] = measure(kernel, args.repeat)
+                del kernel
+                # Printed as it runs, the large cases take a while
+                print(f"{case:<58} {results[case]['seconds'] * 1000:10.2f} ms {results[case]['peak_mib']:10.1f} MiB", flush = True)
+
+    if baseline:
+        print('\nCompared with the baseline:')
+        num_regressions = print_report(results, baseline)
+    else:
+        num_regressions = 0
+    save_results(results, args.output)
+    sys.exit(1 if num_regressions > 0 else 0)
+
+if __name__ == '__main__':
+    main()
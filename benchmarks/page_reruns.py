@@ -0,0 +1,133 @@
+"""
+Rerun time of the Streamlit pages.
+
+Streamlit runs the whole page again on every widget interaction, so the rerun time is what a user waits for after
+changing e.g. the power. Every scenario opens a page with Streamlit's AppTest (through the home page, like the
+navigation does), fills in its inputs and runs it once, so imports and caches are warm. Then the page is rerun
+--repeat times; the median wall time is reported, the peak memory of one rerun is measured with tracemalloc.
+File uploads can not be set through AppTest, the pages run without uploaded data.
+
+Run it from the repository root:
+    python benchmarks/page_reruns.py
+    python benchmarks/page_reruns.py --output benchmarks/baselines/page_reruns.json
+    python benchmarks/page_reruns.py --baseline my_page_reruns.json
+The run is compared with the reference baseline in benchmarks/baselines/ unless --baseline names another file or
+--no-baseline is given. The exit code is 1 if a scenario is slower or needs more memory than in the baseline, see report.py.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from report import default_baseline
+from report import load_results
+from report import print_environment
+from report import print_report
+from report import save_results
+
+MAIN_SCRIPT = 'streamlit_app.py'
+
+## Scenarios
+### Page, and the inputs to fill in as (widget type, label, index among the widgets with this label, value)
+SCENARIOS = {
+    'home' : (MAIN_SCRIPT, [])
+    , 'mde empty' : ('pages/1_MDE ⏳.py', [])
+    , 'mde conversion rate' : ('pages/1_MDE ⏳.py', [
+        ('number_input', 'Average weekly visitors', 0, 20_000)
+        , ('number_input', 'Average weekly conversions', 0, 600)
+        , ('number_input', 'Maximum runtime (weeks)', 0, 52)
+        ])
+    , 'mde conversion rate simulated' : ('pages/1_MDE ⏳.py', [
+        ('number_input', 'Average weekly visitors', 0, 20_000)
+        , ('number_input', 'Average weekly conversions', 0, 600)
+        , ('toggle', 'Check the MDE with a simulation', 0, True)
+        ])
+    , 'srm' : ('pages/2_SRM ⚖️.py', [
+        ('number_input', 'Visitors in Sample 1:', 0, 10_000)
+        , ('number_input', 'Visitors in Sample 2:', 0, 10_150)
+        ])
+    , 'interaction detector' : ('pages/3_Interaction detector 🕵️‍♀️.py', [])
+    , 'significance conversion rate' : ('pages/4_Statistical significance 🌟.py', [
+        ('number_input', 'Number of visitors', 0, 10_000)
+        , ('number_input', 'Number of orders', 0, 300)
+        , ('number_input', 'Number of visitors', 1, 10_100)
+        , ('number_input', 'Number of orders', 1, 350)
+        ])
+    , 'significance bayesian' : ('pages/4_Statistical significance 🌟.py', [
+        ('toggle', 'Show the probability to be best', 0, True)
+        ])
+    , 'faq' : ('pages/5_FAQ ❓.py', [])
+    , 'batch analysis' : ('pages/6_Batch analysis 🗂️.py', [])
+    }
+
+def open_page(page, inputs):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(os.path.join(REPO_ROOT, MAIN_SCRIPT), default_timeout = 120)
+    at.run()
+    if page != MAIN_SCRIPT:
+        at.switch_page(page)
+        at.run()
+    for widget_type, label, index, value in inputs:
+        widgets = [widget for widget in getattr(at, widget_type) if widget.label == label]
+        if len(widgets) <= index:
+            raise ValueError(f"{page} has no {widget_type} '{label}' number {index + 1}.")
+        widgets[index].set_value(value)
+        at.run()
+    if len(at.exception) > 0:
+        raise RuntimeError(f"{page} raised an exception: {at.exception[0].value}")
+
+    return at
+
+def measure(scenario, repeat):
+    """
+    Measure the rerun time and peak memory of a scenario.
+
+    Parameters:
+    scenario (str): Key of SCENARIOS
+    repeat (int): Number of timed reruns, the median is reported
+
+    Returns:
+    dict: {'seconds' : float, 'peak_mib' : float}
+    """
+    at = open_page(*SCENARIOS[scenario])
+    seconds = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        at.run()
+        seconds.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    at.run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds' : statistics.median(seconds), 'peak_mib' : peak / 1024 ** 2}
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Rerun time of the Streamlit pages.')
+    parser.add_argument('--scenario', nargs = '+', default = None, help = f"Scenarios to run, a name or its start (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument('--repeat', type = int, default = 10, help = 'Timed reruns per scenario, the median is reported (default: 10)')
+    parser.add_argument('--output', default = None, help = 'Write the results as json to this file, e.g. as a baseline')
+    parser.add_argument('--baseline', default = default_baseline('page_reruns'), help = 'json file of an earlier run to compare with (default: the reference in benchmarks/baselines/)')
+    parser.add_argument('--no-baseline', action = 'store_true', help = 'Do not compare with a baseline')
+    args = parser.parse_args()
+
+    scenarios = [name for name in SCENARIOS if args.scenario is None or any(name.startswith(prefix) for prefix in args.scenario)]
+    if not scenarios:
+        parser.error(f"no scenario matches {', '.join(args.scenario)}")
+    os.chdir(REPO_ROOT)
+
+    baseline, baseline_environment = load_results(None if args.no_baseline else args.baseline)
+    print_environment(baseline_environment)
+    results = {scenario : measure(scenario, args.repeat) for scenario in scenarios}
+    num_regressions = print_report(results, baseline)
+    save_results(results, args.output)
+    sys.exit(1 if num_regressions > 0 else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""
+Stored baselines and comparison report, shared by the benchmarks.
+
+Results are dictionaries of {case : {'seconds' : float, 'peak_mib' : float}}. A run is stored with --output and
+compared with an earlier run with --baseline. A case is a regression if it is slower (or needs more memory) than
+the baseline by more than the tolerance and by more than the noise floor.
+
+The reference baselines in baselines/ are compared with by default. They are stored together with the machine and
+the versions of Python and the libraries, which the report prints next to those of the current run: wall times
+only compare well on the same machine. After an intended change of the performance, store a new reference with
+--output baselines/<benchmark>.json.
+"""
+import json
+import os
+import platform
+
+TOLERANCE = 0.25 # relative change that counts as a regression
+MIN_SECONDS = 0.001 # smaller changes in wall time are noise
+MIN_MIB = 1.0 # smaller changes in peak memory are noise
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+def default_baseline(benchmark):
+    """
+    Path of the reference baseline of a benchmark.
+
+    Parameters:
+    benchmark (str): Name of the benchmark, e.g. 'kernels'
+
+    Returns:
+    str: Path of baselines/<benchmark>.json
+    """
+    return os.path.join(BASELINE_DIR, f'{benchmark}.json')
+
+def environment():
+    """
+    Describe the machine and the software a benchmark runs on.
+
+    Returns:
+    dict: Machine, processor, number of CPUs, operating system and the versions of Python, NumPy, pandas, SciPy and Streamlit
+    """
+    from importlib import metadata
+    versions = {}
+    for package in ['numpy', 'pandas', 'scipy', 'streamlit']:
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+
+    return {
+        'machine' : platform.machine()
+        , 'processor' : platform.processor() or None
+        , 'cpu_count' : os.cpu_count()
+        , 'system' : platform.platform()
+        , 'python' : platform.python_version()
+        } | versions
+
+def load_results(path):
+    """
+    Read stored benchmark results.
+
+    Parameters:
+    path (str or None): json file written by save_results. None or a missing file returns no results
+
+    Returns:
+    tuple: (results per case, environment of the run, None if not stored)
+    """
+    if path is None or not os.path.exists(path):
+        return {}, None
+    with open(path, encoding = 'utf-8') as file:
+        stored = json.load(file)
+    if 'results' not in stored:
+        # Results stored without their environment
+        return stored, None
+
+    return stored['results'], stored.get('environment')
+
+def save_results(results, path):
+    """
+    Write benchmark results and their environment as json, e.g. as the baseline of later runs.
+
+    Parameters:
+    results (dict): Results per case
+    path (str or None): Output file. None does nothing
+    """
+    if path is None:
+        return
+    with open(path, 'w', encoding = 'utf-8') as file:
+        json.dump({'environment' : environment(), 'results' : results}, file, indent = 2)
+        file.write('\n')
+
+def print_environment(baseline_environment):
+    """
+    Print the environment of the baseline next to the current one, and warn about differences.
+
+    Parameters:
+    baseline_environment (dict or None): Environment stored with the baseline
+    """
+    if baseline_environment is None:
+        return
+    current = environment()
+    differences = [key for key in current if current[key] != baseline_environment.get(key)]
+    print(f"Baseline: Python {baseline_environment.get('python')}, NumPy {baseline_environment.get('numpy')}, "
+          f"pandas {baseline_environment.get('pandas')}, {baseline_environment.get('cpu_count')} CPU(s), {baseline_environment.get('system')}")
+    if differences:
+        print(f"This run: Python {current['python']}, NumPy {current['numpy']}, pandas {current['pandas']}, {current['cpu_count']} CPU(s), {current['system']}")
+        print(f"Differs in {', '.join(differences)}: store a baseline on this machine to compare wall times reliably.")
+    print()
+
+def _change(value, base, min_change):
+    # Relative change and whether it is a regression
+    if base is None or value is None:
+        return None, False
+    change = value / base - 1 if base > 0 else 0.0
+
+    return change, change > TOLERANCE and value - base > min_change
+
+def format_result(case, result, baseline = None):
+    """
+    Format one line of the report.
+
+    Parameters:
+    case (str): Name of the case
+    result (dict): Result of the case with 'seconds' and 'peak_mib' (None if not measured)
+    baseline (dict or None): Result of the same case in the baseline (default: None)
+
+    Returns:
+    tuple: (line, is_regression)
+    """
+    baseline = baseline or {}
+    line = f"{case:<58} {result['seconds'] * 1000:10.2f} ms"
+    time_change, time_regression = _change(result['seconds'], baseline.get('seconds'), MIN_SECONDS)
+    if time_change is not None:
+        line += f" ({time_change * 100:+6.1f} %)"
+    if result.get('peak_mib') is not None:
+        line += f" {result['peak_mib']:10.1f} MiB"
+        memory_change, memory_regression = _change(result['peak_mib'], baseline.get('peak_mib'), MIN_MIB)
+        if memory_change is not None:
+            line += f" ({memory_change * 100:+6.1f} %)"
+    else:
+        memory_regression = False
+    is_regression = time_regression or memory_regression
+    if is_regression:
+        line += '  REGRESSION'
+
+    return line, is_regression
+
+def print_report(results, baseline):
+    """
+    Print all results, compared with the baseline, and a summary of the regressions.
+
+    Parameters:
+    results (dict): Results per case
+    baseline (dict): Results of the baseline per case, empty if there is none
+
+    Returns:
+    int: Number of regressions
+    """
+    regressions = []
+    for case, result in results.items():
+        line, is_regression = format_result(case, result, baseline.get(case))
+        print(line)
+        if is_regression:
+            regressions.append(case)
+    if baseline:
+        missing = [case for case in baseline if case not in results]
+        print(f"\n{len(regressions)} regression(s) of more than {TOLERANCE * 100:.0f} % against the baseline"
+              + (f", {len(missing)} baseline case(s) not run" if missing else ''))
+        for case in regressions:
+            print(f"  {case}")
+
+    return len(regressions)
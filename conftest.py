@@ -0,0 +1 @@
+# Puts the repository root on the path of pytest, so the tests import modules/ like the pages do
@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from modules.correction_functions import adjust_pvalues
+from modules.srm_functions import check_srm
+from modules.stat_functions import proportions_test
+from modules.stat_functions import rpv_stats
+from modules.stat_functions import ttest_ind_from_stats
+from modules.timing_functions import timed
+
+## Batch analysis of many experiments
+### The input is a long-format table with one row per experiment and variant.
+### Every calculation runs vectorised over all rows, no experiment is analysed in a Python loop.
+BATCH_COLUMNS = ['experiment', 'variant', 'visitors', 'conversions']
+BATCH_REVENUE_COLUMNS = ['revenue_sum', 'revenue_sum_sq']
+
+@timed
+def analyse_experiments(df, alpha = 0.05, alternative = 'two-sided', srm_threshold = 0.1, control = None, srm_method = 'chisquare', correction_method = 'bonferroni', family = 'experiment'):
+    """
+    Analyse many experiments at once: z-test for the conversion rate, SRM check and post-hoc power
+    and, if revenue columns are given, the t-test for the revenue per visitor.
+    Every variant is compared with the control of its experiment, the p-values are corrected for multiple comparisons
+    per experiment or over the whole portfolio in one vectorised call.
+
+    Parameters:
+    df (pd.DataFrame): One row per experiment and variant with the columns experiment, variant, visitors, conversions,
+                       optionally revenue_sum and revenue_sum_sq (sum of the squared revenue per order)
+                       and expected_share (expected traffic share of the variant for the SRM check, default: equal split)
+    alpha (float): Significance level (default: 0.05)
+    alternative (str): 'two-sided', 'larger' or 'smaller', as in the hypothesis tester (default: 'two-sided')
+    srm_threshold (float): p-value below which a SRM is reported (default: 0.1)
+    control (str or None): Name of the control variant. None uses the first row of every experiment (default: None)
+    srm_method (str): Test for the SRM check, 'auto', 'chisquare', 'gtest' or 'exact', see srm_test (default: 'chisquare')
+    correction_method (str): Multiple comparison correction, one of CORRECTION_METHODS (default: 'bonferroni')
+    family (str): 'experiment' corrects the variants of every experiment, 'all' corrects all tests of the table
+                  as one portfolio (default: 'experiment')
+
+    Returns:
+    pd.DataFrame: One row per variant (controls excluded) with the test results
+    """
+    missing = [col for col in BATCH_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+
+    df = df.reset_index(drop = True)
+    if control is None:
+        is_control = ~df['experiment'].duplicated()
+    else:
+        is_control = df['variant'] == control
+    num_controls = is_control.groupby(df['experiment']).sum()
+    if (num_controls != 1).any():
+        raise ValueError("Every experiment needs exactly one control.")
+    if (df['conversions'] > df['visitors']).any():
+        raise ValueError("You shouldn't have more conversions than visitors.")
+    if family not in ['experiment', 'all']:
+        raise ValueError("family must be 'experiment' or 'all'.")
+
+    # SRM check per experiment over all arms
+    srm = check_srm(df, method = srm_method, threshold = srm_threshold).set_index('experiment')
+    srm_pvalue = srm.loc[df['experiment'], 'pvalue'].to_numpy()
+
+    # Align every variant with the control of its experiment
+    controls = df[is_control].set_index('experiment')
+    is_variant = ~is_control.to_numpy()
+    variants = df[is_variant]
+    ctrl = controls.loc[variants['experiment']]
+    groups = variants['experiment'].to_numpy() if family == 'experiment' else None
+
+    visitors_control = ctrl['visitors'].to_numpy(dtype = np.float64)
+    conversions_control = ctrl['conversions'].to_numpy(dtype = np.float64)
+    visitors = variants['visitors'].to_numpy(dtype = np.float64)
+    conversions = variants['conversions'].to_numpy(dtype = np.float64)
+    cr_control = conversions_control / visitors_control
+    cr = conversions / visitors
+
+    zstat, pvalue, effect_size, posthoc_power = proportions_test(conversions_control, visitors_control, conversions, visitors, alpha, alternative)
+    pvalue_adjusted = adjust_pvalues(pvalue, correction_method, groups)
+
+    result = pd.DataFrame(
+        {'experiment' : variants['experiment'].to_numpy()
+        , 'variant' : variants['variant'].to_numpy()
+        , 'visitors' : variants['visitors'].to_numpy()
+        , 'conversions' : variants['conversions'].to_numpy()
+        , 'cr_control' : cr_control
+        , 'cr' : cr
+        , 'cr_change_perc' : (cr - cr_control) / cr_control * 100
+        , 'cr_zstat' : zstat
+        , 'cr_pvalue' : pvalue
+        , 'cr_pvalue_adjusted' : pvalue_adjusted
+        , 'cr_significant' : pvalue_adjusted <= alpha
+        , 'posthoc_power' : posthoc_power
+        , 'srm_pvalue' : srm_pvalue[is_variant]
+        , 'srm_detected' : srm_pvalue[is_variant] < srm_threshold
+        })
+
+    if all(col in df.columns for col in BATCH_REVENUE_COLUMNS):
+        rpv_control, var_control = rpv_stats(visitors_control, ctrl['revenue_sum'].to_numpy(dtype = np.float64), ctrl['revenue_sum_sq'].to_numpy(dtype = np.float64), conversions_control)
+        rpv, var = rpv_stats(visitors, variants['revenue_sum'].to_numpy(dtype = np.float64), variants['revenue_sum_sq'].to_numpy(dtype = np.float64), conversions)
+        tstat, rpv_pvalue, dof = ttest_ind_from_stats(rpv_control, var_control, visitors_control, rpv, var, visitors, alternative = alternative, usevar = 'pooled')
+        result['rpv_control'] = rpv_control
+        result['rpv'] = rpv
+        result['rpv_change_perc'] = (rpv - rpv_control) / rpv_control * 100
+        result['rpv_tstat'] = tstat
+        result['rpv_pvalue'] = rpv_pvalue
+        result['rpv_pvalue_adjusted'] = adjust_pvalues(rpv_pvalue, correction_method, groups)
+        result['rpv_significant'] = result['rpv_pvalue_adjusted'] <= alpha
+
+    return result
@@ -0,0 +1,139 @@
+import numpy as np
+from modules.timing_functions import timed
+from modules.variant_functions import control_index
+
+## Bayesian analysis of conversion rates and revenue per visitor
+### Instead of a p-value, the posterior distribution of the metric of every arm answers "how likely is it that this
+### variant is the best?" and "how much do I lose if I pick it and it is not?".
+### Conversion rate: Beta-Binomial with a Beta(1, 1) prior, so the posterior is Beta(1 + conversions, 1 + visitors - conversions).
+### Revenue per visitor: conversion rate times the average order value. The posterior of the average order value is a
+### log-normal with the mean and the variance of the sample mean, matched from the sufficient statistics of the orders,
+### so it stays positive and skewed for few orders.
+### All arms are drawn at once into one matrix of shape (num_samples, num_arms). The draws are seeded, so the same
+### data always gives the same result.
+BAYES_SAMPLES = 20_000 # Monte Carlo error of the probabilities below 0.004
+BAYES_SEED = 42
+
+def beta_draws(conversions, visitors, num_samples = BAYES_SAMPLES, seed = BAYES_SEED, prior_alpha = 1.0, prior_beta = 1.0):
+    """
+    Draw from the Beta posterior of the conversion rate of every arm.
+
+    Parameters:
+    conversions, visitors (array-like): Conversions and visitors per arm
+    num_samples (int): Draws per arm (default: BAYES_SAMPLES)
+    seed (int or np.random.Generator): Seed of the draws (default: BAYES_SEED)
+    prior_alpha, prior_beta (float): Parameters of the Beta prior (default: 1, 1 = uniform)
+
+    Returns:
+    np.ndarray: Draws of shape (num_samples, num_arms)
+    """
+    conversions = np.atleast_1d(np.asarray(conversions, dtype = np.float64))
+    visitors = np.atleast_1d(np.asarray(visitors, dtype = np.float64))
+    if np.any(conversions < 0) or np.any(conversions > visitors):
+        raise ValueError("You need between 0 conversions and as many conversions as visitors.")
+    rng = np.random.default_rng(seed)
+
+    return rng.beta(prior_alpha + conversions, prior_beta + visitors - conversions, size = (num_samples, conversions.size))
+
+def rpv_draws(visitors, num_orders, revenue_sum, revenue_sum_sq, num_samples = BAYES_SAMPLES, seed = BAYES_SEED):
+    """
+    Draw from the posterior of the revenue per visitor of every arm (conversion rate times average order value).
+
+    Parameters:
+    visitors, num_orders (array-like): Visitors and orders per arm
+    revenue_sum, revenue_sum_sq (array-like): Sum and sum of the squared revenue of the orders per arm
+    num_samples (int): Draws per arm (default: BAYES_SAMPLES)
+    seed (int or np.random.Generator): Seed of the draws (default: BAYES_SEED)
+
+    Returns:
+    np.ndarray: Draws of shape (num_samples, num_arms)
+    """
+    num_orders = np.atleast_1d(np.asarray(num_orders, dtype = np.float64))
+    revenue_sum = np.atleast_1d(np.asarray(revenue_sum, dtype = np.float64))
+    revenue_sum_sq = np.atleast_1d(np.asarray(revenue_sum_sq, dtype = np.float64))
+    if np.any(num_orders < 2):
+        raise ValueError("Every arm needs at least 2 orders.")
+    rng = np.random.default_rng(seed)
+    cr = beta_draws(num_orders, visitors, num_samples, rng)
+
+    # Log-normal with the mean and the variance of the average order value
+    aov = revenue_sum / num_orders
+    aov_var = np.maximum(revenue_sum_sq - num_orders * aov ** 2, 0.0) / (num_orders - 1) / num_orders
+    sigma_sq = np.log1p(aov_var / aov ** 2)
+    aov_draws = np.exp(np.log(aov) - sigma_sq / 2 + np.sqrt(sigma_sq) * rng.standard_normal((num_samples, num_orders.size)))
+
+    return cr * aov_draws
+
+def bayes_summary(draws, names = None, control = 0, credible = 0.95):
+    """
+    Summarise posterior draws of any number of arms.
+
+    Parameters:
+    draws (np.ndarray): Posterior draws of shape (num_samples, num_arms), see beta_draws and rpv_draws
+    names (list of str or None): Name per arm. None numbers the arms (default: None)
+    control (int): Column of the control (default: 0)
+    credible (float): Probability of the credible intervals (default: 0.95)
+
+    Returns:
+    pd.DataFrame: One row per arm with the posterior mean and credible interval of the metric, the probability to be
+                  the best arm, the expected loss (how much worse than the best arm it is on average, in the unit of
+                  the metric), the probability to beat the control and the mean and credible interval of the
+                  relative uplift over the control (in %)
+    """
+    import pandas as pd
+    num_samples, num_arms = draws.shape
+    if names is None:
+        names = [str(arm) for arm in range(num_arms)]
+    tail = (1 - credible) / 2 * 100
+    best = draws.max(axis = 1)
+    uplift = (draws / draws[:, [control]] - 1) * 100
+    metric_low, metric_high = np.percentile(draws, [tail, 100 - tail], axis = 0)
+    uplift_low, uplift_high = np.percentile(uplift, [tail, 100 - tail], axis = 0)
+
+    return pd.DataFrame(
+        {'variant' : names
+        , 'mean' : draws.mean(axis = 0)
+        , 'ci_low' : metric_low
+        , 'ci_high' : metric_high
+        , 'prob_best' : np.bincount(draws.argmax(axis = 1), minlength = num_arms) / num_samples
+        , 'expected_loss' : (best[:, np.newaxis] - draws).mean(axis = 0)
+        , 'prob_beat_control' : (draws > draws[:, [control]]).mean(axis = 0)
+        , 'uplift_perc' : uplift.mean(axis = 0)
+        , 'uplift_ci_low' : uplift_low
+        , 'uplift_ci_high' : uplift_high
+        })
+
+@timed
+def bayes_test(df, metric = 'conversion_rate', control = None, num_samples = BAYES_SAMPLES, seed = BAYES_SEED, credible = 0.95):
+    """
+    Bayesian analysis of one experiment from a table with one row per arm.
+
+    Parameters:
+    df (pd.DataFrame): One row per arm with the columns variant, visitors, conversions and, for the revenue per visitor,
+                       revenue_sum and revenue_sum_sq (same format as analyse_experiments)
+    metric (str): 'conversion_rate' or 'revenue_per_visitor' (default: 'conversion_rate')
+    control (str or None): Name of the control. None uses the first row (default: None)
+    num_samples (int): Draws per arm (default: BAYES_SAMPLES)
+    seed (int): Seed of the draws (default: BAYES_SEED)
+    credible (float): Probability of the credible intervals (default: 0.95)
+
+    Returns:
+    pd.DataFrame: See bayes_summary
+    """
+    columns = ['variant', 'visitors', 'conversions'] + (['revenue_sum', 'revenue_sum_sq'] if metric == 'revenue_per_visitor' else [])
+    missing = [col for col in columns if col not in df.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    if len(df) < 2:
+        raise ValueError("You need a control and at least one variant.")
+    names = df['variant'].astype(str).tolist()
+    control_idx = control_index(names, control)
+
+    if metric == 'conversion_rate':
+        draws = beta_draws(df['conversions'], df['visitors'], num_samples, seed)
+    elif metric == 'revenue_per_visitor':
+        draws = rpv_draws(df['visitors'], df['conversions'], df['revenue_sum'], df['revenue_sum_sq'], num_samples, seed)
+    else:
+        raise ValueError("metric must be 'conversion_rate' or 'revenue_per_visitor'.")
+
+    return bayes_summary(draws, names, control_idx, credible)
@@ -0,0 +1,102 @@
+import numpy as np
+
+## Multiple comparison corrections
+### Every variant of an experiment (and every test of a portfolio) is a comparison of its own, so the significance
+### level has to be corrected. The p-values of all tests are adjusted in one vectorised call; with groups, every
+### group (e.g. every experiment) is corrected as a family of its own, still without a loop over the groups.
+### Bonferroni, Holm, Hochberg and Sidak control the probability of any false positive in a family,
+### Benjamini-Hochberg controls the share of false positives among the significant results.
+### The method names are those of statsmodels' multipletests ('hochberg' is its 'simes-hochberg'), the adjusted p-values are the same.
+CORRECTION_METHODS = {
+    'bonferroni' : 'Bonferroni'
+    , 'holm' : 'Holm'
+    , 'hochberg' : 'Hochberg'
+    , 'sidak' : 'Šidák'
+    , 'fdr_bh' : 'Benjamini-Hochberg'
+    }
+
+def correct_alpha(alpha, num_tests, method = 'bonferroni'):
+    """
+    Calculate the significance level per comparison, e.g. to plan the sample size of an experiment with several variants.
+    The step-wise methods (Holm, Hochberg, Benjamini-Hochberg) compare the smallest p-value with the Bonferroni level,
+    so the Bonferroni level is used to plan with them. alpha and num_tests can be NumPy arrays.
+
+    Parameters:
+    alpha (float or array-like): Significance level of the family
+    num_tests (int or array-like): Number of comparisons, e.g. the number of variants besides the control
+    method (str): One of CORRECTION_METHODS (default: 'bonferroni')
+
+    Returns:
+    float or np.ndarray: Significance level per comparison
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"method must be one of {', '.join(CORRECTION_METHODS)}.")
+    alpha = np.asarray(alpha, dtype = np.float64)
+    num_tests = np.asarray(num_tests, dtype = np.float64)
+    if method == 'sidak':
+        return 1 - (1 - alpha) ** (1 / num_tests)
+
+    return alpha / num_tests
+
+def _family_accumulate(ufunc, values, group):
+    # Running max / min that restarts in every family. The values are replaced by their exact ranks among all values,
+    # and the ranks get an integer offset per family that keeps earlier families out of the running max and later
+    # families out of the running min from the end. No p-value is rounded against the offset.
+    levels, codes = np.unique(values, return_inverse = True)
+    offset = group * levels.size
+    if ufunc is np.maximum:
+        return levels[np.maximum.accumulate(codes.ravel() + offset) - offset]
+
+    return levels[np.minimum.accumulate((codes.ravel() + offset)[::-1])[::-1] - offset]
+
+def adjust_pvalues(pvalues, method = 'holm', groups = None):
+    """
+    Adjust p-values for multiple comparisons. A test is significant if its adjusted p-value is <= alpha.
+    NaN p-values (e.g. a metric without data) are not counted as a comparison and stay NaN.
+
+    Parameters:
+    pvalues (array-like): p-values of all tests
+    method (str): One of CORRECTION_METHODS (default: 'holm')
+    groups (array-like or None): Family of every test, e.g. the experiment. Every family is corrected on its own.
+                                 None corrects all tests as one family (default: None)
+
+    Returns:
+    np.ndarray: Adjusted p-values in the order of pvalues
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"method must be one of {', '.join(CORRECTION_METHODS)}.")
+    pvalues = np.asarray(pvalues, dtype = np.float64).ravel()
+    if groups is None:
+        group_codes = np.zeros(pvalues.size, dtype = np.int64)
+    else:
+        group_codes = np.unique(np.asarray(groups).ravel(), return_inverse = True)[1].ravel()
+        if group_codes.size != pvalues.size:
+            raise ValueError("Provide one group per p-value.")
+
+    # Sort by family and p-value, NaN last within every family
+    is_valid = ~np.isnan(pvalues)
+    order = np.lexsort((pvalues, ~is_valid, group_codes))
+    p = pvalues[order]
+    group = group_codes[order]
+    valid = is_valid[order]
+
+    # Number of tests per family and rank (1-based) of every p-value in its family
+    num_tests = np.bincount(group, weights = valid, minlength = group_codes.max(initial = -1) + 1)[group]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    rank = np.arange(p.size) - np.repeat(starts, np.diff(np.r_[starts, p.size])) + 1
+
+    if method == 'bonferroni':
+        adjusted = p * num_tests
+    elif method == 'sidak':
+        adjusted = -np.expm1(num_tests * np.log1p(-p))
+    elif method == 'holm':
+        adjusted = _family_accumulate(np.maximum, np.where(valid, np.minimum((num_tests - rank + 1) * p, 1.0), 0.0), group)
+    else:
+        factor = (num_tests - rank + 1) if method == 'hochberg' else num_tests / rank
+        step = np.where(valid, np.minimum(factor * p, 1.0), 1.0)
+        adjusted = _family_accumulate(np.minimum, step, group)
+
+    result = np.empty(p.size)
+    result[order] = np.where(valid, np.minimum(adjusted, 1.0), np.nan)
+
+    return result
@@ -0,0 +1,131 @@
+import numpy as np
+from modules.correction_functions import adjust_pvalues
+from modules.stat_functions import ttest_ind_from_stats
+from modules.timing_functions import timed
+from modules.variant_functions import control_index
+from modules.variant_functions import stream_variant_csv
+from modules.variant_functions import variant_sufficient_stats
+
+## Variance reduction with a pre-experiment covariate (CUPED)
+### The metric of a visitor (revenue, or 0/1 for a conversion) is adjusted with the same visitor's value before the
+### experiment: y_cuped = y - theta * (x - mean(x)). The covariate is independent of the assignment, so the difference
+### of the means stays unbiased, while the variance shrinks by the share rho^2 that the covariate explains.
+### Everything is calculated from sufficient statistics per variant (visitors, sums, sums of squares and the sum of
+### the cross products), which are summed up chunk by chunk, so the visitor level data never has to fit into memory.
+### theta is pooled within the variants, so a treatment effect does not leak into it.
+CUPED_COLUMNS = ['variant', 'visitors', 'metric_sum', 'metric_sum_sq', 'covariate_sum', 'covariate_sum_sq', 'cross_sum']
+
+def cuped_sufficient_stats(df, metric, covariate, variant = None):
+    """
+    Calculate the CUPED sufficient statistics of visitor level data per variant.
+    Empty values count as 0, e.g. a visitor without an order or without a visit before the experiment.
+
+    Parameters:
+    df (pd.DataFrame): One row per visitor
+    metric (str): Column of the metric, e.g. the revenue or 0/1 for a conversion
+    covariate (str): Column of the same metric (or a related one) before the experiment
+    variant (str or None): Column of the variant. None treats all rows as one group, e.g. for planning (default: None)
+
+    Returns:
+    pd.DataFrame: One row per variant, in the order of their first row, with the columns CUPED_COLUMNS
+    """
+    return variant_sufficient_stats(df, metric, covariate, variant, CUPED_COLUMNS)
+
+@timed
+def stream_cuped_csv(source, metric, covariate, variant = None, chunksize = 1_000_000):
+    """
+    Read a visitor level csv file in chunks and sum up its CUPED sufficient statistics per variant in one pass.
+    Memory usage is bounded by the chunk size, independent of the file size.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header row and one row per visitor
+    metric, covariate, variant: See cuped_sufficient_stats
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    pd.DataFrame: See cuped_sufficient_stats
+    """
+    return stream_variant_csv(source, metric, covariate, variant, CUPED_COLUMNS, chunksize)
+
+def cuped_moments(stats, theta = None):
+    """
+    Calculate mean and variance of the metric per variant, without and with the CUPED adjustment.
+    All columns can hold many variants (or experiments) at once.
+
+    Parameters:
+    stats (pd.DataFrame or dict): Sufficient statistics with the columns of CUPED_COLUMNS
+    theta (float or None): Adjustment factor. None estimates it from the covariance within the variants (default: None)
+
+    Returns:
+    tuple: (mean, var, mean_cuped, var_cuped, theta, rho)
+           The variances are per visitor with ddof = 1. rho is the correlation of metric and covariate within the
+           variants, the variance is reduced by the share rho^2.
+    """
+    n = np.asarray(stats['visitors'], dtype = np.float64)
+    mean = np.asarray(stats['metric_sum'], dtype = np.float64) / n
+    mean_x = np.asarray(stats['covariate_sum'], dtype = np.float64) / n
+    # Sums of squared deviations from the variant means
+    ss_y = np.asarray(stats['metric_sum_sq'], dtype = np.float64) - n * mean ** 2
+    ss_x = np.asarray(stats['covariate_sum_sq'], dtype = np.float64) - n * mean_x ** 2
+    ss_xy = np.asarray(stats['cross_sum'], dtype = np.float64) - n * mean * mean_x
+
+    if theta is None:
+        theta = ss_xy.sum() / ss_x.sum() if ss_x.sum() > 0 else 0.0
+    rho = ss_xy.sum() / np.sqrt(ss_x.sum() * ss_y.sum()) if ss_x.sum() > 0 and ss_y.sum() > 0 else 0.0
+
+    var = np.maximum(ss_y, 0.0) / (n - 1)
+    var_cuped = np.maximum(ss_y - 2 * theta * ss_xy + theta ** 2 * ss_x, 0.0) / (n - 1)
+    # The covariate mean of all visitors is the common reference, so the adjustment cancels out in expectation
+    mean_cuped = mean - theta * (mean_x - np.sum(stats['covariate_sum']) / n.sum())
+
+    return mean, var, mean_cuped, var_cuped, theta, rho
+
+@timed
+def cuped_test(stats, alpha = 0.05, alternative = 'two-sided', control = None, correction_method = 'bonferroni'):
+    """
+    Compare every variant with the control, with the t-test on the raw and on the CUPED adjusted metric.
+
+    Parameters:
+    stats (pd.DataFrame): Sufficient statistics per variant with the columns CUPED_COLUMNS, see cuped_sufficient_stats
+    alpha (float): Significance level (default: 0.05)
+    alternative (str): 'two-sided', 'larger' or 'smaller', as in the hypothesis tester (default: 'two-sided')
+    control (str or None): Name of the control variant. None uses the first row (default: None)
+    correction_method (str): Correction for multiple variants, one of CORRECTION_METHODS (default: 'bonferroni')
+
+    Returns:
+    pd.DataFrame: One row per variant (control excluded) with the means, the difference without and with CUPED,
+                  the p-values, the corrected CUPED p-value, whether it is significant and the variance reduction (%)
+    """
+    import pandas as pd
+    missing = [col for col in CUPED_COLUMNS if col not in stats.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    stats = stats.reset_index(drop = True)
+    if len(stats) < 2:
+        raise ValueError("You need a control and at least one variant.")
+    if (stats['visitors'] < 2).any():
+        raise ValueError("Every variant needs at least 2 visitors.")
+    control_idx = control_index(stats['variant'], control)
+
+    mean, var, mean_cuped, var_cuped, theta, rho = cuped_moments(stats)
+    nobs = stats['visitors'].to_numpy(dtype = np.float64)
+    is_variant = np.arange(len(stats)) != control_idx
+
+    tstat, pvalue, dof = ttest_ind_from_stats(mean[control_idx], var[control_idx], nobs[control_idx], mean[is_variant], var[is_variant], nobs[is_variant], alternative = alternative, usevar = 'pooled')
+    tstat_cuped, pvalue_cuped, dof = ttest_ind_from_stats(mean_cuped[control_idx], var_cuped[control_idx], nobs[control_idx], mean_cuped[is_variant], var_cuped[is_variant], nobs[is_variant], alternative = alternative, usevar = 'pooled')
+    pvalue_adjusted = adjust_pvalues(pvalue_cuped, correction_method)
+
+    return pd.DataFrame(
+        {'variant' : stats.loc[is_variant, 'variant'].to_numpy()
+        , 'visitors' : nobs[is_variant]
+        , 'mean_control' : mean[control_idx]
+        , 'mean' : mean[is_variant]
+        , 'diff' : mean[is_variant] - mean[control_idx]
+        , 'diff_cuped' : mean_cuped[is_variant] - mean_cuped[control_idx]
+        , 'pvalue' : pvalue
+        , 'pvalue_cuped' : pvalue_cuped
+        , 'pvalue_cuped_adjusted' : pvalue_adjusted
+        , 'significant' : pvalue_adjusted <= alpha
+        , 'theta' : theta
+        , 'variance_reduction_perc' : rho ** 2 * 100
+        })
@@ -0,0 +1,503 @@
+import streamlit as st
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+import numpy as np
+from modules.bootstrap_functions import BOOTSTRAP_RESAMPLES
+from modules.bootstrap_functions import BOOTSTRAP_RESAMPLE_OPTIONS
+from modules.bootstrap_functions import bootstrap_rpv
+from modules.bootstrap_functions import estimate_bootstrap_seconds
+from modules.bootstrap_functions import merge_value_counts
+from modules.bootstrap_functions import revenue_value_counts
+from modules.bootstrap_functions import stream_revenue_counts
+from modules.cuped_functions import stream_cuped_csv
+from modules.interaction_functions import detect_interactions
+from modules.interaction_functions import detect_metric_interactions
+from modules.interaction_functions import stream_assignments_csv
+from modules.ratio_functions import stream_ratio_csv
+from modules.simulation_functions import simulate_rpv
+from modules.stat_functions import read_revenue_csv
+from modules.stat_functions import stream_revenue_csv
+from modules.stat_functions import summarise_revenue
+from modules.timing_functions import timed
+from modules.winsor_functions import revenue_sketch
+from modules.winsor_functions import stream_revenue_sketch
+
+## Cached ingestion of uploaded csv files
+### Streamlit re-runs the whole page on every widget interaction. The parsed and validated revenue data is cached by
+### the hash of the uploaded bytes, so changing e.g. alpha or power does not parse the file again.
+### Large results (the parsed file, the unique order values for the bootstrap) are kept as they are in one process-wide
+### cache: st.cache_data would pickle and unpickle them on every hit, which costs almost as much as parsing again.
+### Their arrays are made read-only, as every session shares them. The cache holds at most CACHE_MAX_BYTES in total,
+### the least recently used results are evicted first, a result larger than the whole cache is not cached.
+### Small results (summaries, sketches, sufficient statistics, test results) stay in st.cache_data.
+### Files larger than PARSE_MAX_BYTES are never parsed into one DataFrame, they are summarised in chunks instead.
+CACHE_MAX_ENTRIES = 8
+CACHE_MAX_BYTES = 256 * 1024 ** 2
+PARSE_MAX_BYTES = 64 * 1024 ** 2
+
+class _ByteBoundedCache:
+    # Least recently used cache with a limit on the total size of its values
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries = OrderedDict() # key -> (value, nbytes)
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+    def put(self, key, value, nbytes):
+        with self.lock:
+            if key in self.entries or nbytes > self.max_bytes:
+                return
+            self.entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+            while self.total_bytes > self.max_bytes:
+                self.total_bytes -= self.entries.popitem(last = False)[1][1]
+
+@st.cache_resource(show_spinner = False)
+def _result_cache():
+    # One cache per process, shared by all sessions
+    return _ByteBoundedCache(CACHE_MAX_BYTES)
+
+def _freeze(arrays):
+    # Shared results must not be changed by a session, returns the number of bytes of the arrays
+    for array in arrays:
+        array.flags.writeable = False
+
+    return sum(array.nbytes for array in arrays)
+
+def file_hash(data):
+    """
+    Calculate the hash of the content of an uploaded file.
+
+    Parameters:
+    data (bytes): Content of the file
+
+    Returns:
+    str: Hex digest of the content
+    """
+    return hashlib.blake2b(data, digest_size = 16).hexdigest()
+
+def parse_revenue_csv(data):
+    """
+    Parse and validate a csv file with one column of revenue per order and one header cell.
+
+    Parameters:
+    data (bytes): Content of the csv file
+
+    Returns:
+    tuple: (df, validation)
+           df (pd.DataFrame): Revenue data as read from the file
+           validation (RevenueValidation): Clean float64 values and the rows with issues, see validate_revenue
+    """
+    return read_revenue_csv(io.BytesIO(data))
+
+@timed
+def load_revenue_csv(uploaded_file):
+    """
+    Load the revenue data of an uploaded csv file, using the cache when the same content was loaded before.
+    The result is shared with other sessions and must not be changed.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    tuple: (df, validation), see parse_revenue_csv
+    """
+    key = ('revenue_csv', file_hash(uploaded_file.getbuffer()))
+    result = _result_cache().get(key)
+    if result is None:
+        df, validation = parse_revenue_csv(uploaded_file.getvalue())
+        nbytes = _freeze(validation) + int(df.memory_usage(deep = True).sum())
+        result = (df, validation)
+        _result_cache().put(key, result, nbytes)
+
+    return result
+
+@st.cache_data(max_entries = 4 * CACHE_MAX_ENTRIES, show_spinner = False)
+def _summarise_revenue_csv_cached(content_hash, _uploaded_file):
+    _uploaded_file.seek(0)
+    return stream_revenue_csv(_uploaded_file)
+
+@timed
+def load_revenue_summary(uploaded_file):
+    """
+    Summarise the revenue data of an uploaded csv file.
+    Files up to PARSE_MAX_BYTES reuse the cached validation of load_revenue_csv. Larger files are streamed in chunks
+    (see stream_revenue_csv) and never parsed into one DataFrame. The small summary is cached for every file size.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    RevenueSummary: Sufficient statistics and sanity checks of the revenue data
+    """
+    if uploaded_file.size <= PARSE_MAX_BYTES:
+        return summarise_revenue(load_revenue_csv(uploaded_file)[1])
+
+    # getbuffer() hashes the uploaded bytes without copying them
+    return _summarise_revenue_csv_cached(file_hash(uploaded_file.getbuffer()), uploaded_file)
+
+@timed
+def describe_rows(uploaded_file, issue, max_rows = 5):
+    """
+    Describe the rows of an uploaded revenue file with a specific issue for a warning message.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    issue (str): 'non_numeric' (includes empty values), 'non_positive' or 'outlier'
+    max_rows (int): Maximum number of rows to list (default: 5)
+
+    Returns:
+    str: e.g. ' (rows 3, 8 and 2 more)' with the row numbers of the file (the header is row 1),
+         or an empty string for files larger than PARSE_MAX_BYTES, which are only summarised
+    """
+    if uploaded_file.size > PARSE_MAX_BYTES:
+        return ''
+
+    validation = load_revenue_csv(uploaded_file)[1]
+    if issue == 'non_numeric':
+        rows = np.sort(np.concatenate([validation.non_numeric_rows, validation.nan_rows]))
+    elif issue == 'non_positive':
+        rows = validation.non_positive_rows
+    elif issue == 'outlier':
+        rows = validation.outlier_rows
+    else:
+        raise ValueError("issue must be 'non_numeric', 'non_positive' or 'outlier'.")
+    if rows.size == 0:
+        return ''
+
+    # + 2: row indices start at 0 after the header row
+    listed = ', '.join(str(row + 2) for row in rows[:max_rows])
+    if rows.size > max_rows:
+        listed += f' and {rows.size - max_rows} more'
+
+    return f' (row {listed})' if rows.size == 1 else f' (rows {listed})'
+
+@st.cache_data(max_entries = 4 * CACHE_MAX_ENTRIES, show_spinner = False)
+def _revenue_sketch_cached(content_hash, _uploaded_file):
+    if _uploaded_file.size <= PARSE_MAX_BYTES:
+        return revenue_sketch(load_revenue_csv(_uploaded_file)[1].values)
+
+    _uploaded_file.seek(0)
+    return stream_revenue_sketch(_uploaded_file)
+
+@timed
+def load_revenue_sketch(uploaded_file):
+    """
+    Build the sketch of the revenue data of an uploaded csv file for capping large orders, see revenue_sketch.
+    Files larger than PARSE_MAX_BYTES are streamed in chunks.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    RevenueSketch: Sketch of the valid orders
+    """
+    return _revenue_sketch_cached(file_hash(uploaded_file.getbuffer()), uploaded_file)
+
+@timed
+def load_revenue_counts(uploaded_file):
+    """
+    Compress the revenue data of an uploaded csv file into unique values and counts for the bootstrap.
+    Files larger than PARSE_MAX_BYTES are streamed in chunks. The result is shared with other sessions and must not be changed.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    tuple: (values, counts), see revenue_value_counts
+    """
+    key = ('revenue_counts', file_hash(uploaded_file.getbuffer()))
+    result = _result_cache().get(key)
+    if result is None:
+        if uploaded_file.size <= PARSE_MAX_BYTES:
+            result = revenue_value_counts(load_revenue_csv(uploaded_file)[1].values)
+        else:
+            uploaded_file.seek(0)
+            result = stream_revenue_counts(uploaded_file)
+        result = tuple(result)
+        _result_cache().put(key, result, _freeze(result))
+
+    return result
+
+def _capped_counts(uploaded_file, cap):
+    values, counts = load_revenue_counts(uploaded_file)
+    if cap is not None:
+        # Capped orders share one value
+        values, counts = merge_value_counts([np.minimum(values, cap)], [counts])
+
+    return values, counts
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _bootstrap_rpv_cached(control_hash, control_visitors, variant_hash, variant_visitors, confidence, alternative, cap, num_resamples, _control_file, _variant_file):
+    control_values, control_counts = _capped_counts(_control_file, cap)
+    variant_values, variant_counts = _capped_counts(_variant_file, cap)
+    return bootstrap_rpv(
+        control_values
+        , control_counts
+        , control_visitors
+        , variant_values
+        , variant_counts
+        , variant_visitors
+        , confidence = confidence
+        , alternative = alternative
+        , num_resamples = num_resamples
+        )
+
+@timed
+def load_bootstrap_rpv(control_file, control_visitors, variant_file, variant_visitors, confidence = 0.95, alternative = 'two-sided', cap = None, num_resamples = BOOTSTRAP_RESAMPLES):
+    """
+    Bootstrap the difference in revenue per visitor of two uploaded revenue files, see bootstrap_rpv.
+    The result is cached, so the resampling only runs again when the data or the settings change.
+
+    Parameters:
+    control_file, variant_file (UploadedFile): Files returned by st.file_uploader
+    control_visitors, variant_visitors (int): Number of visitors
+    confidence (float): Confidence level of the interval (default: 0.95)
+    alternative (str): 'two-sided', 'larger' or 'smaller' (default: 'two-sided')
+    cap (float or None): Maximum revenue per order, larger orders are capped. None keeps all orders (default: None)
+    num_resamples (int): Number of bootstrap resamples (default: BOOTSTRAP_RESAMPLES)
+
+    Returns:
+    BootstrapResult: See bootstrap_rpv
+    """
+    return _bootstrap_rpv_cached(
+        file_hash(control_file.getbuffer())
+        , control_visitors
+        , file_hash(variant_file.getbuffer())
+        , variant_visitors
+        , confidence
+        , alternative
+        , cap
+        , num_resamples
+        , control_file
+        , variant_file
+        )
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _bootstrap_estimate_cached(control_hash, control_visitors, variant_hash, variant_visitors, cap, num_resamples, _control_file, _variant_file):
+    control_values, control_counts = _capped_counts(_control_file, cap)
+    variant_values, variant_counts = _capped_counts(_variant_file, cap)
+    seconds = estimate_bootstrap_seconds(control_values, control_counts, control_visitors, variant_values, variant_counts, variant_visitors, num_resamples = num_resamples)
+    return dict(zip(num_resamples, np.atleast_1d(seconds).tolist()))
+
+@timed
+def load_bootstrap_estimate(control_file, control_visitors, variant_file, variant_visitors, cap = None, num_resamples = BOOTSTRAP_RESAMPLE_OPTIONS):
+    """
+    Estimate the runtime of load_bootstrap_rpv for every number of resamples, see estimate_bootstrap_seconds.
+    The resamples are timed once, the runtimes take the number of worker processes of each full run into account.
+
+    Parameters:
+    control_file, variant_file, control_visitors, variant_visitors, cap: See load_bootstrap_rpv
+    num_resamples (list of int): Numbers of resamples to estimate (default: BOOTSTRAP_RESAMPLE_OPTIONS)
+
+    Returns:
+    dict: Estimated seconds of the full run per number of resamples
+    """
+    return _bootstrap_estimate_cached(
+        file_hash(control_file.getbuffer())
+        , control_visitors
+        , file_hash(variant_file.getbuffer())
+        , variant_visitors
+        , cap
+        , tuple(num_resamples)
+        , control_file
+        , variant_file
+        )
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _rpv_simulation_cached(content_hash, num_visitors, sample_size, mde, alpha, test_type, cap, _uploaded_file):
+    values, counts = _capped_counts(_uploaded_file, cap)
+    return simulate_rpv(
+        values
+        , counts
+        , num_visitors
+        , np.asarray(sample_size)
+        , np.asarray(mde)
+        , alpha = alpha
+        , test_type = test_type
+        )
+
+@timed
+def load_rpv_simulation(uploaded_file, num_visitors, sample_size, mde, alpha = 0.05, test_type = 'Two-sided', cap = None):
+    """
+    Simulate experiments with the revenue per visitor, resampled from an uploaded revenue file, see simulate_rpv.
+    The result is cached, so the simulation only runs again when the data or the settings change.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    num_visitors (int): Number of visitors of the period of the file
+    sample_size (array-like): Sample size per group, one simulation per value
+    mde (array-like): Absolute effect on the revenue per visitor per sample size
+    alpha (float): Significance level, already corrected for multiple comparisons (default: 0.05)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    cap (float or None): Maximum revenue per order, larger orders are capped. None keeps all orders (default: None)
+
+    Returns:
+    SimulationResult: See simulate_rpv
+    """
+    return _rpv_simulation_cached(
+        file_hash(uploaded_file.getbuffer())
+        , num_visitors
+        , tuple(np.asarray(sample_size).tolist())
+        , tuple(np.asarray(mde).tolist())
+        , alpha
+        , test_type
+        , cap
+        , uploaded_file
+        )
+
+@timed
+def read_csv_columns(uploaded_file):
+    """
+    Read the header row of an uploaded csv file.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    list of str: Column names
+    """
+    import pandas as pd
+    uploaded_file.seek(0)
+    columns = list(pd.read_csv(uploaded_file, nrows = 0).columns)
+    uploaded_file.seek(0)
+
+    return columns
+
+@st.cache_data(max_entries = 4 * CACHE_MAX_ENTRIES, show_spinner = False)
+def _cuped_stats_cached(content_hash, metric, covariate, variant, _uploaded_file):
+    _uploaded_file.seek(0)
+    return stream_cuped_csv(_uploaded_file, metric, covariate, variant)
+
+@timed
+def load_cuped_stats(uploaded_file, metric, covariate, variant = None):
+    """
+    Sum up the CUPED sufficient statistics of an uploaded visitor level csv file in chunks, see stream_cuped_csv.
+    The small result is cached for every file size.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    metric, covariate, variant (str): Column names, see cuped_sufficient_stats
+
+    Returns:
+    pd.DataFrame: Sufficient statistics per variant, see cuped_sufficient_stats
+    """
+    return _cuped_stats_cached(file_hash(uploaded_file.getbuffer()), metric, covariate, variant, uploaded_file)
+
+@st.cache_data(max_entries = 4 * CACHE_MAX_ENTRIES, show_spinner = False)
+def _ratio_stats_cached(content_hash, numerator, denominator, variant, _uploaded_file):
+    _uploaded_file.seek(0)
+    return stream_ratio_csv(_uploaded_file, numerator, denominator, variant)
+
+@timed
+def load_ratio_stats(uploaded_file, numerator, denominator, variant = None):
+    """
+    Sum up the sufficient statistics of a ratio metric of an uploaded user level csv file in chunks, see stream_ratio_csv.
+    The small result is cached for every file size.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    numerator, denominator, variant (str): Column names, see ratio_sufficient_stats
+
+    Returns:
+    pd.DataFrame: Sufficient statistics per variant, see ratio_sufficient_stats
+    """
+    return _ratio_stats_cached(file_hash(uploaded_file.getbuffer()), numerator, denominator, variant, uploaded_file)
+
+@timed
+def load_assignment_cells(uploaded_file):
+    """
+    Aggregate the assignment table of an uploaded csv file in chunks into one row per combination of variants, see stream_assignments_csv.
+    The visitor level rows are never held in memory. The result is cached by the content of the file, shared with other
+    sessions and must not be changed.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+
+    Returns:
+    pd.DataFrame: One row per combination of variants with the sums per cell, see stream_assignments_csv
+    """
+    key = ('assignment_cells', file_hash(uploaded_file.getbuffer()))
+    result = _result_cache().get(key)
+    if result is None:
+        uploaded_file.seek(0)
+        result = stream_assignments_csv(uploaded_file)
+        _result_cache().put(key, result, int(result.memory_usage(deep = True).sum()))
+
+    return result
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _interactions_cached(content_hash, order, correction_method, _uploaded_file):
+    return detect_interactions(load_assignment_cells(_uploaded_file), order = order, correction_method = correction_method)
+
+@timed
+def load_interactions(uploaded_file, order = 2, correction_method = 'holm'):
+    """
+    Test every pair (or triple) of experiments of an uploaded assignment file for a traffic interaction, see detect_interactions.
+    The result is cached, so the tests only run again when the data or the settings change.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    order (int): Number of experiments per test (default: 2)
+    correction_method (str): Multiple testing correction, one of CORRECTION_METHODS (default: 'holm')
+
+    Returns:
+    pd.DataFrame: See detect_interactions
+    """
+    return _interactions_cached(file_hash(uploaded_file.getbuffer()), order, correction_method, uploaded_file)
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _metric_interactions_cached(content_hash, control, correction_method, _uploaded_file):
+    return detect_metric_interactions(load_assignment_cells(_uploaded_file), control = control, correction_method = correction_method)
+
+@timed
+def load_metric_interactions(uploaded_file, control = None, correction_method = 'holm'):
+    """
+    Test every pair of experiments of an uploaded assignment file for a metric interaction, see detect_metric_interactions.
+    The result is cached, so the tests only run again when the data or the settings change.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    control (str or None): Name of the control variant in all experiments (default: None)
+    correction_method (str): Multiple testing correction, one of CORRECTION_METHODS (default: 'holm')
+
+    Returns:
+    pd.DataFrame: See detect_metric_interactions
+    """
+    return _metric_interactions_cached(file_hash(uploaded_file.getbuffer()), control, correction_method, uploaded_file)
+
+@st.cache_data(max_entries = CACHE_MAX_ENTRIES, show_spinner = False)
+def _batch_analysis_cached(content_hash, alpha, alternative, correction_method, family, _uploaded_file):
+    import pandas as pd
+    from modules.batch_functions import analyse_experiments
+    return analyse_experiments(
+        pd.read_csv(io.BytesIO(_uploaded_file.getvalue()))
+        , alpha = alpha
+        , alternative = alternative
+        , correction_method = correction_method
+        , family = family
+        )
+
+@timed
+def load_batch_analysis(uploaded_file, alpha = 0.05, alternative = 'two-sided', correction_method = 'bonferroni', family = 'experiment'):
+    """
+    Analyse the experiments of an uploaded batch file, see analyse_experiments.
+    The result is cached, so the tests only run again when the data or the settings change.
+
+    Parameters:
+    uploaded_file (UploadedFile): File returned by st.file_uploader
+    alpha, alternative, correction_method, family: See analyse_experiments
+
+    Returns:
+    pd.DataFrame: See analyse_experiments
+    """
+    return _batch_analysis_cached(file_hash(uploaded_file.getbuffer()), alpha, alternative, correction_method, family, uploaded_file)
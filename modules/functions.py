@@ -1,26 +1,72 @@
 import streamlit as st
+from modules.timing_functions import finish_run
+from modules.timing_functions import start_run
+from modules.timing_functions import summarise_spans
+from modules.timing_functions import timing_configured
 
 # Create a sidebar
 def Navbar():
+    start_run(enabled = diagnostics_requested() or timing_configured())
     with st.sidebar:
         st.page_link("streamlit_app.py", label="Home", icon="🏠")
         st.page_link("pages/1_MDE ⏳.py", label='''Minimum detectable effect (MDE) calculator''', icon="⏳")
         st.page_link("pages/2_SRM ⚖️.py", label="Sample ratio mismatch (SRM) detector", icon="⚖️")
         st.page_link("pages/3_Interaction detector 🕵️‍♀️.py", label="Interaction detector", icon="🕵️‍♀️")
         st.page_link("pages/4_Statistical significance 🌟.py", label="Statistical hypothesis tester", icon="🌟")
+        st.page_link("pages/6_Batch analysis 🗂️.py", label="Batch analysis", icon="🗂️")
 
-# Create a footer
-from htbuilder import HtmlElement, div, ul, li, br, hr, a, p, img, styles, classes, fonts
-from htbuilder.units import percent, px
-from htbuilder.funcs import rgba, rgb
+# Diagnostics panel
+## Opening a page with ?diagnostics=1 shows the time spent in every stage of the page run in the sidebar, for the rest
+## of the session (?diagnostics=0 hides it again). The timing starts with the Navbar and ends with Diagnostics(), see run_page.
+def diagnostics_requested():
+    if 'diagnostics' in st.query_params:
+        st.session_state['diagnostics'] = st.query_params['diagnostics'] not in ['0', 'false']
+    return st.session_state.get('diagnostics', False)
+
+# Runs the body and the footer of a page and finishes its timing run. Streamlit also ends a run with an exception,
+# e.g. for a rerun after a widget change or st.stop(). The run is then finished and logged without the panel.
+def run_page(page, main):
+    try:
+        main()
+        footer()
+    except BaseException:
+        finish_run(page)
+        raise
+    Diagnostics(page)
 
+def Diagnostics(page):
+    record = finish_run(page)
+    if record is None or not diagnostics_requested():
+        return
+    import pandas as pd
+    with st.sidebar:
+        with st.expander('⏱️ Diagnostics', expanded = True):
+            st.caption(f"This run of the page took {round(record['seconds'] * 1000)} ms.")
+            stages = pd.DataFrame(summarise_spans(record), columns = ['Stage', 'Calls', 'Seconds'])
+            stages['Milliseconds'] = stages['Seconds'] * 1000
+            st.dataframe(
+                stages
+                , hide_index = True
+                , column_order = ('Stage', 'Calls', 'Milliseconds')
+                , column_config = {
+                    'Milliseconds' : st.column_config.NumberColumn('Time (ms)', format = "%.1f")
+                    }
+                )
+            st.caption('Stages can contain other stages, e.g. mde_curve contains mde_cr. Cached results take almost no time.')
+
+# Create a footer
+# htbuilder is imported inside the functions, so it is only loaded when the footer is rendered
 def image(src_as_string, **style):
+    from htbuilder import img, styles
     return img(src=src_as_string, style=styles(**style))
 
 def link(link, text, **style):
+    from htbuilder import a, styles
     return a(_href=link, _target="_blank", style=styles(**style))(text)
 
 def layout(*args):
+    from htbuilder import HtmlElement, div, hr, p, styles
+    from htbuilder.units import percent, px
 
     style = """
     <style>
@@ -69,9 +115,9 @@ def layout(*args):
             body(arg)
 
     st.markdown(str(foot), unsafe_allow_html=True)
-br
 
 def footer():
+    from htbuilder.units import px
     myargs = [
         "Made in ",
         image('https://avatars3.githubusercontent.com/u/45109972?s=400&v=4',
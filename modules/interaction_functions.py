@@ -0,0 +1,351 @@
+from itertools import combinations
+import numpy as np
+from modules.correction_functions import adjust_pvalues
+from modules.timing_functions import timed
+
+## Interactions between concurrent experiments
+### The input is an assignment table with one column per experiment that holds the variant of the visitor
+### (empty if the visitor is not in the experiment). It can have one row per visitor or one row per combination of
+### variants with a visitors column. Rows are first aggregated into the cells of all experiments (with the sufficient
+### statistics of the metrics), then the contingency table of every pair (or triple, ...) of experiments is built
+### with one np.bincount over the cells. Large csv files are aggregated chunk by chunk (stream_assignments_csv), only the
+### cells are kept in memory.
+### Traffic interaction: chi-square test of independence of the assignments, as scipy.stats.chi2_contingency
+### (with Yates' correction for 2x2 tables). Higher orders test the mutual independence of all experiments.
+### Metric interaction: for every pair, every variant of one experiment and every variant of the other form a 2x2
+### factorial with the two controls. The difference-in-differences of the metric, (variant/variant - control/variant)
+### - (variant/control - control/control), is tested with a z-test from the sufficient statistics of the 4 cells.
+INTERACTION_THRESHOLD = 0.1
+INTERACTION_METRIC_COLUMNS = ['visitors', 'conversions', 'revenue', 'revenue_sum', 'revenue_sum_sq']
+INTERACTION_ID_COLUMNS = ['visitor_id', 'user_id', 'id']
+
+@timed
+def aggregate_assignments(df, experiments = None):
+    """
+    Aggregate an assignment table into one row per combination of variants with sufficient statistics.
+
+    Parameters:
+    df (pd.DataFrame): One row per visitor, or one row per combination of variants with a visitors column.
+                       One column per experiment with the variant (empty if the visitor is not in the experiment).
+                       Optional metric columns: conversions, revenue (per visitor) or revenue_sum and revenue_sum_sq.
+    experiments (list of str or None): Experiment columns. None uses all columns except the metric and id columns (default: None)
+
+    Returns:
+    tuple: (codes, levels, stats)
+           codes (np.ndarray): Variant index per cell and experiment, shape (cells, experiments), -1 if not in the experiment
+           levels (dict): Experiment name -> list of its variants, in the order of the codes
+           stats (dict): Metric -> np.ndarray with the sum per cell (visitors, and if given conversions, revenue_sum, revenue_sum_sq)
+    """
+    import pandas as pd
+    if experiments is None:
+        experiments = [col for col in df.columns if col not in INTERACTION_METRIC_COLUMNS + INTERACTION_ID_COLUMNS]
+    if len(experiments) < 2:
+        raise ValueError("You need at least two experiments.")
+
+    metrics = pd.DataFrame(index = df.index)
+    metrics['visitors'] = df['visitors'] if 'visitors' in df.columns else 1
+    if 'conversions' in df.columns:
+        metrics['conversions'] = df['conversions']
+    if 'revenue' in df.columns:
+        metrics['revenue_sum'] = df['revenue']
+        metrics['revenue_sum_sq'] = df['revenue'] ** 2
+    elif 'revenue_sum' in df.columns and 'revenue_sum_sq' in df.columns:
+        metrics['revenue_sum'] = df['revenue_sum']
+        metrics['revenue_sum_sq'] = df['revenue_sum_sq']
+    metrics = metrics.astype(np.float64)
+    if (metrics < 0).any().any():
+        raise ValueError("The visitors and metrics can't be negative.")
+
+    levels = {}
+    codes = np.empty((len(df), len(experiments)), dtype = np.int64)
+    for i, experiment in enumerate(experiments):
+        codes[:, i], uniques = pd.factorize(df[experiment], sort = True)
+        levels[experiment] = list(uniques)
+
+    # One cell per observed combination of variants. The combination is encoded as one integer when it fits into int64,
+    # which is much faster to group than the rows of the code matrix.
+    radix = codes.max(axis = 0) + 2
+    if np.sum(np.log2(radix)) < 62:
+        keys = np.ravel_multi_index(tuple((codes + 1).T), radix)
+        unique_keys, inverse = np.unique(keys, return_inverse = True)
+        cells = np.stack(np.unravel_index(unique_keys, radix), axis = 1) - 1
+    else:
+        cells, inverse = np.unique(codes, axis = 0, return_inverse = True)
+    stats = {col : np.bincount(inverse.ravel(), weights = metrics[col].to_numpy(), minlength = len(cells)) for col in metrics.columns}
+
+    return cells, levels, stats
+
+def _cells_table(cells, levels, stats):
+    # Back from codes to variant names, so cells of chunks with different variants can be merged.
+    # The code -1 picks the appended None: the visitor is not in the experiment.
+    import pandas as pd
+    table = pd.DataFrame({name : np.array(list(variants) + [None], dtype = object)[cells[:, i]] for i, (name, variants) in enumerate(levels.items())})
+    for col, values in stats.items():
+        table[col] = values
+
+    return table
+
+@timed
+def stream_assignments_csv(source, experiments = None, chunksize = 1_000_000):
+    """
+    Read a visitor level assignment csv file in chunks and aggregate it into one row per combination of variants in one pass.
+    Memory usage is bounded by the chunk size and the number of combinations, independent of the number of visitors.
+    The variants are read as text.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header row, see aggregate_assignments
+    experiments (list of str or None): Experiment columns. None uses all columns except the metric and id columns (default: None)
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    pd.DataFrame: One row per combination of variants with the experiment columns and the sums visitors and, if given,
+                  conversions, revenue_sum and revenue_sum_sq. It can be passed to detect_interactions and
+                  detect_metric_interactions like the visitor level table.
+    """
+    import pandas as pd
+    from collections import defaultdict
+    totals = None
+    reader = pd.read_csv(
+        source
+        , usecols = lambda col: col not in INTERACTION_ID_COLUMNS
+        , dtype = defaultdict(lambda: str, {col : np.float64 for col in INTERACTION_METRIC_COLUMNS})
+        , chunksize = chunksize
+        )
+    for chunk in reader:
+        if len(chunk) == 0:
+            continue
+        cells, levels, stats = aggregate_assignments(chunk, experiments)
+        table = _cells_table(cells, levels, stats)
+        names = list(levels)
+        totals = table if totals is None else pd.concat([totals, table]).groupby(names, sort = False, dropna = False, as_index = False).sum()
+    if totals is None:
+        raise ValueError("The file contains no visitors.")
+
+    return totals
+
+INTERACTION_BLOCK_CELLS = 65_536 # cells per block of the one-hot matrix
+
+def _pair_tables(codes, weights, groups):
+    # All 2-way tables are blocks of one weighted Gram matrix of the one-hot encoded variants: X^T diag(weights) X.
+    # One matrix product over blocks of cells replaces one pass over the cells per pair.
+    num_cells, num_experiments = codes.shape
+    num_levels = int(codes.max()) + 1
+    size = num_experiments * num_levels
+    columns = np.where(codes >= 0, codes + np.arange(num_experiments) * num_levels, -1)
+    gram = np.zeros((weights.shape[1], size, size))
+    for start in range(0, num_cells, INTERACTION_BLOCK_CELLS):
+        block = columns[start:start + INTERACTION_BLOCK_CELLS]
+        rows, cols = np.nonzero(block >= 0)
+        one_hot = np.zeros((len(block), size))
+        one_hot[rows, block[rows, cols]] = 1.0
+        for m in range(weights.shape[1]):
+            gram[m] += one_hot.T @ (one_hot * weights[start:start + INTERACTION_BLOCK_CELLS, m, None])
+
+    gram = gram.reshape(-1, num_experiments, num_levels, num_experiments, num_levels)
+    first, second = np.array(groups).T
+
+    return gram[:, first, :, second, :].transpose(1, 0, 2, 3)
+
+def contingency_tables(codes, weights, groups):
+    """
+    Build the contingency tables of many groups of experiments.
+
+    Parameters:
+    codes (np.ndarray): Variant index per cell and experiment, -1 if not in the experiment, see aggregate_assignments
+    weights (np.ndarray): Value per cell to sum up, e.g. visitors. A matrix of shape (cells, m) builds m tables per group at once.
+    groups (list of tuple): Experiment indices per table, all of the same length (e.g. pairs)
+
+    Returns:
+    np.ndarray: Tables of shape (groups, k, k, ...), with k the largest number of variants, or (m, groups, k, k, ...)
+                for a matrix of weights. Only cells with visitors in all experiments of a group are counted.
+    """
+    weights = np.asarray(weights, dtype = np.float64)
+    matrix = weights.ndim == 2
+    weights = weights.reshape(len(codes), -1)
+    order = len(groups[0])
+    if order == 2:
+        tables = _pair_tables(codes, weights, groups)
+        return tables if matrix else tables[0]
+
+    # Shifted by 1, so visitors that are not in an experiment land in the first row and are cut off afterwards
+    shifted = (codes + 1).astype(np.int64)
+    num_levels = int(shifted.max()) + 1
+    shape = (num_levels,) * order
+    tables = np.zeros((weights.shape[1], len(groups)) + (num_levels - 1,) * order)
+    for g, group in enumerate(groups):
+        flat = np.ravel_multi_index(tuple(shifted[:, group].T), shape)
+        for m in range(weights.shape[1]):
+            tables[m, g] = np.bincount(flat, weights = weights[:, m], minlength = num_levels ** order).reshape(shape)[(slice(1, None),) * order]
+
+    return tables if matrix else tables[0]
+
+def independence_test(tables, correction = True):
+    """
+    Calculate the chi-square test of (mutual) independence for many contingency tables at once.
+    Variants without visitors in a table are left out. For 2-way tables the result is the same as scipy.stats.chi2_contingency.
+
+    Parameters:
+    tables (np.ndarray): Tables of shape (tables, k, k, ...), see contingency_tables
+    correction (bool): Yates' correction for tables with 1 degree of freedom (default: True)
+
+    Returns:
+    tuple: (statistic, dof, pvalue), arrays with one value per table. dof is 0 and the p-value 1 for tables
+           with less than 2 variants with visitors in one of the experiments.
+    """
+    from scipy.stats import chi2
+    order = tables.ndim - 1
+    total = tables.reshape(len(tables), -1).sum(axis = 1)
+    safe_total = np.where(total > 0, total, 1.0)
+    expected = np.broadcast_to(safe_total.reshape((-1,) + (1,) * order), tables.shape).copy()
+    num_levels = []
+    for axis in range(1, order + 1):
+        margin = tables.sum(axis = tuple(a for a in range(1, order + 1) if a != axis), keepdims = True)
+        expected = expected * margin / safe_total.reshape((-1,) + (1,) * order)
+        num_levels.append(np.count_nonzero(margin.reshape(len(tables), -1), axis = 1))
+    num_levels = np.array(num_levels)
+    dof = np.prod(num_levels, axis = 0) - 1 - np.sum(num_levels - 1, axis = 0)
+
+    observed = tables
+    if correction:
+        yates = (dof == 1).reshape((-1,) + (1,) * order)
+        diff = expected - tables
+        observed = np.where(yates, tables + np.sign(diff) * np.minimum(0.5, np.abs(diff)), tables)
+
+    terms = np.divide((observed - expected) ** 2, expected, out = np.zeros(tables.shape), where = expected > 0)
+    statistic = terms.reshape(len(tables), -1).sum(axis = 1)
+    valid = np.all(num_levels >= 2, axis = 0)
+    pvalue = np.where(valid, chi2.sf(statistic, np.maximum(dof, 1)), 1.0)
+
+    return np.where(valid, statistic, 0.0), np.where(valid, dof, 0), pvalue
+
+@timed
+def detect_interactions(df, experiments = None, order = 2, alpha = INTERACTION_THRESHOLD, correction_method = 'holm'):
+    """
+    Test every pair (or triple, ...) of concurrent experiments for a traffic interaction.
+
+    Parameters:
+    df (pd.DataFrame): Assignment table, see aggregate_assignments
+    experiments (list of str or None): Experiment columns. None uses all columns except the metric and id columns (default: None)
+    order (int): Number of experiments per test, 2 for pairs (default: 2)
+    alpha (float): Family-wise error rate (or false discovery rate for 'fdr_bh') over all tests (default: INTERACTION_THRESHOLD)
+    correction_method (str): Multiple testing correction, one of CORRECTION_METHODS (default: 'holm')
+
+    Returns:
+    pd.DataFrame: One row per group of experiments, ranked by p-value, with the columns experiment_1, experiment_2, ...,
+                  visitors (in all experiments of the group), statistic, dof, pvalue, pvalue_adjusted and interaction_detected
+    """
+    import pandas as pd
+    codes, levels, stats = aggregate_assignments(df, experiments)
+    names = list(levels)
+    if order < 2 or order > len(names):
+        raise ValueError(f"order must be between 2 and the number of experiments ({len(names)}).")
+
+    groups = list(combinations(range(len(names)), order))
+    tables = contingency_tables(codes, stats['visitors'], groups)
+    statistic, dof, pvalue = independence_test(tables)
+    pvalue_adjusted = adjust_pvalues(pvalue, correction_method)
+
+    result = pd.DataFrame({f'experiment_{i + 1}' : [names[group[i]] for group in groups] for i in range(order)})
+    result['visitors'] = tables.reshape(len(groups), -1).sum(axis = 1)
+    result['statistic'] = statistic
+    result['dof'] = dof
+    result['pvalue'] = pvalue
+    result['pvalue_adjusted'] = pvalue_adjusted
+    result['interaction_detected'] = pvalue_adjusted <= alpha
+
+    return result.sort_values('pvalue', kind = 'stable').reset_index(drop = True)
+
+def difference_in_differences(mean, var, nobs):
+    """
+    Calculate the difference-in-differences z-test of 2x2 factorials from cell means.
+    All parameters are arrays of shape (..., 2, 2) with [control, variant] of the first experiment on the second last
+    axis and [control, variant] of the second experiment on the last axis.
+
+    Parameters:
+    mean (np.ndarray): Mean of the metric per cell
+    var (np.ndarray): Variance of the metric per visitor per cell (ddof = 1)
+    nobs (np.ndarray): Visitors per cell
+
+    Returns:
+    tuple: (effect_control, effect_variant, interaction, zstat, pvalue)
+           effect_control, effect_variant: Effect of the variant of the first experiment when the visitor is in the
+           control / variant of the second experiment. interaction: effect_variant - effect_control.
+    """
+    from scipy.stats import norm
+    effect_control = mean[..., 1, 0] - mean[..., 0, 0]
+    effect_variant = mean[..., 1, 1] - mean[..., 0, 1]
+    interaction = effect_variant - effect_control
+    std_err = np.sqrt(np.sum(np.divide(var, nobs, out = np.full(np.shape(var), np.inf), where = nobs > 0), axis = (-2, -1)))
+    zstat = np.divide(interaction, std_err, out = np.zeros(np.shape(interaction)), where = (std_err > 0) & np.isfinite(std_err))
+    pvalue = norm.sf(np.abs(zstat)) * 2
+
+    return effect_control, effect_variant, interaction, zstat, pvalue
+
+@timed
+def detect_metric_interactions(df, experiments = None, control = None, alpha = INTERACTION_THRESHOLD, correction_method = 'holm'):
+    """
+    Test for every pair of concurrent experiments whether the effect of one experiment on the conversion rate and the
+    revenue per visitor depends on the variant of the other experiment.
+    Only the per-cell sufficient statistics are used, so the table can be aggregated beforehand.
+
+    Parameters:
+    df (pd.DataFrame): Assignment table with conversions and/or revenue columns, see aggregate_assignments
+    experiments (list of str or None): Experiment columns. None uses all columns except the metric and id columns (default: None)
+    control (str or None): Name of the control variant in all experiments. None uses the first variant in sort order (default: None)
+    alpha (float): Family-wise error rate (or false discovery rate for 'fdr_bh') over all tests (default: INTERACTION_THRESHOLD)
+    correction_method (str): Multiple testing correction, one of CORRECTION_METHODS (default: 'holm')
+
+    Returns:
+    pd.DataFrame: One row per pair of experiments, pair of variants and metric, ranked by p-value, with the columns
+                  experiment_1, variant_1, experiment_2, variant_2, metric, effect_control, effect_variant (effect of
+                  variant_1 in the control / variant_2 of experiment 2), interaction, zstat, pvalue, pvalue_adjusted
+                  and interaction_detected
+    """
+    import pandas as pd
+    codes, levels, stats = aggregate_assignments(df, experiments)
+    metrics = []
+    if 'conversions' in stats:
+        metrics.append('conversion_rate')
+    if 'revenue_sum' in stats:
+        metrics.append('revenue_per_visitor')
+    if not metrics:
+        raise ValueError("The table needs a conversions or revenue column.")
+
+    # Recode every experiment so that its control has the code 0
+    names = list(levels)
+    for i, name in enumerate(names):
+        control_code = 0 if control is None else levels[name].index(control) if control in levels[name] else None
+        if control_code is None:
+            raise ValueError(f"The experiment {name} has no variant {control}.")
+        order = [control_code] + [code for code in range(len(levels[name])) if code != control_code]
+        recode = np.argsort(order)
+        codes[:, i] = np.where(codes[:, i] >= 0, recode[codes[:, i]], -1)
+        levels[name] = [levels[name][code] for code in order]
+
+    pairs = list(combinations(range(len(names)), 2))
+    tables = dict(zip(stats, contingency_tables(codes, np.column_stack(list(stats.values())), pairs)))
+    nobs = tables['visitors']
+
+    rows = []
+    for metric in metrics:
+        if metric == 'conversion_rate':
+            mean = np.divide(tables['conversions'], nobs, out = np.zeros(nobs.shape), where = nobs > 0)
+            var = mean * (1 - mean) * np.divide(nobs, nobs - 1, out = np.zeros(nobs.shape), where = nobs > 1)
+        else:
+            mean = np.divide(tables['revenue_sum'], nobs, out = np.zeros(nobs.shape), where = nobs > 0)
+            var = np.divide(np.maximum(tables['revenue_sum_sq'] - tables['revenue_sum'] * mean, 0.0), nobs - 1, out = np.zeros(nobs.shape), where = nobs > 1)
+
+        # One 2x2 factorial per pair and combination of variants (control = code 0)
+        for p, (first, second) in enumerate(pairs):
+            for a in range(1, len(levels[names[first]])):
+                for b in range(1, len(levels[names[second]])):
+                    cells = np.ix_([0, a], [0, b])
+                    rows.append((names[first], levels[names[first]][a], names[second], levels[names[second]][b], metric
+                                 , *difference_in_differences(mean[p][cells], var[p][cells], nobs[p][cells])))
+
+    result = pd.DataFrame(rows, columns = ['experiment_1', 'variant_1', 'experiment_2', 'variant_2', 'metric', 'effect_control', 'effect_variant', 'interaction', 'zstat', 'pvalue'])
+    result = result.astype({'effect_control' : float, 'effect_variant' : float, 'interaction' : float, 'zstat' : float, 'pvalue' : float})
+    result['pvalue_adjusted'] = adjust_pvalues(result['pvalue'], correction_method)
+    result['interaction_detected'] = result['pvalue_adjusted'] <= alpha
+
+    return result.sort_values('pvalue', kind = 'stable').reset_index(drop = True)
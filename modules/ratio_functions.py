@@ -0,0 +1,142 @@
+import numpy as np
+from modules.correction_functions import adjust_pvalues
+from modules.timing_functions import timed
+from modules.variant_functions import control_index
+from modules.variant_functions import stream_variant_csv
+from modules.variant_functions import variant_sufficient_stats
+
+## Ratio metrics with the delta method
+### Metrics like the average order value (revenue / orders), the revenue per order or the items per session divide two
+### sums over the same users. The orders (or sessions) of a user are not independent of each other, so the usual
+### variance of the orders' mean is too small and a t-test over the orders gives too many false positives. The user
+### is the unit of randomisation: numerator x and denominator y are summed up per user, and the variance of the ratio
+### R = sum(x) / sum(y) follows from the delta method:
+###     var(R) = (var(x) - 2 * R * cov(x, y) + R^2 * var(y)) / (n * mean(y)^2)
+### It only needs the sufficient statistics per variant (users, sums, sums of squares and the sum of the cross
+### products), which are summed up chunk by chunk, or in the database with SUM(), so the event rows never have to be
+### loaded into memory.
+RATIO_COLUMNS = ['variant', 'users', 'numerator_sum', 'numerator_sum_sq', 'denominator_sum', 'denominator_sum_sq', 'cross_sum']
+
+def ratio_sufficient_stats(df, numerator, denominator, variant = None):
+    """
+    Calculate the sufficient statistics of a ratio metric per variant from user level data.
+    Empty values count as 0, e.g. a user without an order.
+
+    Parameters:
+    df (pd.DataFrame): One row per user, with the events of the user already summed up
+    numerator (str): Column of the numerator, e.g. the revenue of the user
+    denominator (str): Column of the denominator, e.g. the number of orders of the user
+    variant (str or None): Column of the variant. None treats all rows as one group, e.g. for planning (default: None)
+
+    Returns:
+    pd.DataFrame: One row per variant, in the order of their first row, with the columns RATIO_COLUMNS
+    """
+    return variant_sufficient_stats(df, numerator, denominator, variant, RATIO_COLUMNS)
+
+@timed
+def stream_ratio_csv(source, numerator, denominator, variant = None, chunksize = 1_000_000):
+    """
+    Read a user level csv file in chunks and sum up the sufficient statistics of a ratio metric per variant in one pass.
+    Memory usage is bounded by the chunk size, independent of the file size.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header row and one row per user
+    numerator, denominator, variant: See ratio_sufficient_stats
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    pd.DataFrame: See ratio_sufficient_stats
+    """
+    return stream_variant_csv(source, numerator, denominator, variant, RATIO_COLUMNS, chunksize)
+
+def ratio_moments(stats):
+    """
+    Calculate the ratio metric and its delta method variance per variant.
+    All columns can hold many variants (or experiments) at once.
+
+    Parameters:
+    stats (pd.DataFrame or dict): Sufficient statistics with the columns of RATIO_COLUMNS
+
+    Returns:
+    tuple: (ratio, var)
+           var is the variance per user (ratio's variance times the number of users), so the standard error of the
+           ratio is sqrt(var / users) and sqrt(var) is the standard deviation to use in mde_curve with the users
+           as visitors.
+    """
+    n = np.asarray(stats['users'], dtype = np.float64)
+    sum_x = np.asarray(stats['numerator_sum'], dtype = np.float64)
+    sum_y = np.asarray(stats['denominator_sum'], dtype = np.float64)
+    mean_x = sum_x / n
+    mean_y = sum_y / n
+    ratio = sum_x / sum_y
+    # Variances and covariance of the per user sums (ddof = 1)
+    var_x = (np.asarray(stats['numerator_sum_sq'], dtype = np.float64) - n * mean_x ** 2) / (n - 1)
+    var_y = (np.asarray(stats['denominator_sum_sq'], dtype = np.float64) - n * mean_y ** 2) / (n - 1)
+    cov_xy = (np.asarray(stats['cross_sum'], dtype = np.float64) - n * mean_x * mean_y) / (n - 1)
+
+    var = np.maximum(var_x - 2 * ratio * cov_xy + ratio ** 2 * var_y, 0.0) / mean_y ** 2
+
+    return ratio, var
+
+@timed
+def ratio_test(stats, alpha = 0.05, alternative = 'two-sided', control = None, correction_method = 'bonferroni'):
+    """
+    Compare the ratio metric of every variant with the control, with a z-test on the delta method variances.
+
+    Parameters:
+    stats (pd.DataFrame): Sufficient statistics per variant with the columns RATIO_COLUMNS, see ratio_sufficient_stats
+    alpha (float): Significance level (default: 0.05)
+    alternative (str): 'two-sided', 'larger' or 'smaller', as in the hypothesis tester (default: 'two-sided')
+    control (str or None): Name of the control variant. None uses the first row (default: None)
+    correction_method (str): Correction for multiple variants, one of CORRECTION_METHODS (default: 'bonferroni')
+
+    Returns:
+    pd.DataFrame: One row per variant (control excluded) with the ratios, the difference (absolute and in %),
+                  its standard error, the p-value, the corrected p-value and whether it is significant
+    """
+    import pandas as pd
+    from scipy.stats import norm
+    missing = [col for col in RATIO_COLUMNS if col not in stats.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    stats = stats.reset_index(drop = True)
+    if len(stats) < 2:
+        raise ValueError("You need a control and at least one variant.")
+    if (stats['users'] < 2).any():
+        raise ValueError("Every variant needs at least 2 users.")
+    if (stats['denominator_sum'] <= 0).any():
+        raise ValueError("The denominator has to sum up to more than 0 in every variant.")
+    control_idx = control_index(stats['variant'], control)
+
+    ratio, var = ratio_moments(stats)
+    nobs = stats['users'].to_numpy(dtype = np.float64)
+    is_variant = np.arange(len(stats)) != control_idx
+
+    # The users of control and variant are independent, so the variances of the two ratios add up
+    std_err = np.sqrt(var[control_idx] / nobs[control_idx] + var[is_variant] / nobs[is_variant])
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        zstat = (ratio[control_idx] - ratio[is_variant]) / std_err
+    if alternative in ['two-sided', '2-sided', '2s']:
+        pvalue = norm.sf(np.abs(zstat)) * 2
+    elif alternative in ['larger', 'l']:
+        pvalue = norm.sf(zstat)
+    elif alternative in ['smaller', 's']:
+        pvalue = norm.cdf(zstat)
+    else:
+        raise ValueError("alternative must be 'two-sided', 'larger' or 'smaller'.")
+    pvalue_adjusted = adjust_pvalues(pvalue, correction_method)
+
+    return pd.DataFrame(
+        {'variant' : stats.loc[is_variant, 'variant'].to_numpy()
+        , 'users' : nobs[is_variant]
+        , 'denominator_sum' : stats.loc[is_variant, 'denominator_sum'].to_numpy(dtype = np.float64)
+        , 'ratio_control' : ratio[control_idx]
+        , 'ratio' : ratio[is_variant]
+        , 'diff' : ratio[is_variant] - ratio[control_idx]
+        , 'uplift_perc' : (ratio[is_variant] / ratio[control_idx] - 1) * 100
+        , 'std_err' : std_err
+        , 'zstat' : zstat
+        , 'pvalue' : pvalue
+        , 'pvalue_adjusted' : pvalue_adjusted
+        , 'significant' : pvalue_adjusted <= alpha
+        })
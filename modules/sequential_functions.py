@@ -0,0 +1,203 @@
+from collections import namedtuple
+import numpy as np
+from modules.timing_functions import timed
+
+## Sequential testing of conversion rates (mixture SPRT)
+### A fixed-horizon p-value is only valid once, at the planned sample size. Looking at it every day and stopping
+### as soon as it is below alpha inflates the false positive rate. The mixture sequential probability ratio test
+### (mSPRT) gives an always-valid p-value: it can be checked after every new batch of data and the false positive
+### rate stays below alpha, whenever the experiment is stopped.
+### The difference of the conversion rates (variant - control) is tested with a normal mixture of width tau.
+### The running state per experiment only holds the cumulative counts and the current p-value, every new batch
+### updates it in O(1), independent of the number of batches seen before.
+### All state fields can be NumPy arrays to monitor many experiments at once.
+MSPRT_TAU = 0.005 # standard deviation of the mixture over the true difference of the conversion rates
+
+SequentialState = namedtuple(
+    'SequentialState'
+    , ['visitors1', 'conversions1', 'visitors2', 'conversions2', 'pvalue', 'num_updates']
+    )
+
+def sequential_start(shape = ()):
+    """
+    Create the state of experiments without any data.
+
+    Parameters:
+    shape (int or tuple): Number of experiments, () for a single experiment (default: ())
+
+    Returns:
+    SequentialState: Zero counts and a p-value of 1
+    """
+    zeros = np.zeros(shape)
+
+    return SequentialState(zeros, zeros, zeros, zeros, np.ones(shape), np.zeros(shape, dtype = np.int64))
+
+def _rates_and_variance(visitors1, conversions1, visitors2, conversions2):
+    # Conversion rates and the variance of their difference. Arms without visitors get a rate of 0, the variance is
+    # only valid (and replaced by 1) while both arms have visitors and it is larger than 0.
+    visitors1 = np.asarray(visitors1, dtype = np.float64)
+    visitors2 = np.asarray(visitors2, dtype = np.float64)
+    has_data = (visitors1 > 0) & (visitors2 > 0)
+    cr1 = np.divide(conversions1, visitors1, out = np.zeros(has_data.shape), where = has_data)
+    cr2 = np.divide(conversions2, visitors2, out = np.zeros(has_data.shape), where = has_data)
+    var = np.divide(cr1 * (1 - cr1), visitors1, out = np.zeros(has_data.shape), where = has_data) \
+        + np.divide(cr2 * (1 - cr2), visitors2, out = np.zeros(has_data.shape), where = has_data)
+    valid = has_data & (var > 0)
+
+    return cr1, cr2, np.where(valid, var, 1.0), valid
+
+def msprt_log_likelihood_ratio(visitors1, conversions1, visitors2, conversions2, tau = MSPRT_TAU):
+    """
+    Calculate the log mixture likelihood ratio of the difference of two conversion rates against no difference.
+    All parameters can be NumPy arrays.
+
+    Parameters:
+    visitors1, conversions1 (int or array-like): Cumulative visitors and conversions of the control(s)
+    visitors2, conversions2 (int or array-like): Cumulative visitors and conversions of the variant(s)
+    tau (float): Standard deviation of the normal mixture over the difference (default: MSPRT_TAU)
+
+    Returns:
+    float or np.ndarray: Log likelihood ratio. 0 while a sample has no visitors or the variance is 0.
+    """
+    cr1, cr2, var, valid = _rates_and_variance(visitors1, conversions1, visitors2, conversions2)
+    tau_sq = tau ** 2
+    log_lr = 0.5 * np.log(var / (var + tau_sq)) + tau_sq * (cr2 - cr1) ** 2 / (2 * var * (var + tau_sq))
+
+    return np.where(valid, log_lr, 0.0)
+
+def msprt_update(state, visitors1, conversions1, visitors2, conversions2, tau = MSPRT_TAU):
+    """
+    Add a new batch of data (e.g. one day) to the running state and update the always-valid p-value.
+
+    Parameters:
+    state (SequentialState): State before the batch, see sequential_start
+    visitors1, conversions1 (int or array-like): New visitors and conversions of the control(s) in this batch
+    visitors2, conversions2 (int or array-like): New visitors and conversions of the variant(s) in this batch
+    tau (float): Standard deviation of the normal mixture, must stay the same for all updates (default: MSPRT_TAU)
+
+    Returns:
+    SequentialState: State after the batch
+    """
+    visitors1 = state.visitors1 + np.asarray(visitors1, dtype = np.float64)
+    conversions1 = state.conversions1 + np.asarray(conversions1, dtype = np.float64)
+    visitors2 = state.visitors2 + np.asarray(visitors2, dtype = np.float64)
+    conversions2 = state.conversions2 + np.asarray(conversions2, dtype = np.float64)
+    if np.any(conversions1 > visitors1) or np.any(conversions2 > visitors2):
+        raise ValueError("You shouldn't have more conversions than visitors.")
+
+    log_lr = msprt_log_likelihood_ratio(visitors1, conversions1, visitors2, conversions2, tau)
+    # The always-valid p-value never increases: p_n = min(p_n-1, 1 / likelihood ratio)
+    pvalue = np.minimum(state.pvalue, np.exp(-np.maximum(log_lr, 0.0)))
+
+    return SequentialState(visitors1, conversions1, visitors2, conversions2, pvalue, state.num_updates + 1)
+
+def msprt_confidence_interval(state, alpha = 0.05, tau = MSPRT_TAU):
+    """
+    Calculate the always-valid confidence interval of the difference of the conversion rates (variant - control)
+    at the current state.
+
+    Parameters:
+    state (SequentialState): Current state
+    alpha (float): Significance level (default: 0.05)
+    tau (float): Standard deviation of the normal mixture (default: MSPRT_TAU)
+
+    Returns:
+    tuple: (diff, ci_low, ci_high)
+           diff is 0 while an arm has no visitors. Without a variance (an arm without visitors, or no conversions
+           or only conversions in both arms) the data says nothing about the difference and the interval is -1 to 1.
+    """
+    cr1, cr2, var, valid = _rates_and_variance(state.visitors1, state.conversions1, state.visitors2, state.conversions2)
+    tau_sq = tau ** 2
+    diff = cr2 - cr1
+    half_width = np.sqrt(var * (var + tau_sq) / tau_sq * (2 * np.log(1 / alpha) + np.log((var + tau_sq) / var)))
+
+    return diff, np.where(valid, diff - half_width, -1.0), np.where(valid, diff + half_width, 1.0)
+
+### Monitoring many experiments from daily tables
+### The state is a table with one row per experiment and variant, it can be stored as csv and updated with the next batch.
+SEQUENTIAL_STATE_COLUMNS = ['experiment', 'variant', 'visitors_control', 'conversions_control', 'visitors', 'conversions', 'pvalue', 'num_updates']
+
+@timed
+def monitor_experiments(batch, state = None, alpha = 0.05, tau = MSPRT_TAU, control = None):
+    """
+    Update the sequential tests of many experiments with a new batch of data.
+
+    Parameters:
+    batch (pd.DataFrame): New data since the last update, one row per experiment and variant with the columns
+                          experiment, variant, visitors, conversions (same format as analyse_experiments)
+    state (pd.DataFrame or None): Result of the previous update. None starts all experiments (default: None)
+    alpha (float): Significance level, with Bonferroni correction per experiment (default: 0.05)
+    tau (float): Standard deviation of the normal mixture, must stay the same for all updates (default: MSPRT_TAU)
+    control (str or None): Name of the control variant. None uses the first row of every experiment (default: None)
+
+    Returns:
+    pd.DataFrame: New state, one row per variant (controls excluded) with the cumulative counts, the always-valid
+                  p-value, the difference of the conversion rates with its always-valid confidence interval
+                  and whether the variant is significant
+    """
+    import pandas as pd
+    missing = [col for col in ['experiment', 'variant', 'visitors', 'conversions'] if col not in batch.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+
+    batch = batch.reset_index(drop = True)
+    if control is None:
+        is_control = ~batch['experiment'].duplicated()
+    else:
+        is_control = batch['variant'] == control
+    if (is_control.groupby(batch['experiment']).sum() != 1).any():
+        raise ValueError("Every experiment needs exactly one control.")
+
+    controls = batch[is_control].set_index('experiment')
+    variants = batch[~is_control]
+    ctrl = controls.loc[variants['experiment']]
+    new = pd.DataFrame(
+        {'experiment' : variants['experiment'].to_numpy()
+        , 'variant' : variants['variant'].to_numpy()
+        , 'visitors_control' : ctrl['visitors'].to_numpy(dtype = np.float64)
+        , 'conversions_control' : ctrl['conversions'].to_numpy(dtype = np.float64)
+        , 'visitors' : variants['visitors'].to_numpy(dtype = np.float64)
+        , 'conversions' : variants['conversions'].to_numpy(dtype = np.float64)
+        })
+
+    # Experiments and variants without an earlier state start from zero, experiments without new data keep their state
+    if state is None:
+        state = pd.DataFrame(columns = SEQUENTIAL_STATE_COLUMNS)
+    before_columns = {col : col + '_before' for col in SEQUENTIAL_STATE_COLUMNS[2:]}
+    merged = new.merge(state[SEQUENTIAL_STATE_COLUMNS].rename(columns = before_columns), on = ['experiment', 'variant'], how = 'outer')
+    before = SequentialState(
+        merged['visitors_control_before'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['conversions_control_before'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['visitors_before'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['conversions_before'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['pvalue_before'].fillna(1).to_numpy(dtype = np.float64)
+        , merged['num_updates_before'].fillna(0).to_numpy(dtype = np.int64)
+        )
+    has_batch = merged['visitors'].notna().to_numpy()
+    after = msprt_update(
+        before
+        , merged['visitors_control'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['conversions_control'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['visitors'].fillna(0).to_numpy(dtype = np.float64)
+        , merged['conversions'].fillna(0).to_numpy(dtype = np.float64)
+        , tau = tau
+        )
+    after = after._replace(num_updates = np.where(has_batch, after.num_updates, before.num_updates))
+
+    num_variants = merged.groupby('experiment')['variant'].transform('size').to_numpy()
+    diff, ci_low, ci_high = msprt_confidence_interval(after, alpha / num_variants, tau)
+
+    return pd.DataFrame(
+        {'experiment' : merged['experiment'].to_numpy()
+        , 'variant' : merged['variant'].to_numpy()
+        , 'visitors_control' : after.visitors1
+        , 'conversions_control' : after.conversions1
+        , 'visitors' : after.visitors2
+        , 'conversions' : after.conversions2
+        , 'pvalue' : after.pvalue
+        , 'num_updates' : after.num_updates
+        , 'diff' : diff
+        , 'ci_low' : ci_low
+        , 'ci_high' : ci_high
+        , 'significant' : after.pvalue <= alpha / num_variants
+        })
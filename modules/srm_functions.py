@@ -0,0 +1,403 @@
+from collections import Counter
+from collections import namedtuple
+import numpy as np
+from modules.timing_functions import timed
+
+## Sample ratio mismatch (SRM) tests
+### All tests take a matrix of visitors with one row per experiment and one column per arm, so thousands of
+### experiments are checked in one call. Experiments with fewer arms are padded with arms of expected share 0,
+### which are ignored. A single experiment can be passed as a plain list of visitors.
+### - chi-square: Pearson's goodness of fit test, as scipy.stats.chisquare
+### - G-test: likelihood ratio test, less sensitive to arms with a large share
+### - exact: Monte Carlo version of the exact multinomial test. Visitors are simulated under the expected split and
+###   the p-value is the share of simulations with a chi-square statistic at least as large as the observed one.
+###   The chi-square distribution is not needed, so it also holds for many arms with small expected counts.
+###   Simulations run in batches and stop for every experiment as soon as the p-value is clearly above or below
+###   the threshold, so only borderline experiments use the full number of simulations.
+SRM_THRESHOLD = 0.1
+SRM_METHODS = ['auto', 'chisquare', 'gtest', 'exact']
+SRM_MIN_EXPECTED = 5 # smallest expected count for which 'auto' trusts the chi-square approximation
+SRM_SIMULATIONS = 100_000
+SRM_SEED = 42
+SRM_BATCH_SIMULATIONS = 10_000 # simulations per experiment and batch, the p-value is checked after every batch
+SRM_MAX_CELLS = 2 ** 22 # upper bound of the simulated counts per batch (32 MiB of int64)
+SRM_SETTLED_Z = 3.29 # the Monte Carlo p-value is settled when the threshold is outside its 99.9 % interval
+
+SrmResult = namedtuple(
+    'SrmResult'
+    , ['statistic', 'pvalue', 'dof', 'method', 'num_simulations']
+    )
+
+def _prepare(counts, expected_share):
+    counts = np.asarray(counts, dtype = np.float64)
+    single = counts.ndim == 1
+    counts = np.atleast_2d(counts)
+    is_arm = ~np.isnan(counts)
+    counts = np.where(is_arm, counts, 0.0)
+    if np.any(counts < 0):
+        raise ValueError("The number of visitors can't be negative.")
+
+    if expected_share is None:
+        shares = is_arm / is_arm.sum(axis = 1, keepdims = True)
+    else:
+        shares = np.atleast_2d(np.asarray(expected_share, dtype = np.float64))
+        if shares.shape[-1] != counts.shape[1]:
+            raise ValueError("Provide one expected frequency per sample.")
+        shares = np.where(is_arm, np.broadcast_to(shares, counts.shape), 0.0)
+        if np.any(shares[is_arm] <= 0):
+            raise ValueError("Every sample needs an expected frequency larger than 0.")
+        if not np.allclose(shares.sum(axis = 1), 1.0):
+            raise ValueError("Your expected frequencies should sum up to 1.00")
+        shares = shares / shares.sum(axis = 1, keepdims = True)
+
+    dof = is_arm.sum(axis = 1) - 1
+    if np.any(dof < 1):
+        raise ValueError("You need at least two samples.")
+
+    return counts, shares, dof, single
+
+def _pearson(counts, expected):
+    # Padded arms have an expected count of 0 and are skipped
+    return np.sum(np.divide((counts - expected) ** 2, expected, out = np.zeros(np.broadcast(counts, expected).shape), where = expected > 0), axis = -1)
+
+def _result(statistic, pvalue, dof, method, num_simulations, single):
+    if single:
+        return SrmResult(float(statistic[0]), float(pvalue[0]), int(dof[0]), method, int(num_simulations[0]))
+
+    return SrmResult(statistic, pvalue, dof, method, num_simulations)
+
+def srm_chisquare(counts, expected_share = None):
+    """
+    Calculate the chi-square SRM test, same as scipy.stats.chisquare(counts, f_exp = expected_share * sum(counts)).
+
+    Parameters:
+    counts (array-like): Visitors per arm, or a matrix with one row per experiment (NaN for missing arms)
+    expected_share (array-like or None): Expected share of the visitors per arm, summing up to 1. None for an equal split (default: None)
+
+    Returns:
+    SrmResult: statistic, pvalue, dof, method and num_simulations (0), as floats for one experiment or arrays for a matrix
+    """
+    from scipy.stats import chi2
+    counts, shares, dof, single = _prepare(counts, expected_share)
+    statistic = _pearson(counts, shares * counts.sum(axis = 1, keepdims = True))
+
+    return _result(statistic, chi2.sf(statistic, dof), dof, 'chisquare', np.zeros(dof.shape, dtype = np.int64), single)
+
+def srm_gtest(counts, expected_share = None):
+    """
+    Calculate the G-test (likelihood ratio test) for SRM, same as scipy.stats.power_divergence(..., lambda_ = 'log-likelihood').
+
+    Parameters:
+    counts (array-like): Visitors per arm, or a matrix with one row per experiment (NaN for missing arms)
+    expected_share (array-like or None): Expected share of the visitors per arm, summing up to 1. None for an equal split (default: None)
+
+    Returns:
+    SrmResult: See srm_chisquare
+    """
+    from scipy.stats import chi2
+    counts, shares, dof, single = _prepare(counts, expected_share)
+    expected = shares * counts.sum(axis = 1, keepdims = True)
+    # Arms without visitors contribute 0 (lim x -> 0 of x * log(x))
+    terms = np.multiply(counts, np.log(np.divide(counts, expected, out = np.ones(counts.shape), where = (counts > 0) & (expected > 0))))
+    statistic = 2 * terms.sum(axis = 1)
+
+    return _result(statistic, chi2.sf(statistic, dof), dof, 'gtest', np.zeros(dof.shape, dtype = np.int64), single)
+
+def srm_exact(counts, expected_share = None, threshold = SRM_THRESHOLD, max_simulations = SRM_SIMULATIONS, seed = SRM_SEED):
+    """
+    Calculate the Monte Carlo exact multinomial test for SRM with early stopping.
+
+    Parameters:
+    counts (array-like): Visitors per arm, or a matrix with one row per experiment (NaN for missing arms)
+    expected_share (array-like or None): Expected share of the visitors per arm, summing up to 1. None for an equal split (default: None)
+    threshold (float): p-value below which a SRM is reported. Simulations stop once the p-value is clearly on one side of it (default: SRM_THRESHOLD)
+    max_simulations (int): Maximum number of simulations per experiment (default: SRM_SIMULATIONS)
+    seed (int): Seed of the random number generator (default: SRM_SEED)
+
+    Returns:
+    SrmResult: See srm_chisquare, num_simulations is the number of simulations used per experiment
+    """
+    counts, shares, dof, single = _prepare(counts, expected_share)
+    num_visitors = counts.sum(axis = 1)
+    expected = shares * num_visitors[:, None]
+    statistic = _pearson(counts, expected)
+    # Relative tolerance, so simulations with the same statistic as the observed one are counted despite rounding
+    observed = statistic * (1 - 1e-9)
+
+    num_experiments, num_arms = counts.shape
+    hits = np.zeros(num_experiments)
+    num_simulations = np.zeros(num_experiments, dtype = np.int64)
+    active = np.ones(num_experiments, dtype = bool)
+    rng = np.random.default_rng(seed)
+    while active.any():
+        idx = np.flatnonzero(active)
+        batch_size = int(min(SRM_BATCH_SIMULATIONS, max(1, SRM_MAX_CELLS // (idx.size * num_arms)), max_simulations - num_simulations[idx[0]]))
+        simulated = rng.multinomial(num_visitors[idx].astype(np.int64), shares[idx], size = (batch_size, idx.size))
+        hits[idx] += np.sum(_pearson(simulated, expected[idx]) >= observed[idx], axis = 0)
+        num_simulations[idx] += batch_size
+
+        pvalue = (hits[idx] + 1) / (num_simulations[idx] + 1)
+        std_err = np.sqrt(pvalue * (1 - pvalue) / num_simulations[idx])
+        settled = np.abs(pvalue - threshold) > SRM_SETTLED_Z * std_err
+        active[idx[settled | (num_simulations[idx] >= max_simulations)]] = False
+
+    pvalue = (hits + 1) / (num_simulations + 1)
+
+    return _result(statistic, pvalue, dof, 'exact', num_simulations, single)
+
+@timed
+def srm_test(counts, expected_share = None, method = 'auto', threshold = SRM_THRESHOLD):
+    """
+    Test for SRM with the chosen method.
+    'auto' uses the chi-square test when every expected count is at least SRM_MIN_EXPECTED and the exact test otherwise.
+
+    Parameters:
+    counts (array-like): Visitors per arm, or a matrix with one row per experiment (NaN for missing arms)
+    expected_share (array-like or None): Expected share of the visitors per arm, summing up to 1. None for an equal split (default: None)
+    method (str): 'auto', 'chisquare', 'gtest' or 'exact' (default: 'auto')
+    threshold (float): p-value below which a SRM is reported, used by the exact test to stop early (default: SRM_THRESHOLD)
+
+    Returns:
+    SrmResult: See srm_chisquare. For 'auto' with a matrix, method is an array with the method per experiment
+    """
+    if method == 'chisquare':
+        return srm_chisquare(counts, expected_share)
+    if method == 'gtest':
+        return srm_gtest(counts, expected_share)
+    if method == 'exact':
+        return srm_exact(counts, expected_share, threshold)
+    if method != 'auto':
+        raise ValueError(f"method must be one of {', '.join(SRM_METHODS)}.")
+
+    prepared_counts, shares, dof, single = _prepare(counts, expected_share)
+    expected = shares * prepared_counts.sum(axis = 1, keepdims = True)
+    needs_exact = np.any((expected < SRM_MIN_EXPECTED) & (shares > 0), axis = 1)
+    if single:
+        return srm_exact(counts, expected_share, threshold) if needs_exact[0] else srm_chisquare(counts, expected_share)
+
+    # shares are 0 for the padded arms, so the padded arms are marked as NaN again
+    counts = np.where(shares > 0, prepared_counts, np.nan)
+    result = srm_chisquare(counts, shares)
+    if needs_exact.any():
+        exact = srm_exact(counts[needs_exact], shares[needs_exact], threshold)
+        result.statistic[needs_exact] = exact.statistic
+        result.pvalue[needs_exact] = exact.pvalue
+        result.num_simulations[needs_exact] = exact.num_simulations
+
+    return result._replace(method = np.where(needs_exact, 'exact', 'chisquare'))
+
+def check_srm(df, method = 'auto', threshold = SRM_THRESHOLD):
+    """
+    Test many experiments for SRM in one call.
+
+    Parameters:
+    df (pd.DataFrame): One row per experiment and arm with the columns experiment, visitors and optionally
+                       expected_share (expected share of the visitors of the arm, default: equal split)
+    method (str): 'auto', 'chisquare', 'gtest' or 'exact', see srm_test (default: 'auto')
+    threshold (float): p-value below which a SRM is reported (default: SRM_THRESHOLD)
+
+    Returns:
+    pd.DataFrame: One row per experiment with the columns experiment, num_arms, visitors, statistic, pvalue,
+                  method, num_simulations and srm_detected
+    """
+    import pandas as pd
+    missing = [col for col in ['experiment', 'visitors'] if col not in df.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    if len(df) == 0:
+        raise ValueError("The table contains no experiments.")
+
+    experiment_codes, experiments = pd.factorize(df['experiment'])
+    arm_codes = df.groupby(experiment_codes).cumcount().to_numpy()
+    counts = np.full((experiments.size, arm_codes.max() + 1), np.nan)
+    counts[experiment_codes, arm_codes] = df['visitors'].to_numpy(dtype = np.float64)
+    shares = None
+    if 'expected_share' in df.columns:
+        shares = np.zeros(counts.shape)
+        shares[experiment_codes, arm_codes] = df['expected_share'].to_numpy(dtype = np.float64)
+
+    result = srm_test(counts, shares, method, threshold)
+
+    return pd.DataFrame(
+        {'experiment' : experiments
+        , 'num_arms' : result.dof + 1
+        , 'visitors' : np.nansum(counts, axis = 1)
+        , 'statistic' : result.statistic
+        , 'pvalue' : result.pvalue
+        , 'method' : result.method
+        , 'num_simulations' : result.num_simulations
+        , 'srm_detected' : result.pvalue < threshold
+        })
+
+## Sequential SRM monitoring
+### Testing the totals again after every hour inflates the false alarms, like peeking at a fixed-horizon p-value.
+### The sequential test compares the multinomial split under the expected shares with a Dirichlet mixture around
+### them (Dirichlet-multinomial Bayes factor). Its p-value is always valid: it can be checked after every bucket
+### and the false alarm rate stays below the threshold. The Bayes factor only depends on the cumulative visitors
+### per arm, so the state of an experiment is its visitors per arm, the p-value and the first flagged bucket.
+### The arms of an experiment are fixed by its first bucket, later buckets should list every arm (also with 0 visitors).
+### The rows of a bucket have to be next to each other in the file, a bucket split across two chunks is read as one.
+SRM_CONCENTRATION = 1000 # sum of the Dirichlet parameters, larger values are more sensitive to small mismatches
+SRM_MONITOR_COLUMNS = ['experiment', 'variant', 'expected_share', 'visitors', 'pvalue', 'num_updates', 'detected_bucket']
+
+def srm_log_bayes_factor(counts, expected_share = None, concentration = SRM_CONCENTRATION):
+    """
+    Calculate the log Bayes factor of a mismatch against the expected split from cumulative visitors.
+
+    Parameters:
+    counts (array-like): Cumulative visitors per arm, or a matrix with one row per experiment (NaN for missing arms)
+    expected_share (array-like or None): Expected share of the visitors per arm, summing up to 1. None for an equal split (default: None)
+    concentration (float): Sum of the parameters of the Dirichlet mixture around the expected shares (default: SRM_CONCENTRATION)
+
+    Returns:
+    float or np.ndarray: Log Bayes factor per experiment
+    """
+    from scipy.special import gammaln
+    counts, shares, dof, single = _prepare(counts, expected_share)
+    is_arm = shares > 0
+    prior = concentration * shares
+
+    def sum_gammaln(values):
+        return np.sum(np.where(is_arm, gammaln(np.where(is_arm, values, 1.0)), 0.0), axis = 1)
+
+    num_visitors = counts.sum(axis = 1)
+    log_likelihood_null = np.sum(np.where(is_arm, counts * np.log(np.where(is_arm, shares, 1.0)), 0.0), axis = 1)
+    log_bf = gammaln(concentration) - gammaln(concentration + num_visitors) + sum_gammaln(prior + counts) - sum_gammaln(prior) - log_likelihood_null
+
+    return float(log_bf[0]) if single else log_bf
+
+def _read_buckets(source, chunksize):
+    import pandas as pd
+    if isinstance(source, pd.DataFrame):
+        return [source]
+    if isinstance(source, str) or hasattr(source, 'read') or hasattr(source, '__fspath__'):
+        return pd.read_csv(source, chunksize = chunksize)
+
+    return source
+
+def _whole_buckets(chunks):
+    # A bucket can be split across two chunks. The rows of the last bucket of every chunk are held back and
+    # prepended to the next chunk, so every bucket is updated once with all of its arms.
+    import pandas as pd
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index = True)
+        if len(chunk) == 0:
+            continue
+        is_last = (chunk['bucket'] == chunk['bucket'].iloc[-1]).to_numpy() if 'bucket' in chunk.columns else np.zeros(len(chunk), dtype = bool)
+        carry = chunk[is_last]
+        if not is_last.all():
+            yield chunk[~is_last]
+    if carry is not None and len(carry) > 0:
+        yield carry
+
+def monitor_srm(source, state = None, threshold = SRM_THRESHOLD, concentration = SRM_CONCENTRATION, chunksize = 100_000):
+    """
+    Run the sequential SRM test over time-bucketed assignment counts, e.g. visitors per hour.
+    The buckets are read in chunks and processed in the order of the file. Memory is constant per experiment.
+
+    Parameters:
+    source (str, path, file-like, pd.DataFrame or iterable of pd.DataFrame): csv file or tables with one row per
+           bucket, experiment and variant and the columns bucket, experiment, variant, visitors and optionally
+           expected_share (default: equal split). The experiment column can be left out for a single experiment.
+    state (pd.DataFrame or None): Result of an earlier run to continue from. None starts all experiments (default: None)
+    threshold (float): p-value below which a SRM is reported (default: SRM_THRESHOLD)
+    concentration (float): See srm_log_bayes_factor (default: SRM_CONCENTRATION)
+    chunksize (int): Number of rows per chunk of a csv file (default: 100_000)
+
+    Returns:
+    pd.DataFrame: New state, one row per experiment and variant with the cumulative visitors, the always-valid
+                  p-value of the experiment, the number of updates, the first bucket in which the SRM was
+                  detected (empty if none) and srm_detected
+    """
+    import pandas as pd
+    # Running state: one row per experiment, one column per arm
+    experiment_rows = {}
+    arm_cols = {}
+    num_arms = {} # arms per experiment, the column of its next arm
+    counts = np.zeros((0, 0))
+    shares = np.zeros((0, 0))
+    pvalue = np.zeros(0)
+    num_updates = np.zeros(0, dtype = np.int64)
+    detected_bucket = np.empty(0, dtype = object)
+
+    def add_arms(keys, new_shares):
+        nonlocal counts, shares, pvalue, num_updates, detected_bucket
+        for (experiment, variant), share in zip(keys, new_shares):
+            if experiment not in experiment_rows:
+                experiment_rows[experiment] = len(experiment_rows)
+            row = experiment_rows[experiment]
+            if row < num_updates.size and num_updates[row] > 0:
+                raise ValueError(f"The variant {variant} of the experiment {experiment} is missing in its first bucket.")
+            arm_cols[(experiment, variant)] = (row, num_arms.get(experiment, 0))
+            num_arms[experiment] = num_arms.get(experiment, 0) + 1
+        num_rows = len(experiment_rows)
+        num_cols = max(counts.shape[1], max((num_arms[key[0]] for key in keys), default = 0))
+        grow = ((0, num_rows - counts.shape[0]), (0, num_cols - counts.shape[1]))
+        counts = np.pad(counts, grow)
+        shares = np.pad(shares, grow)
+        pvalue = np.pad(pvalue, grow[0], constant_values = 1.0)
+        num_updates = np.pad(num_updates, grow[0])
+        detected_bucket = np.concatenate([detected_bucket, np.full(grow[0][1], None, dtype = object)])
+        for key, share in zip(keys, new_shares):
+            shares[arm_cols[key]] = share
+
+    if state is not None:
+        add_arms(list(zip(state['experiment'], state['variant'])), state['expected_share'].to_numpy(dtype = np.float64))
+        for key, visitors, state_pvalue, state_updates, state_bucket in zip(zip(state['experiment'], state['variant']), state['visitors'], state['pvalue'], state['num_updates'], state['detected_bucket']):
+            row, col = arm_cols[key]
+            counts[row, col] = visitors
+            pvalue[row] = state_pvalue
+            num_updates[row] = state_updates
+            detected_bucket[row] = None if pd.isna(state_bucket) else state_bucket
+
+    for chunk in _whole_buckets(_read_buckets(source, chunksize)):
+        if 'experiment' not in chunk.columns:
+            chunk = chunk.assign(experiment = 'experiment')
+        missing = [col for col in ['bucket', 'variant', 'visitors'] if col not in chunk.columns]
+        if missing:
+            raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+        if (chunk['visitors'] < 0).any():
+            raise ValueError("The number of visitors can't be negative.")
+
+        for bucket, rows in chunk.groupby('bucket', sort = False):
+            keys = list(zip(rows['experiment'], rows['variant']))
+            new_keys = [key for key in dict.fromkeys(keys) if key not in arm_cols]
+            if new_keys:
+                if 'expected_share' in rows.columns:
+                    share_of = dict(zip(keys, rows['expected_share']))
+                    new_shares = [share_of[key] for key in new_keys]
+                else:
+                    new_arms = Counter(key[0] for key in new_keys)
+                    new_shares = [1 / new_arms[key[0]] for key in new_keys]
+                add_arms(new_keys, new_shares)
+
+            idx = np.array([arm_cols[key] for key in keys])
+            updated = np.unique(idx[:, 0])
+            np.add.at(counts, (idx[:, 0], idx[:, 1]), rows['visitors'].to_numpy(dtype = np.float64))
+
+            # Arms with share 0 are padding, they are passed as NaN
+            updated_shares = shares[updated]
+            log_bf = srm_log_bayes_factor(np.where(updated_shares > 0, counts[updated], np.nan), updated_shares, concentration)
+            # The always-valid p-value never increases: p_n = min(p_n-1, 1 / Bayes factor)
+            pvalue[updated] = np.minimum(pvalue[updated], np.exp(-np.maximum(log_bf, 0.0)))
+            num_updates[updated] += 1
+            newly_detected = updated[(pvalue[updated] < threshold) & np.equal(detected_bucket[updated], None)]
+            detected_bucket[newly_detected] = bucket
+
+    keys = list(arm_cols)
+    rows = np.array([arm_cols[key][0] for key in keys], dtype = np.int64)
+    cols = np.array([arm_cols[key][1] for key in keys], dtype = np.int64)
+
+    return pd.DataFrame(
+        {'experiment' : [key[0] for key in keys]
+        , 'variant' : [key[1] for key in keys]
+        , 'expected_share' : shares[rows, cols]
+        , 'visitors' : counts[rows, cols]
+        , 'pvalue' : pvalue[rows]
+        , 'num_updates' : num_updates[rows]
+        , 'detected_bucket' : detected_bucket[rows]
+        , 'srm_detected' : pvalue[rows] < threshold
+        }
+        , columns = SRM_MONITOR_COLUMNS + ['srm_detected'])
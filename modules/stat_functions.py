@@ -1,69 +1,232 @@
-import streamlit as st
+# scipy.stats and pandas are imported inside the functions, so the pages only load them when a calculation runs
+import numpy as np
+from modules.timing_functions import timed
 
 # Define mde functions
-from scipy.stats import norm
-import numpy as np
-def mde_cr(sample_size, baseline, alpha = 0.05, power = 0.8, test_type = 'Two-sided'):
+def z_scores(alpha = 0.05, power = 0.8, test_type = 'Two-sided'):
     """
-    Calculate the Minimum Detectable Effect (MDE) for a two-sample z-test.
+    Calculate the critical z-values for the significance level and the statistical power.
+    alpha and power can be floats or NumPy arrays.
     
     Parameters:
-    sample_size (int): Sample size per group
-    baseline (float): Conversion rate
-    alpha (float): Significance level (default: 0.05)
-    power (float): Statistical power (default: 0.8)
+    alpha (float or array-like): Significance level (default: 0.05)
+    power (float or array-like): Statistical power (default: 0.8)
     test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
     
     Returns:
-    float: Minimum Detectable Effect (MDE)
+    tuple: (z_alpha, z_beta)
     """
-    z_beta = norm.ppf(power)
+    from scipy.stats import norm
+    alpha = np.asarray(alpha, dtype = np.float64)
+    z_beta = norm.ppf(np.asarray(power, dtype = np.float64))
     if test_type == 'Two-sided':
-        z_alpha = norm.ppf(1 - alpha / 2)
+        z_alpha = norm.isf(alpha / 2)
     elif test_type == 'One-sided':
-        z_alpha = norm.ppf(1 - alpha)
+        z_alpha = norm.isf(alpha)
     else:
         raise ValueError("test_type must be 'Two-sided' or 'One-sided'.")
 
-    se_baseline = np.sqrt(2 * baseline * (1 - baseline) / sample_size)
+    return z_alpha, z_beta
+
+@timed
+def mde_cr(sample_size, baseline, alpha = 0.05, power = 0.8, test_type = 'Two-sided'):
+    """
+    Calculate the Minimum Detectable Effect (MDE) for a two-sample z-test.
+    All numeric parameters can be NumPy arrays and are broadcast against each other.
+    
+    Parameters:
+    sample_size (int or array-like): Sample size per group
+    baseline (float or array-like): Conversion rate
+    alpha (float or array-like): Significance level (default: 0.05)
+    power (float or array-like): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    
+    Returns:
+    float or np.ndarray: Minimum Detectable Effect (MDE)
+    """
+    z_alpha, z_beta = z_scores(alpha, power, test_type)
+
+    baseline = np.asarray(baseline, dtype = np.float64)
+    se_baseline = np.sqrt(2 * baseline * (1 - baseline) / np.asarray(sample_size, dtype = np.float64))
 
     mde = (z_alpha + z_beta) * se_baseline
 
     return mde
 
+@timed
 def mde_cont(sample_size, std_dev, alpha=0.05, power=0.8, test_type='Two-sided'):
     """
     Calculate the Minimum Detectable Effect (MDE) for a two-sample t-test with a continuous metric.
+    All numeric parameters can be NumPy arrays and are broadcast against each other.
     
     Parameters:
-    sample_size (int): Sample size per group
-    std_dev (float): Standard deviation of the metric
-    alpha (float): Significance level (default: 0.05)
-    power (float): Statistical power (default: 0.8)
+    sample_size (int or array-like): Sample size per group
+    std_dev (float or array-like): Standard deviation of the metric
+    alpha (float or array-like): Significance level (default: 0.05)
+    power (float or array-like): Statistical power (default: 0.8)
     test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
     
     Returns:
-    float: Minimum Detectable Effect (MDE)
+    float or np.ndarray: Minimum Detectable Effect (MDE)
     """
-    z_beta = norm.ppf(power)
-    if test_type == 'Two-sided':
-        z_alpha = norm.ppf(1 - alpha / 2)
-    elif test_type == 'One-sided':
-        z_alpha = norm.ppf(1 - alpha)
-    else:
-        raise ValueError("test_type must be 'Two-sided' or 'One-sided'.")
+    z_alpha, z_beta = z_scores(alpha, power, test_type)
     
-    se = std_dev / np.sqrt(sample_size)
+    # Standard error of the difference of two group means
+    se = np.asarray(std_dev, dtype = np.float64) * np.sqrt(2 / np.asarray(sample_size, dtype = np.float64))
     
     mde = (z_alpha + z_beta) * se
     
     return mde
 
+@timed
+def mde_curve(visitors, runtime, baseline, std_dev = None, num_variants = 1, alpha = 0.05, power = 0.8, test_type = 'Two-sided'):
+    """
+    Calculate the MDE for every combination of runtime and baseline in one vectorised call.
+    
+    Parameters:
+    visitors (float): Visitors per runtime unit (e.g. per day or per week) across control and all variants
+    runtime (array-like): Runtimes in the unit of visitors, e.g. np.arange(1, 365) for every day of a year
+    baseline (float or array-like): Conversion rate for a binomial metric or mean for a continuous metric
+    std_dev (None, float or array-like): Standard deviation for a continuous metric, one per baseline.
+                                         None calculates the MDE for a binomial metric (default: None)
+    num_variants (int): Number of variants besides the control (default: 1)
+    alpha (float): Significance level, already corrected for multiple comparisons (default: 0.05)
+    power (float): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    
+    Returns:
+    pd.DataFrame: One row per runtime and baseline with the columns
+                  Runtime, Baseline, Sample_size (per variant), MDE (absolute) and MDE_perc (relative, in %)
+    """
+    import pandas as pd
+    runtime = np.asarray(runtime).ravel()
+    baseline = np.atleast_1d(np.asarray(baseline, dtype = np.float64))
+
+    # Grid with the runtimes in rows and the baselines in columns
+    sample_size = runtime[:, np.newaxis] * visitors / (num_variants + 1)
+    if std_dev is None:
+        mde = mde_cr(sample_size, baseline[np.newaxis, :], alpha, power, test_type)
+    else:
+        std_dev = np.broadcast_to(np.asarray(std_dev, dtype = np.float64), baseline.shape)
+        mde = mde_cont(sample_size, std_dev[np.newaxis, :], alpha, power, test_type)
+
+    shape = (runtime.size, baseline.size)
+    result = pd.DataFrame(
+        {'Runtime' : np.broadcast_to(runtime[:, np.newaxis], shape).ravel()
+        , 'Baseline' : np.broadcast_to(baseline[np.newaxis, :], shape).ravel()
+        , 'Sample_size' : np.broadcast_to(np.floor(sample_size), shape).ravel().astype(np.int64)
+        , 'MDE' : mde.ravel()
+        , 'MDE_perc' : (mde / baseline[np.newaxis, :] * 100).ravel()
+        })
+
+    return result
+
+
+## Inverse of the MDE: sample size and runtime for a target MDE
+### mde_cr and mde_cont solved for the sample size, so a target effect gives the runtime in closed form
+@timed
+def sample_size_cr(mde, baseline, alpha = 0.05, power = 0.8, test_type = 'Two-sided', relative = False):
+    """
+    Calculate the sample size per group that a two-sample z-test needs to detect an MDE (inverse of mde_cr).
+    All numeric parameters can be NumPy arrays and are broadcast against each other.
+    
+    Parameters:
+    mde (float or array-like): Target Minimum Detectable Effect
+    baseline (float or array-like): Conversion rate
+    alpha (float or array-like): Significance level (default: 0.05)
+    power (float or array-like): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    relative (bool): True if mde is relative to the baseline (0.05 = 5 %), False if absolute (default: False)
+    
+    Returns:
+    float or np.ndarray: Sample size per group, not rounded
+    """
+    z_alpha, z_beta = z_scores(alpha, power, test_type)
+
+    baseline = np.asarray(baseline, dtype = np.float64)
+    mde = np.asarray(mde, dtype = np.float64)
+    if relative:
+        mde = mde * baseline
+
+    return 2 * baseline * (1 - baseline) * ((z_alpha + z_beta) / mde) ** 2
+
+@timed
+def sample_size_cont(mde, std_dev, alpha = 0.05, power = 0.8, test_type = 'Two-sided', mean = None):
+    """
+    Calculate the sample size per group that a two-sample test of a continuous metric needs to detect an MDE (inverse of mde_cont).
+    All numeric parameters can be NumPy arrays and are broadcast against each other.
+    
+    Parameters:
+    mde (float or array-like): Target Minimum Detectable Effect
+    std_dev (float or array-like): Standard deviation of the metric
+    alpha (float or array-like): Significance level (default: 0.05)
+    power (float or array-like): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    mean (None, float or array-like): Mean of the metric if mde is relative to it (0.05 = 5 %).
+                                      None if mde is absolute (default: None)
+    
+    Returns:
+    float or np.ndarray: Sample size per group, not rounded
+    """
+    z_alpha, z_beta = z_scores(alpha, power, test_type)
+
+    mde = np.asarray(mde, dtype = np.float64)
+    if mean is not None:
+        mde = mde * np.asarray(mean, dtype = np.float64)
+
+    return 2 * (np.asarray(std_dev, dtype = np.float64) * (z_alpha + z_beta) / mde) ** 2
+
+@timed
+def runtime_curve(visitors, target, baseline, std_dev = None, num_variants = 1, alpha = 0.05, power = 0.8, test_type = 'Two-sided', relative = True):
+    """
+    Calculate the sample size and the runtime needed for every target MDE in one vectorised call (inverse of mde_curve).
+    
+    Parameters:
+    visitors (float): Visitors per runtime unit (e.g. per day or per week) across control and all variants
+    target (array-like): Target MDEs, e.g. np.arange(0.01, 0.21, 0.01) for 1 % to 20 %
+    baseline (float): Conversion rate for a binomial metric or mean for a continuous metric
+    std_dev (None or float): Standard deviation for a continuous metric.
+                             None calculates the runtime for a binomial metric (default: None)
+    num_variants (int): Number of variants besides the control (default: 1)
+    alpha (float): Significance level, already corrected for multiple comparisons (default: 0.05)
+    power (float): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    relative (bool): True if the targets are relative to the baseline (0.05 = 5 %), False if absolute (default: True)
+    
+    Returns:
+    pd.DataFrame: One row per target with the columns MDE (absolute), MDE_perc (relative, in %),
+                  Sample_size (per variant, rounded up), Total_sample_size (control and all variants)
+                  and Runtime (in the unit of visitors, not rounded)
+    """
+    import pandas as pd
+    target = np.asarray(target, dtype = np.float64).ravel()
+    if np.any(target <= 0):
+        raise ValueError("The target MDE has to be greater than 0.")
+    mde = target * baseline if relative else target
+
+    if std_dev is None:
+        sample_size = sample_size_cr(mde, baseline, alpha, power, test_type)
+    else:
+        sample_size = sample_size_cont(mde, std_dev, alpha, power, test_type)
+    sample_size = np.ceil(sample_size).astype(np.int64)
+    total_sample_size = sample_size * (num_variants + 1)
+
+    result = pd.DataFrame(
+        {'MDE' : mde
+        , 'MDE_perc' : mde / baseline * 100
+        , 'Sample_size' : sample_size
+        , 'Total_sample_size' : total_sample_size
+        , 'Runtime' : total_sample_size / visitors
+        })
+
+    return result
+
 
 ## Sanity checks for csv file uploads
 ### check if revenue file data only contains numeric values
-import pandas as pd
+@timed
 def check_numeric_columns (df, col_indices):
+    import pandas as pd
     is_numeric = []
     for col_idx in col_indices:
         col = df.iloc[:, col_idx]
@@ -72,9 +235,363 @@ def check_numeric_columns (df, col_indices):
     return all(is_numeric)
 
 ### check if revenue file contains orders with revenue <=0
+@timed
 def check_value_size(df, col_indices):
     is_greater_zero = df.iloc[:, col_indices].gt(0).all().all()
 
     return is_greater_zero
 
+### Validate a revenue column in one vectorised pass
+### Row indices refer to the data rows of the file (0 = first row after the header).
+from collections import namedtuple
+RevenueValidation = namedtuple(
+    'RevenueValidation'
+    , ['values', 'non_numeric_rows', 'nan_rows', 'non_positive_rows', 'outlier_rows']
+    )
+
+@timed
+def validate_revenue(column, outlier_factor = 3.0):
+    """
+    Validate revenue data per order and return the clean values.
+    
+    Parameters:
+    column (pd.Series or array-like): Revenue per order, as float or as parsed text
+    outlier_factor (float or None): Values above Q3 + outlier_factor * IQR of the clean values are reported as outliers.
+                                    None skips the outlier detection (default: 3.0)
+    
+    Returns:
+    RevenueValidation: values (np.ndarray, float64): numeric values > 0, in file order, including outliers
+                       non_numeric_rows, nan_rows, non_positive_rows, outlier_rows (np.ndarray): Row indices per issue
+    """
+    import pandas as pd
+    column = pd.Series(column).reset_index(drop = True)
+    is_nan = column.isna().to_numpy()
+    if pd.api.types.is_float_dtype(column.dtype) or pd.api.types.is_integer_dtype(column.dtype):
+        parsed = column.to_numpy(dtype = np.float64)
+        is_non_numeric = np.zeros(parsed.size, dtype = bool)
+    else:
+        parsed = pd.to_numeric(column, errors = 'coerce').to_numpy(dtype = np.float64)
+        is_non_numeric = np.isnan(parsed) & ~is_nan
+
+    is_numeric = ~np.isnan(parsed)
+    is_non_positive = is_numeric & (parsed <= 0)
+    is_valid = is_numeric & ~is_non_positive
+    values = parsed[is_valid]
+
+    outlier_rows = np.empty(0, dtype = np.int64)
+    if outlier_factor is not None and values.size > 0:
+        q1, q3 = np.percentile(values, [25, 75])
+        upper_fence = q3 + outlier_factor * (q3 - q1)
+        outlier_rows = np.flatnonzero(is_valid & (parsed > upper_fence))
+
+    return RevenueValidation(
+        values
+        , np.flatnonzero(is_non_numeric)
+        , np.flatnonzero(is_nan)
+        , np.flatnonzero(is_non_positive)
+        , outlier_rows
+        )
+
+@timed
+def read_revenue_csv(source, col_idx = 0, outlier_factor = 3.0):
+    """
+    Read a revenue csv file with one header cell and validate it (see validate_revenue).
+    The column is parsed as float64 directly; only files with non-numeric values fall back to parsing text.
+    
+    Parameters:
+    source (str, path or file-like): csv file with a header cell and one row per order
+    col_idx (int): Index of the revenue column (default: 0)
+    outlier_factor (float or None): See validate_revenue (default: 3.0)
+    
+    Returns:
+    tuple: (df, validation)
+           df (pd.DataFrame): The revenue column as read from the file
+           validation (RevenueValidation): Clean values and rows with issues
+    """
+    import pandas as pd
+    if hasattr(source, 'seek'):
+        start = source.tell()
+    try:
+        df = pd.read_csv(source, header = 0, usecols = [col_idx], dtype = np.float64)
+    except ValueError:
+        # The column contains values that cannot be parsed as float
+        if hasattr(source, 'seek'):
+            source.seek(start)
+        df = pd.read_csv(source, header = 0, usecols = [col_idx], dtype = str)
+
+    return df, validate_revenue(df.iloc[:, 0], outlier_factor)
+
+### Stream a revenue csv file in chunks, so files larger than the memory can be summarised
+RevenueSummary = namedtuple(
+    'RevenueSummary'
+    , ['num_orders', 'revenue_sum', 'revenue_sum_sq', 'revenue_min', 'revenue_max', 'num_non_numeric', 'num_non_positive']
+    )
+
+@timed
+def summarise_revenue(validation):
+    """
+    Summarise validated revenue data.
+    
+    Parameters:
+    validation (RevenueValidation): Result of validate_revenue
+    
+    Returns:
+    RevenueSummary: Sufficient statistics of the clean values and the number of rows with issues.
+                    num_non_numeric includes empty values, like check_numeric_columns.
+    """
+    values = validation.values
+    num_orders, revenue_sum, revenue_sum_sq = revenue_sufficient_stats(values)
+    revenue_min = values.min() if values.size > 0 else np.inf
+    revenue_max = values.max() if values.size > 0 else -np.inf
+
+    return RevenueSummary(
+        num_orders
+        , revenue_sum
+        , revenue_sum_sq
+        , revenue_min
+        , revenue_max
+        , validation.non_numeric_rows.size + validation.nan_rows.size
+        , validation.non_positive_rows.size
+        )
+
+@timed
+def stream_revenue_csv(source, col_idx = 0, chunksize = 1_000_000):
+    """
+    Read a revenue csv file in chunks and calculate its sufficient statistics and sanity checks in one pass.
+    Memory usage is bounded by the chunk size, independent of the file size.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header cell and one row per order
+    col_idx (int): Index of the revenue column (default: 0)
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    RevenueSummary: See summarise_revenue
+    """
+    import pandas as pd
+    num_orders = 0
+    revenue_sum = 0.0
+    revenue_sum_sq = 0.0
+    revenue_min = np.inf
+    revenue_max = -np.inf
+    num_non_numeric = 0
+    num_non_positive = 0
+
+    reader = pd.read_csv(
+        source
+        , header = 0
+        , usecols = [col_idx]
+        , chunksize = chunksize
+        )
+    for chunk in reader:
+        chunk_summary = summarise_revenue(validate_revenue(chunk.iloc[:, 0], outlier_factor = None))
+        num_orders += chunk_summary.num_orders
+        revenue_sum += chunk_summary.revenue_sum
+        revenue_sum_sq += chunk_summary.revenue_sum_sq
+        revenue_min = min(revenue_min, chunk_summary.revenue_min)
+        revenue_max = max(revenue_max, chunk_summary.revenue_max)
+        num_non_numeric += chunk_summary.num_non_numeric
+        num_non_positive += chunk_summary.num_non_positive
+
+    return RevenueSummary(num_orders, revenue_sum, revenue_sum_sq, revenue_min, revenue_max, num_non_numeric, num_non_positive)
+
+
+## Revenue per visitor from sufficient statistics
+### Visitors without an order contribute a revenue of 0. Instead of padding the order data with one zero per
+### non-converting visitor, all RPV statistics are derived from (visitors, revenue sum, revenue sum of squares, orders).
+@timed
+def revenue_sufficient_stats(revenue):
+    """
+    Calculate the sufficient statistics of order-level revenue data.
+
+    Parameters:
+    revenue (array-like, pd.Series or pd.DataFrame): Revenue per order (one column)
+
+    Returns:
+    tuple: (num_orders, revenue_sum, revenue_sum_sq)
+    """
+    values = np.asarray(revenue, dtype = np.float64).ravel()
+    num_orders = values.size
+    revenue_sum = values.sum()
+    revenue_sum_sq = np.dot(values, values)
+
+    return num_orders, revenue_sum, revenue_sum_sq
+
+@timed
+def rpv_stats(num_visitors, revenue_sum, revenue_sum_sq, num_orders):
+    """
+    Calculate mean and variance of the revenue per visitor from sufficient statistics.
+    All parameters can be NumPy arrays to calculate many groups at once.
+    
+    Parameters:
+    num_visitors (int or array-like): Number of visitors, including visitors without an order
+    revenue_sum (float or array-like): Sum of the revenue of all orders
+    revenue_sum_sq (float or array-like): Sum of the squared revenue of all orders
+    num_orders (int or array-like): Number of orders
+    
+    Returns:
+    tuple: (mean, variance) of the revenue per visitor. The variance uses ddof = 1.
+    """
+    num_visitors = np.asarray(num_visitors, dtype = np.float64)
+    num_orders = np.asarray(num_orders, dtype = np.float64)
+    if np.any(num_orders > num_visitors):
+        raise ValueError("num_orders must not be larger than num_visitors.")
+    if np.any(num_visitors < 2):
+        raise ValueError("num_visitors must be at least 2.")
+
+    mean = revenue_sum / num_visitors
+
+    # Combine the orders with the group of zero-revenue visitors (parallel variance formula)
+    has_orders = num_orders > 0
+    orders_mean = np.divide(revenue_sum, num_orders, out = np.zeros(np.broadcast(revenue_sum, num_orders).shape), where = has_orders)
+    orders_m2 = np.maximum(revenue_sum_sq - revenue_sum * orders_mean, 0.0)
+    m2 = np.where(has_orders, orders_m2 + orders_mean ** 2 * num_orders * (num_visitors - num_orders) / num_visitors, 0.0)
+    variance = m2 / (num_visitors - 1)
+
+    return mean, variance
+
+@timed
+def ttest_ind_from_stats(mean1, var1, nobs1, mean2, var2, nobs2, alternative = 'two-sided', usevar = 'pooled'):
+    """
+    Calculate the two-sample t-test from summary statistics.
+    Returns the same values as statsmodels.stats.weightstats.ttest_ind for the underlying data.
+    
+    Parameters:
+    mean1, mean2 (float): Sample means
+    var1, var2 (float): Sample variances (ddof = 1)
+    nobs1, nobs2 (int): Number of observations
+    alternative (str): 'two-sided', 'larger' (mean1 > mean2) or 'smaller' (mean1 < mean2) (default: 'two-sided')
+    usevar (str): 'pooled' for the Student t-test or 'unequal' for the Welch t-test (default: 'pooled')
+    
+    Returns:
+    tuple: (tstat, pvalue, degrees of freedom)
+    """
+    from scipy.stats import t as t_dist
+    if usevar == 'pooled':
+        dof = nobs1 + nobs2 - 2
+        var_pooled = ((nobs1 - 1) * var1 + (nobs2 - 1) * var2) / dof
+        std_diff = np.sqrt(var_pooled * (1 / nobs1 + 1 / nobs2))
+    elif usevar == 'unequal':
+        vn1 = var1 / nobs1
+        vn2 = var2 / nobs2
+        dof = (vn1 + vn2) ** 2 / (vn1 ** 2 / (nobs1 - 1) + vn2 ** 2 / (nobs2 - 1))
+        std_diff = np.sqrt(vn1 + vn2)
+    else:
+        raise ValueError("usevar must be 'pooled' or 'unequal'.")
+
+    tstat = (mean1 - mean2) / std_diff
+
+    if alternative in ['two-sided', '2-sided', '2s']:
+        pvalue = t_dist.sf(np.abs(tstat), dof) * 2
+    elif alternative in ['larger', 'l']:
+        pvalue = t_dist.sf(tstat, dof)
+    elif alternative in ['smaller', 's']:
+        pvalue = t_dist.cdf(tstat, dof)
+    else:
+        raise ValueError("alternative must be 'two-sided', 'larger' or 'smaller'.")
+
+    return tstat, pvalue, dof
+
+
+## Two-proportion z-test for many control/variant pairs at once
+### Vectorised NumPy versions of statsmodels' proportions_ztest, proportion_effectsize and zt_ind_solve_power.
+### They give the same results without the per-call argument checks and without the root finder for the power.
+@timed
+def proportions_ztest(count1, nobs1, count2, nobs2, alternative = 'two-sided'):
+    """
+    Calculate the pooled two-proportion z-test, same as proportions_ztest(count = [count1, count2], nobs = [nobs1, nobs2]).
+    All numeric parameters can be NumPy arrays.
+    
+    Parameters:
+    count1, count2 (int or array-like): Number of conversions
+    nobs1, nobs2 (int or array-like): Number of visitors
+    alternative (str): 'two-sided', 'larger' (proportion 1 > proportion 2) or 'smaller' (default: 'two-sided')
+    
+    Returns:
+    tuple: (zstat, pvalue)
+    """
+    from scipy.stats import norm
+    count1 = np.asarray(count1, dtype = np.float64)
+    count2 = np.asarray(count2, dtype = np.float64)
+    nobs1 = np.asarray(nobs1, dtype = np.float64)
+    nobs2 = np.asarray(nobs2, dtype = np.float64)
+
+    p_pooled = (count1 + count2) / (nobs1 + nobs2)
+    zstat = (count1 / nobs1 - count2 / nobs2) / np.sqrt(p_pooled * (1 - p_pooled) * (1 / nobs1 + 1 / nobs2))
+
+    if alternative in ['two-sided', '2-sided', '2s']:
+        pvalue = norm.sf(np.abs(zstat)) * 2
+    elif alternative in ['larger', 'l']:
+        pvalue = norm.sf(zstat)
+    elif alternative in ['smaller', 's']:
+        pvalue = norm.cdf(zstat)
+    else:
+        raise ValueError("alternative must be 'two-sided', 'larger' or 'smaller'.")
+
+    return zstat, pvalue
+
+def proportion_effectsize(prop1, prop2):
+    """
+    Calculate Cohen's h effect size for two proportions, same as proportion_effectsize(prop1, prop2, method = 'normal').
+    
+    Parameters:
+    prop1, prop2 (float or array-like): Proportions
+    
+    Returns:
+    float or np.ndarray: Effect size
+    """
+    return 2 * np.arcsin(np.sqrt(prop1)) - 2 * np.arcsin(np.sqrt(prop2))
+
+@timed
+def ztest_power(effect_size, nobs1, alpha = 0.05, ratio = 1, alternative = 'two-sided'):
+    """
+    Calculate the power of the two-sample z-test in closed form, same as zt_ind_solve_power(effect_size, nobs1, alpha, ratio = ratio).
+    All numeric parameters can be NumPy arrays.
+    
+    Parameters:
+    effect_size (float or array-like): Standardised effect size, e.g. from proportion_effectsize
+    nobs1 (int or array-like): Number of observations of sample 1
+    alpha (float or array-like): Significance level (default: 0.05)
+    ratio (float or array-like): nobs2 / nobs1 (default: 1)
+    alternative (str): 'two-sided', 'larger' or 'smaller' (default: 'two-sided')
+    
+    Returns:
+    float or np.ndarray: Statistical power
+    """
+    from scipy.stats import norm
+    effect_size = np.asarray(effect_size, dtype = np.float64)
+    alpha = np.asarray(alpha, dtype = np.float64)
+    nobs1 = np.asarray(nobs1, dtype = np.float64)
+    nobs = nobs1 * ratio / (1 + ratio)
+    shift = effect_size * np.sqrt(nobs)
+
+    if alternative in ['two-sided', '2-sided', '2s']:
+        power = norm.sf(norm.isf(alpha / 2) - shift) + norm.cdf(norm.ppf(alpha / 2) - shift)
+    elif alternative in ['larger', 'l']:
+        power = norm.sf(norm.isf(alpha) - shift)
+    elif alternative in ['smaller', 's']:
+        power = norm.cdf(norm.ppf(alpha) - shift)
+    else:
+        raise ValueError("alternative must be 'two-sided', 'larger' or 'smaller'.")
+
+    return power
+
+@timed
+def proportions_test(count1, nobs1, count2, nobs2, alpha = 0.05, alternative = 'two-sided'):
+    """
+    Compare the conversion rates of N control/variant pairs at once: z-test, effect size and post-hoc power.
+    
+    Parameters:
+    count1, nobs1 (int or array-like): Conversions and visitors of the control(s)
+    count2, nobs2 (int or array-like): Conversions and visitors of the variant(s)
+    alpha (float or array-like): Significance level for the post-hoc power (default: 0.05)
+    alternative (str): 'two-sided', 'larger' or 'smaller' (default: 'two-sided')
+    
+    Returns:
+    tuple: (zstat, pvalue, effect_size, power)
+    """
+    zstat, pvalue = proportions_ztest(count1, nobs1, count2, nobs2, alternative)
+    effect_size = proportion_effectsize(np.asarray(count1) / np.asarray(nobs1), np.asarray(count2) / np.asarray(nobs2))
+    power = ztest_power(effect_size, nobs1, alpha, alternative = alternative)
 
+    return zstat, pvalue, effect_size, power
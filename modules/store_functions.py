@@ -0,0 +1,276 @@
+import sqlite3
+from collections import namedtuple
+import numpy as np
+from modules.stat_functions import mde_curve
+from modules.stat_functions import rpv_stats
+
+## Store of daily experiment aggregates
+### Instead of typing in totals or uploading the full order data again, the sufficient statistics of every experiment,
+### variant and day are kept in a SQLite file: visitors, conversions and optionally the revenue sum and the sum of the
+### squared revenue per order. New days are appended, a day that is appended again replaces the stored one.
+### All calculations run on the totals that SQLite sums up per variant, not on the raw data.
+### The control of an experiment is the variant that was stored first, as in analyse_experiments.
+### Days are stored as ISO dates (YYYY-MM-DD), so that SQLite's text comparison of --since and --until is the order of
+### the dates. Days in other formats (2024-5-1, timestamps) are converted when they are appended or used as a limit.
+STORE_COLUMNS = ['experiment', 'variant', 'day', 'visitors', 'conversions', 'revenue_sum', 'revenue_sum_sq']
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_aggregates (
+    experiment TEXT NOT NULL
+    , variant TEXT NOT NULL
+    , day TEXT NOT NULL
+    , visitors INTEGER NOT NULL CHECK (visitors >= 0)
+    , conversions INTEGER NOT NULL CHECK (conversions >= 0 AND conversions <= visitors)
+    , revenue_sum REAL
+    , revenue_sum_sq REAL
+    , PRIMARY KEY (experiment, variant, day)
+    )
+"""
+
+Baseline = namedtuple(
+    'Baseline'
+    , ['num_days', 'weekly_visitors', 'conversion_rate', 'rpv_mean', 'rpv_std']
+    )
+
+ISO_DAY_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+
+def iso_days(days):
+    """
+    Convert days to ISO dates (YYYY-MM-DD). A timestamp is cut to its day.
+
+    Parameters:
+    days (scalar or array-like): Days as text (e.g. '2024-05-01', '2024-5-1', '2024-05-01 13:00'), dates or timestamps
+
+    Returns:
+    str or np.ndarray: ISO date per day
+    """
+    import pandas as pd
+    single = np.ndim(days) == 0
+    try:
+        dates = pd.to_datetime(pd.Series([days] if single else list(days), dtype = object), format = 'mixed')
+    except (ValueError, TypeError) as error:
+        raise ValueError(f"The days have to be dates, e.g. 2024-05-01: {error}") from error
+    if dates.isna().any():
+        raise ValueError("The days have to be dates, e.g. 2024-05-01, empty days are not allowed.")
+    iso = dates.dt.strftime('%Y-%m-%d').to_numpy(dtype = object)
+
+    return iso[0] if single else iso
+
+def open_store(path):
+    """
+    Open the store, the file and the table are created if they don't exist.
+
+    Parameters:
+    path (str): Path of the SQLite file, ':memory:' for a temporary store
+
+    Returns:
+    sqlite3.Connection: Connection to the store
+    """
+    connection = sqlite3.connect(path)
+    connection.execute(STORE_SCHEMA)
+    _normalise_stored_days(connection)
+
+    return connection
+
+def _normalise_stored_days(connection):
+    # Stores written before the days were converted can hold other formats, they are converted once.
+    # A converted day replaces a stored row of the same day, as in append_days
+    rows = connection.execute(f"SELECT rowid, * FROM daily_aggregates WHERE day NOT GLOB '{ISO_DAY_GLOB}' ORDER BY rowid").fetchall()
+    if not rows:
+        return
+    days = iso_days([row[3] for row in rows])
+    with connection:
+        connection.executemany('DELETE FROM daily_aggregates WHERE rowid = ?', [(row[0],) for row in rows])
+        connection.executemany(
+            """INSERT INTO daily_aggregates VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (experiment, variant, day) DO UPDATE SET
+            visitors = excluded.visitors, conversions = excluded.conversions
+            , revenue_sum = excluded.revenue_sum, revenue_sum_sq = excluded.revenue_sum_sq"""
+            , [(row[1], row[2], day) + tuple(row[4:]) for row, day in zip(rows, days)]
+            )
+
+def append_days(connection, df):
+    """
+    Append daily aggregates to the store. Rows of a day that is already stored replace the stored values.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store, see open_store
+    df (pd.DataFrame): One row per experiment, variant and day with the columns experiment, variant, day, visitors,
+                       conversions and optionally revenue_sum and revenue_sum_sq. The days are stored as ISO dates, see iso_days
+
+    Returns:
+    int: Number of stored rows
+    """
+    missing = [col for col in STORE_COLUMNS[:5] if col not in df.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    if (df['conversions'] > df['visitors']).any():
+        raise ValueError("You shouldn't have more conversions than visitors.")
+
+    df = df.reindex(columns = STORE_COLUMNS).astype({'experiment' : str, 'variant' : str})
+    df['day'] = iso_days(df['day'])
+    rows = [
+        (experiment, variant, day, int(visitors), int(conversions)
+        , None if np.isnan(revenue_sum) else float(revenue_sum)
+        , None if np.isnan(revenue_sum_sq) else float(revenue_sum_sq))
+        for experiment, variant, day, visitors, conversions, revenue_sum, revenue_sum_sq
+        in df.astype({'revenue_sum' : float, 'revenue_sum_sq' : float}).itertuples(index = False)
+        ]
+    try:
+        with connection:
+            connection.executemany(
+                """INSERT INTO daily_aggregates VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (experiment, variant, day) DO UPDATE SET
+                visitors = excluded.visitors, conversions = excluded.conversions
+                , revenue_sum = excluded.revenue_sum, revenue_sum_sq = excluded.revenue_sum_sq"""
+                , rows
+                )
+    except sqlite3.IntegrityError as error:
+        raise ValueError(f"The table contains invalid values: {error}.") from error
+
+    return len(rows)
+
+def _where(experiments, since, until):
+    conditions = []
+    params = []
+    if experiments is not None:
+        conditions.append(f"experiment IN ({', '.join('?' * len(experiments))})")
+        params.extend(experiments)
+    if since is not None:
+        conditions.append('day >= ?')
+        params.append(iso_days(since))
+    if until is not None:
+        conditions.append('day <= ?')
+        params.append(iso_days(until))
+
+    return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+def load_totals(connection, experiments = None, since = None, until = None):
+    """
+    Sum up the stored days per experiment and variant.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store
+    experiments (list of str or None): Experiments to load. None loads all (default: None)
+    since, until (str or None): First and last day to include, e.g. '2024-05-01'. None has no limit (default: None)
+
+    Returns:
+    pd.DataFrame: One row per experiment and variant in the format of analyse_experiments, with the control first
+                  and the number of days. The revenue columns are empty if a day without revenue data is included.
+    """
+    import pandas as pd
+    where, params = _where(experiments, since, until)
+    query = f"""
+        SELECT experiment, variant
+        , SUM(visitors) AS visitors
+        , SUM(conversions) AS conversions
+        , CASE WHEN COUNT(revenue_sum) = COUNT(*) THEN SUM(revenue_sum) END AS revenue_sum
+        , CASE WHEN COUNT(revenue_sum_sq) = COUNT(*) THEN SUM(revenue_sum_sq) END AS revenue_sum_sq
+        , COUNT(*) AS num_days
+        FROM daily_aggregates{where}
+        GROUP BY experiment, variant
+        ORDER BY experiment, MIN(rowid)
+        """
+
+    return pd.read_sql_query(query, connection, params = params)
+
+def load_daily(connection, experiment, since = None, until = None):
+    """
+    Load the stored days of one experiment, e.g. for the sequential test.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store
+    experiment (str): Name of the experiment
+    since, until (str or None): First and last day to include. None has no limit (default: None)
+
+    Returns:
+    pd.DataFrame: One row per variant and day, ordered by day
+    """
+    import pandas as pd
+    where, params = _where([experiment], since, until)
+
+    return pd.read_sql_query(f"SELECT * FROM daily_aggregates{where} ORDER BY day, rowid", connection, params = params)
+
+def analyse_store(connection, experiments = None, since = None, until = None, **kwargs):
+    """
+    Run the significance tests and SRM checks of analyse_experiments on the stored totals.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store
+    experiments, since, until: See load_totals
+    **kwargs: Passed on to analyse_experiments (alpha, alternative, srm_threshold)
+
+    Returns:
+    pd.DataFrame: See analyse_experiments. The revenue per visitor is empty (and not counted as a comparison)
+                  for the variants without revenue data on every day
+    """
+    from modules.batch_functions import analyse_experiments
+    totals = load_totals(connection, experiments, since, until)
+    if len(totals) == 0:
+        raise ValueError("The store contains no data for this selection.")
+    if totals[['revenue_sum', 'revenue_sum_sq']].isna().all().all():
+        totals = totals.drop(columns = ['revenue_sum', 'revenue_sum_sq'])
+
+    return analyse_experiments(totals.drop(columns = 'num_days'), **kwargs)
+
+def load_baseline(connection, experiment, since = None, until = None):
+    """
+    Calculate the baseline of an experiment (or of a pre-period stored as one) over all its variants, as input for the MDE.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store
+    experiment (str): Name of the experiment
+    since, until (str or None): First and last day to include. None has no limit (default: None)
+
+    Returns:
+    Baseline: Number of days, average weekly visitors, conversion rate and mean and standard deviation of the
+              revenue per visitor (None without revenue data)
+    """
+    where, params = _where([experiment], since, until)
+    num_days, visitors, conversions, revenue_sum, revenue_sum_sq, num_revenue_days, num_rows = connection.execute(
+        f"""SELECT COUNT(DISTINCT day), SUM(visitors), SUM(conversions), SUM(revenue_sum), SUM(revenue_sum_sq), COUNT(revenue_sum), COUNT(*)
+        FROM daily_aggregates{where}"""
+        , params
+        ).fetchone()
+    if num_days == 0 or not visitors:
+        raise ValueError(f"The store contains no visitors for the experiment {experiment}.")
+
+    rpv_mean = None
+    rpv_std = None
+    if num_revenue_days == num_rows:
+        rpv_mean, rpv_var = rpv_stats(visitors, revenue_sum, revenue_sum_sq, conversions)
+        rpv_std = float(np.sqrt(rpv_var))
+        rpv_mean = float(rpv_mean)
+
+    return Baseline(num_days, visitors / num_days * 7, conversions / visitors, rpv_mean, rpv_std)
+
+def store_mde(connection, experiment, runtime, num_variants = 1, alpha = 0.05, power = 0.8, test_type = 'Two-sided', since = None, until = None):
+    """
+    Calculate the MDE curves of the conversion rate and, with revenue data, of the revenue per visitor
+    from the stored baseline of an experiment.
+
+    Parameters:
+    connection (sqlite3.Connection): Connection to the store
+    experiment (str): Name of the experiment (or pre-period) that gives the baseline
+    runtime (array-like): Runtimes in weeks
+    num_variants (int): Number of variants besides the control (default: 1)
+    alpha (float): Significance level, already corrected for multiple comparisons (default: 0.05)
+    power (float): Statistical power (default: 0.8)
+    test_type (str): 'Two-sided' or 'One-sided' (default: 'Two-sided')
+    since, until (str or None): First and last day of the baseline. None has no limit (default: None)
+
+    Returns:
+    pd.DataFrame: See mde_curve, with a column metric ('conversion_rate' or 'revenue_per_visitor')
+    """
+    import pandas as pd
+    baseline = load_baseline(connection, experiment, since, until)
+    results = []
+    result = mde_curve(baseline.weekly_visitors, runtime, baseline.conversion_rate, num_variants = num_variants, alpha = alpha, power = power, test_type = test_type)
+    result.insert(0, 'metric', 'conversion_rate')
+    results.append(result)
+    if baseline.rpv_mean is not None:
+        result = mde_curve(baseline.weekly_visitors, runtime, baseline.rpv_mean, std_dev = baseline.rpv_std, num_variants = num_variants, alpha = alpha, power = power, test_type = test_type)
+        result.insert(0, 'metric', 'revenue_per_visitor')
+        results.append(result)
+
+    return pd.concat(results, ignore_index = True)
@@ -0,0 +1,89 @@
+import numpy as np
+
+## Sufficient statistics per variant
+### CUPED (metric and pre-experiment covariate) and ratio metrics (numerator and denominator) need the same sums of
+### two columns per variant: the number of units, the sums, the sums of squares and the sum of the cross products.
+### They are summed up chunk by chunk, so the unit level rows never have to fit into memory. Only the names of the
+### result columns differ, see CUPED_COLUMNS and RATIO_COLUMNS.
+
+def variant_sufficient_stats(df, first, second, variant, columns):
+    """
+    Sum up two columns of unit level data (one row per visitor or user) per variant.
+    Empty values count as 0, e.g. a visitor without an order.
+
+    Parameters:
+    df (pd.DataFrame): One row per unit
+    first, second (str): Columns to sum up, e.g. the metric and the covariate
+    variant (str or None): Column of the variant. None treats all rows as one group, e.g. for planning
+    columns (list of str): Names of the result columns: variant, units, sum and sum of squares of first, sum and
+                           sum of squares of second, sum of the cross products
+
+    Returns:
+    pd.DataFrame: One row per variant, in the order of their first row, with the given columns
+    """
+    import pandas as pd
+    missing = [col for col in [first, second, variant] if col is not None and col not in df.columns]
+    if missing:
+        raise ValueError(f"The table is missing the columns {', '.join(missing)}.")
+    values = df[[first, second]].apply(pd.to_numeric, errors = 'coerce')
+    if (values.isna() & df[[first, second]].notna()).any().any():
+        raise ValueError(f"The columns {first} and {second} need numeric values.")
+
+    x = values[first].fillna(0).to_numpy(dtype = np.float64)
+    y = values[second].fillna(0).to_numpy(dtype = np.float64)
+    stats = pd.DataFrame(
+        dict(zip(columns, [
+            df[variant].astype(str).to_numpy() if variant is not None else np.full(len(df), 'all')
+            , np.ones(x.size)
+            , x
+            , x * x
+            , y
+            , y * y
+            , x * y
+            ]))
+        )
+
+    return stats.groupby(columns[0], sort = False, as_index = False).sum()
+
+def stream_variant_csv(source, first, second, variant, columns, chunksize = 1_000_000):
+    """
+    Read a unit level csv file in chunks and sum up two of its columns per variant in one pass, see variant_sufficient_stats.
+    Memory usage is bounded by the chunk size, independent of the file size.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header row and one row per unit
+    first, second, variant, columns: See variant_sufficient_stats
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    pd.DataFrame: See variant_sufficient_stats
+    """
+    import pandas as pd
+    usecols = [col for col in [variant, first, second] if col is not None]
+    totals = None
+    for chunk in pd.read_csv(source, usecols = usecols, chunksize = chunksize):
+        stats = variant_sufficient_stats(chunk, first, second, variant, columns)
+        totals = stats if totals is None else pd.concat([totals, stats]).groupby(columns[0], sort = False, as_index = False).sum()
+    if totals is None:
+        raise ValueError(f"The file contains no {columns[1]}.")
+
+    return totals
+
+def control_index(names, control = None):
+    """
+    Find the control among the variants of one experiment. Names are compared as text.
+
+    Parameters:
+    names (array-like): Name of every variant, in the order of the rows
+    control (str or None): Name of the control variant. None uses the first row (default: None)
+
+    Returns:
+    int: Row of the control
+    """
+    if control is None:
+        return 0
+    names = [str(name) for name in names]
+    if names.count(str(control)) != 1:
+        raise ValueError(f"There is no variant {control}.")
+
+    return names.index(str(control))
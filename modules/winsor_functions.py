@@ -0,0 +1,141 @@
+from collections import namedtuple
+import numpy as np
+from modules.stat_functions import validate_revenue
+from modules.timing_functions import timed
+
+## Capping of large orders (winsorisation)
+### A few very large orders (e.g. B2B orders) can dominate the variance of the revenue per visitor. Capping every
+### order at a high percentile of the revenue (e.g. the 99th) trades a small bias for a much smaller variance.
+### The percentile is taken from a sketch with logarithmic buckets: an order of value v falls into the bucket
+### ceil(log(v) / log(gamma)), so every bucket spans a relative range of the accuracy. Besides the number of orders,
+### every bucket keeps the sum and the sum of squares of its orders, so the capped sufficient statistics follow from
+### the same single pass over the data. Sketches of chunks (or files) are merged by adding them up.
+### Orders in the bucket of the cap are kept as they are, they differ from the cap by less than the accuracy.
+WINSOR_ACCURACY = 0.01 # relative accuracy of the percentiles
+WINSOR_PERCENTILES = [99.9, 99.5, 99.0, 98.0, 95.0]
+WINSOR_MIN_VALUE = 1e-6 # smaller (and larger) values share the first (last) bucket
+WINSOR_MAX_VALUE = 1e12
+
+_GAMMA = (1 + WINSOR_ACCURACY) / (1 - WINSOR_ACCURACY)
+_MIN_INDEX = int(np.floor(np.log(WINSOR_MIN_VALUE) / np.log(_GAMMA)))
+_NUM_BUCKETS = int(np.ceil(np.log(WINSOR_MAX_VALUE) / np.log(_GAMMA))) - _MIN_INDEX + 1
+
+RevenueSketch = namedtuple(
+    'RevenueSketch'
+    , ['counts', 'sums', 'sums_sq', 'revenue_min', 'revenue_max']
+    )
+
+WinsorSummary = namedtuple(
+    'WinsorSummary'
+    , ['num_orders', 'revenue_sum', 'revenue_sum_sq', 'cap', 'num_capped']
+    )
+
+def _bucket(values):
+    index = np.ceil(np.log(np.clip(values, WINSOR_MIN_VALUE, WINSOR_MAX_VALUE)) / np.log(_GAMMA)).astype(np.int64)
+
+    return np.clip(index - _MIN_INDEX, 0, _NUM_BUCKETS - 1)
+
+def revenue_sketch(values):
+    """
+    Build the sketch of revenue data.
+
+    Parameters:
+    values (array-like): Revenue per order, > 0 (see validate_revenue)
+
+    Returns:
+    RevenueSketch: Number of orders, sum and sum of squares per bucket and the smallest and largest order
+    """
+    values = np.asarray(values, dtype = np.float64).ravel()
+    buckets = _bucket(values)
+
+    return RevenueSketch(
+        np.bincount(buckets, minlength = _NUM_BUCKETS).astype(np.int64)
+        , np.bincount(buckets, weights = values, minlength = _NUM_BUCKETS)
+        , np.bincount(buckets, weights = values * values, minlength = _NUM_BUCKETS)
+        , values.min() if values.size > 0 else np.inf
+        , values.max() if values.size > 0 else -np.inf
+        )
+
+def merge_sketches(*sketches):
+    """
+    Merge sketches, e.g. of the chunks of a file or of control and variants.
+
+    Parameters:
+    *sketches (RevenueSketch): Sketches to merge
+
+    Returns:
+    RevenueSketch: Sketch of all their data
+    """
+    return RevenueSketch(
+        np.sum([sketch.counts for sketch in sketches], axis = 0)
+        , np.sum([sketch.sums for sketch in sketches], axis = 0)
+        , np.sum([sketch.sums_sq for sketch in sketches], axis = 0)
+        , min(sketch.revenue_min for sketch in sketches)
+        , max(sketch.revenue_max for sketch in sketches)
+        )
+
+@timed
+def stream_revenue_sketch(source, col_idx = 0, chunksize = 1_000_000):
+    """
+    Read a revenue csv file in chunks and build its sketch in one pass. Invalid values (non-numeric, empty, <= 0) are skipped,
+    see stream_revenue_csv for the sanity checks.
+
+    Parameters:
+    source (str, path or file-like): csv file with a header cell and one row per order
+    col_idx (int): Index of the revenue column (default: 0)
+    chunksize (int): Number of rows per chunk (default: 1_000_000)
+
+    Returns:
+    RevenueSketch: Sketch of the valid orders
+    """
+    import pandas as pd
+    sketch = revenue_sketch([])
+    for chunk in pd.read_csv(source, header = 0, usecols = [col_idx], chunksize = chunksize):
+        sketch = merge_sketches(sketch, revenue_sketch(validate_revenue(chunk.iloc[:, 0], outlier_factor = None).values))
+
+    return sketch
+
+def sketch_quantile(sketch, percentile):
+    """
+    Estimate a percentile of the revenue per order from the sketch, within the relative accuracy WINSOR_ACCURACY.
+
+    Parameters:
+    sketch (RevenueSketch): Sketch of the revenue data
+    percentile (float or array-like): Percentile(s) between 0 and 100
+
+    Returns:
+    float or np.ndarray: Revenue at the percentile(s)
+    """
+    percentile = np.asarray(percentile, dtype = np.float64)
+    num_orders = sketch.counts.sum()
+    if num_orders == 0:
+        raise ValueError("The sketch contains no orders.")
+    rank = np.floor(percentile / 100 * (num_orders - 1))
+    bucket = np.searchsorted(np.cumsum(sketch.counts), rank, side = 'right')
+    # Midpoint of the bucket (in the relative sense), limited to the range of the data
+    value = 2 * _GAMMA ** (bucket + _MIN_INDEX) / (_GAMMA + 1)
+
+    return np.clip(value, sketch.revenue_min, sketch.revenue_max)
+
+def winsorise(sketch, cap):
+    """
+    Calculate the sufficient statistics of the revenue data with every order above the cap set to the cap.
+
+    Parameters:
+    sketch (RevenueSketch): Sketch of the revenue data
+    cap (float): Maximum revenue per order, e.g. sketch_quantile(sketch, 99)
+
+    Returns:
+    WinsorSummary: Number of orders, sum and sum of squares of the capped revenue (as in RevenueSummary),
+                   the cap and the number of capped orders
+    """
+    is_above = np.arange(_NUM_BUCKETS) > _bucket(cap)
+    num_capped = int(sketch.counts[is_above].sum())
+
+    return WinsorSummary(
+        int(sketch.counts.sum())
+        , sketch.sums[~is_above].sum() + num_capped * cap
+        , sketch.sums_sq[~is_above].sum() + num_capped * cap ** 2
+        , float(cap)
+        , num_capped
+        )
@@ -1,9 +1,27 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
-from modules.stat_functions import mde_cr
-from modules.stat_functions import mde_cont
-import pandas as pd
+from modules.functions import run_page
+from modules.timing_functions import span
+from modules.correction_functions import CORRECTION_METHODS
+from modules.correction_functions import correct_alpha
+from modules.stat_functions import mde_curve
+from modules.stat_functions import runtime_curve
+from modules.stat_functions import rpv_stats
+from modules.data_functions import load_revenue_summary
+from modules.data_functions import describe_rows
+from modules.data_functions import load_cuped_stats
+from modules.data_functions import load_ratio_stats
+from modules.data_functions import load_revenue_sketch
+from modules.data_functions import read_csv_columns
+from modules.data_functions import load_rpv_simulation
+from modules.simulation_functions import SIMULATION_RUNS
+from modules.simulation_functions import simulate_cr
+from modules.cuped_functions import cuped_moments
+from modules.ratio_functions import ratio_moments
+from modules.winsor_functions import WINSOR_PERCENTILES
+from modules.winsor_functions import sketch_quantile
+from modules.winsor_functions import winsorise
+import numpy as np
 
 st.set_page_config(
     page_title="CRO Calculators"
@@ -64,7 +82,7 @@ def main():
                 , value = 1
                 , step = 1
                 , help = '''Enter the number of variants you want to test. You should always have one control group + a variable number of variants.  
-                For more than 1 variant Bonferroni correction is applied'''
+                For more than 1 variant the significance level is corrected for multiple comparisons.'''
                 )
         with col4:
             hypo = st.radio(
@@ -73,6 +91,43 @@ def main():
                 , index = 0
                 , help = 'Use one-sided when you want to detect an effect in a specific direction (increase or decrease). Use two-sided when you want to detect an effect in either direction. '
                 )
+
+        correction_method = st.selectbox(
+            'Multiple comparison correction'
+            , list(CORRECTION_METHODS)
+            , format_func = CORRECTION_METHODS.get
+            , help = '''Used for more than 1 variant, every variant is one comparison with the control. Use the same correction as in your analysis.  
+            Holm, Hochberg and Benjamini-Hochberg are planned with the Bonferroni level, which their smallest p-value is compared with.'''
+            )
+        # Significance level per comparison of a variant with the control
+        alpha_corrected = float(correct_alpha(alpha, num_variants, correction_method))
+
+        max_weeks = st.number_input(
+            'Maximum runtime (weeks)'
+            , min_value = 1
+            , max_value = 52
+            , value = 6
+            , step = 1
+            , help = 'The MDE is calculated for every week of runtime up to this number of weeks.'
+            )
+        Num_of_weeks = np.arange(1, max_weeks + 1)
+
+        target_range = st.slider(
+            'Target MDE (%)'
+            , min_value = 0.5
+            , max_value = 30.0
+            , value = (1.0, 10.0)
+            , step = 0.5
+            , help = 'The runtime you need to detect an effect of this size is calculated for every 0.5 % in this range.'
+            )
+        Targets = np.arange(target_range[0], target_range[1] + 0.25, 0.5) / 100
+
+        simulate = st.toggle(
+            'Check the MDE with a simulation'
+            , help = f'''Runs {SIMULATION_RUNS:,} simulated experiments per runtime, once with the MDE as true effect and once without an effect.  
+            The share of significant experiments is the empirical power (should be close to your statistical power) and the empirical false positive rate (should be close to your significance level, per comparison).
+            Deviations show where the normal approximation of the calculator does not hold, e.g. for very low conversion rates or very skewed revenue.'''
+            )
     
     # Input container CR
     with st.container():
@@ -114,34 +169,22 @@ def main():
                 st.warning('⚠️ You have a Conversion rate of 100 %, there seems to be nothing left to optimize 😲')
             else:          
                 CR = cr_weekly_orders / cr_weekly_visitors
-                Num_of_weeks = [1, 2, 3, 4, 5, 6]
-                CR_sample_size_per_week = [int(i * cr_weekly_visitors / (num_variants + 1)) for i in  Num_of_weeks]
-                mde_per_week = []
-                potential_CR = []
-                difference_CR = []
-
-                for i in Num_of_weeks:
-                    mde_i = mde_cr(
-                        sample_size = i * cr_weekly_visitors / (num_variants + 1)
-                        , baseline = CR
-                        , alpha = alpha /(num_variants + 1) # /(num_variants) is the bonferroni correction for multiple comparisons
-                        , power = power
-                        , test_type = hypo
-                        )
-                    mde = mde_i/CR*100
-                    CR_new = CR * (1 + (mde / 100)) * 100
-                    CR_diff = ((CR_new / 100) - CR) * 100
-                    mde_per_week.append(mde)
-                    potential_CR.append(CR_new)
-                    difference_CR.append(CR_diff)
-
-                result = pd.DataFrame(
-                    {'Runtime' : Num_of_weeks
-                    , 'MDE_perc' : mde_per_week
-                    , 'MDE_PP' : difference_CR
-                    , 'Sample_size' : CR_sample_size_per_week
-                    , 'new_CR' : potential_CR
-                    }) 
+                result = mde_curve(
+                    visitors = cr_weekly_visitors
+                    , runtime = Num_of_weeks
+                    , baseline = CR
+                    , num_variants = num_variants
+                    , alpha = alpha_corrected
+                    , power = power
+                    , test_type = hypo
+                    )
+                result['MDE_PP'] = result['MDE'] * 100
+                result['new_CR'] = (CR + result['MDE']) * 100
+                if simulate:
+                    # The binomial draws of all runtimes take milliseconds, worker processes would only add overhead
+                    cr_simulation = simulate_cr(result['Sample_size'], CR, result['MDE'], alpha = alpha_corrected, test_type = hypo, num_workers = 1)
+                    result['Sim_power'] = cr_simulation.power * 100
+                    result['Sim_type_1_error'] = cr_simulation.type_1_error * 100
 
             # Output display container CR
                 with st.container():
@@ -156,38 +199,91 @@ def main():
                             )
                         
                     with col_CR_B2:
+                        with span('render MDE table CR'):
+                            st.dataframe(
+                                data=result
+                                , hide_index = 1
+                                , column_order = (
+                                    "Runtime"
+                                    , "MDE_perc"
+                                    , "MDE_PP"
+                                    , "new_CR"
+                                    , "Sample_size"
+                                    , "Sim_power"
+                                    , "Sim_type_1_error"
+                                    )
+                                , column_config = {
+                                    'Runtime' : '''Time (weeks)''',
+                                    'MDE_perc': st.column_config.NumberColumn(
+                                        'MDE (%)',
+                                        help = 'Minimal detectable effect in percent',
+                                        format = "%.2f %%"),
+                                    'MDE_PP': st.column_config.NumberColumn(
+                                        'MDE (PP)',
+                                        help = 'Minimal detectable effect in Percent points',
+                                        format = "%.3f PP"),
+                                    'new_CR' : st.column_config.NumberColumn(
+                                        'Potential CR',
+                                        format = "%.2f %%"),
+                                    'Sample_size' : 'Sample size per variant',
+                                    'Sim_power' : st.column_config.NumberColumn(
+                                        'Simulated power',
+                                        help = 'Share of the simulated experiments with the MDE as true effect that are significant',
+                                        format = "%.1f %%"),
+                                    'Sim_type_1_error' : st.column_config.NumberColumn(
+                                        'Simulated false positives',
+                                        help = 'Share of the simulated experiments without an effect that are significant',
+                                        format = "%.1f %%")
+                                    })
+                        if simulate:
+                            st.caption(f"Simulated with {cr_simulation.num_runs:,} experiments per runtime in {round(cr_simulation.seconds, 2)} s.")
+                        if hypo == 'One-sided':
+                            st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(result.loc[0, 'MDE_perc'], 2)} %. This could mean an increase of your Conversion rate from {round(CR * 100, 2)} % to {round((CR * 100) * (1 + result.loc[0, 'MDE_perc']/100), 2)} %")
+                        else:
+                            st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(result.loc[0, 'MDE_perc'], 2)} %. This could mean a Conversion rate between {round((CR * 100) * (1 - result.loc[0, 'MDE_perc']/100), 2)} % and {round((CR * 100) * (1 + result.loc[0, 'MDE_perc']/100), 2)} %")
+    
+                if result['MDE_perc'].iloc[-1] >= 5.00:
+                    st.warning('💡 Your MDE is quite high. Consider if the contrast of you A/B test is high enough.')
+
+                # Required runtime for the target MDEs
+                runtime_result = runtime_curve(
+                    visitors = cr_weekly_visitors / 7 # per day
+                    , target = Targets
+                    , baseline = CR
+                    , num_variants = num_variants
+                    , alpha = alpha_corrected
+                    , power = power
+                    , test_type = hypo
+                    )
+                runtime_result['MDE_PP'] = runtime_result['MDE'] * 100
+                runtime_result['Runtime_days'] = np.ceil(runtime_result['Runtime']).astype(int)
+                runtime_result['Runtime_weeks'] = runtime_result['Runtime'] / 7
+                with st.container():
+                    st.subheader('Runtime for your target MDE:')
+                    with span('render runtime table CR'):
                         st.dataframe(
-                            data=result
+                            data = runtime_result
                             , hide_index = 1
                             , column_order = (
-                                "Runtime"
-                                , "MDE_perc"
+                                "MDE_perc"
                                 , "MDE_PP"
-                                , "new_CR"
                                 , "Sample_size"
+                                , "Runtime_days"
+                                , "Runtime_weeks"
                                 )
                             , column_config = {
-                                'Runtime' : '''Time (weeks)''',
                                 'MDE_perc': st.column_config.NumberColumn(
-                                    'MDE (%)',
-                                    help = 'Minimal detectable effect in percent',
-                                    format = "%.2f %%"),
+                                    'Target MDE (%)',
+                                    format = "%.1f %%"),
                                 'MDE_PP': st.column_config.NumberColumn(
                                     'MDE (PP)',
-                                    help = 'Minimal detectable effect in Percent points',
                                     format = "%.3f PP"),
-                                'new_CR' : st.column_config.NumberColumn(
-                                    'Potential CR',
-                                    format = "%.2f %%"),
-                                'Sample_size' : 'Sample size per variant'
+                                'Sample_size' : 'Sample size per variant',
+                                'Runtime_days' : 'Runtime (days)',
+                                'Runtime_weeks' : st.column_config.NumberColumn(
+                                    'Runtime (weeks)',
+                                    format = "%.1f")
                                 })
-                        if hypo == 'One-sided':
-                            st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(result.loc[0, 'MDE_perc'], 2)} %. This could mean an increase of your Conversion rate from {round(CR * 100, 2)} % to {round((CR * 100) * (1 + result.loc[0, 'MDE_perc']/100), 2)} %")
-                        else:
-                            st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(result.loc[0, 'MDE_perc'], 2)} %. This could mean a Conversion rate between {round((CR * 100) * (1 - result.loc[0, 'MDE_perc']/100), 2)} % and {round((CR * 100) * (1 + result.loc[0, 'MDE_perc']/100), 2)} %")
-    
-                if result.loc[5, 'MDE_perc'] >= 5.00:
-                    st.warning('💡 Your MDE is quite high. Consider if the contrast of you A/B test is high enough.')
 
     # Input container RPV
     with st.container():
@@ -216,37 +312,40 @@ def main():
                 , help = '''Upload a .csv file with the revenue values for each order in the last 4 weeks that would be included in your experiment.   
                 Your .csv file should contain a header cell.'''
                 )
+        rpv_cap_percentile = st.selectbox(
+            'Cap large orders'
+            , [None] + WINSOR_PERCENTILES
+            , format_func = lambda percentile: 'No capping' if percentile is None else f'At the {percentile:g}th percentile'
+            , help = '''Orders above this percentile of your order values are set to the percentile. A few very large orders (e.g. B2B orders) can dominate the standard deviation, capping them reduces your MDE.  
+            Use the same capping in your analysis.'''
+            )
 
         if RPV_order_value is not None:
-            rpv_df = pd.read_csv(
-                RPV_order_value
-                # , sep = ';'
-                , header = 0
-                # , decimal = ','
-                )
-            # debugging
-            # print(rpv_df)
+            rpv_summary = load_revenue_summary(RPV_order_value)
             
             # Sanity checks
             ## The column should only contain numeric values
-            from modules.stat_functions import check_numeric_columns
-            san_num = check_numeric_columns (rpv_df, [0])
-            if san_num == False:
+            if rpv_summary.num_non_numeric > 0:
                 st.warning(
-                    'It looks like your revenue data contains non-numeric values.'
+                    f'It looks like your revenue data contains non-numeric values{describe_rows(RPV_order_value, "non_numeric")}.'
                     , icon = '⚠️')
             else:
                 ## All values shoudl be > 0  
-                from modules.stat_functions import check_value_size
-                san_zero = check_value_size(rpv_df, 0) 
-                if san_zero == False:
+                if rpv_summary.num_non_positive > 0:
                     st.warning(
-                        'It looks like you have orders with 0 € revenue or less.'
+                        f'It looks like you have orders with 0 € revenue or less{describe_rows(RPV_order_value, "non_positive")}.'
                         , icon = '⚠️')
                 else:
+                    ## Unusually large orders are only reported, they stay in the data
+                    rpv_outlier_rows = describe_rows(RPV_order_value, "outlier")
+                    if rpv_outlier_rows != '':
+                        st.info(
+                            f'Your revenue data contains unusually large orders{rpv_outlier_rows}. They increase the standard deviation and therefore your MDE.'
+                            , icon = '💡')
+
                     # Calculate mde RPV output
                     if RPV_order_value is not None and RPV_num_visitors is not None:
-                        RPV_num_orders = len(rpv_df)
+                        RPV_num_orders = rpv_summary.num_orders
                         RPV_CR = RPV_num_orders / RPV_num_visitors
 
                         #debugging
@@ -260,44 +359,47 @@ def main():
                         elif RPV_num_orders == RPV_num_visitors:
                             st.warning('⚠️ You have a Conversion rate of 100 %, there seems to be nothing left to optimize 😲')
                         else:
-                            num_null_orders = RPV_num_visitors - RPV_num_orders
-                            RPV_full_data = pd.concat([rpv_df.squeeze(), pd.Series([0] * num_null_orders)]).reset_index(drop=True)
-                            RPV_mean = RPV_full_data.mean(skipna = False)
-                            RPV_std = RPV_full_data.std(skipna = False)
-
-                            # debugging
-                            # print(num_null_orders)
-                            # print(RPV_full_data)
-
-                            Num_of_weeks = [1, 2, 3, 4, 5, 6]
-                            RPV_sample_size_per_week = [int(i * (RPV_num_visitors/4) / (num_variants + 1)) for i in  Num_of_weeks]
-                            RPV_mde_per_week = []
-                            potential_RPV = []
-                            difference_RPV = [] 
-
-                            for i in Num_of_weeks:
-                                mde_i = mde_cont(
-                                    sample_size = i * (RPV_num_visitors/4)
-                                    , std_dev = RPV_std
-                                    , alpha = alpha /(num_variants) # /(num_of_variants) is the bonferroni correction for multiple comparisons
-                                    , power = power
-                                    , test_type = hypo
-                                    )
-                                mde = (mde_i/RPV_mean * 100)
-                                RPV_mde_per_week.append(mde)
-                                RPV_new = RPV_mean * (1 + (mde))
-                                RPV_diff = ((RPV_new / 100) - RPV_mean) * 100
-                                potential_RPV.append(RPV_new)
-                                difference_RPV.append(RPV_diff)
+                            # Visitors without an order are accounted for in the sufficient statistics instead of adding one 0 per visitor
+                            RPV_mean, RPV_var = rpv_stats(RPV_num_visitors, rpv_summary.revenue_sum, rpv_summary.revenue_sum_sq, RPV_num_orders)
+                            if rpv_cap_percentile is not None:
+                                rpv_sketch = load_revenue_sketch(RPV_order_value)
+                                rpv_capped = winsorise(rpv_sketch, sketch_quantile(rpv_sketch, rpv_cap_percentile))
+                                RPV_mean_capped, RPV_var_capped = rpv_stats(RPV_num_visitors, rpv_capped.revenue_sum, rpv_capped.revenue_sum_sq, RPV_num_orders)
+                                st.info(
+                                    f'{rpv_capped.num_capped} orders are capped at {round(rpv_capped.cap, 2)} €. This removes {round((1 - RPV_var_capped / RPV_var) * 100, 1)} % of the variance of the revenue per visitor.'
+                                    , icon = '✂️')
+                                RPV_mean, RPV_var = RPV_mean_capped, RPV_var_capped
+                            RPV_std = np.sqrt(RPV_var)
 
-                            RPV_result = pd.DataFrame(
-                                {'Runtime' : Num_of_weeks
-                                , 'RPV_MDE_perc' : RPV_mde_per_week
-                                , 'RPV_MDE_PP' : difference_RPV
-                                , 'RPV_Sample_size' : RPV_sample_size_per_week
-                                , 'new_RPV' : potential_RPV
-                                }
+                            RPV_result = mde_curve(
+                                visitors = RPV_num_visitors / 4
+                                , runtime = Num_of_weeks
+                                , baseline = RPV_mean
+                                , std_dev = RPV_std
+                                , num_variants = num_variants
+                                , alpha = alpha_corrected
+                                , power = power
+                                , test_type = hypo
                                 )
+                            RPV_result = RPV_result.rename(columns = {
+                                'MDE_perc' : 'RPV_MDE_perc'
+                                , 'MDE' : 'RPV_MDE_PP'
+                                , 'Sample_size' : 'RPV_Sample_size'
+                                })
+                            RPV_result['new_RPV'] = RPV_mean + RPV_result['RPV_MDE_PP']
+                            if simulate:
+                                with st.spinner('Simulating experiments with your revenue data...'):
+                                    rpv_simulation = load_rpv_simulation(
+                                        RPV_order_value
+                                        , RPV_num_visitors
+                                        , RPV_result['RPV_Sample_size']
+                                        , RPV_result['RPV_MDE_PP']
+                                        , alpha = alpha_corrected
+                                        , test_type = hypo
+                                        , cap = rpv_capped.cap if rpv_cap_percentile is not None else None
+                                        )
+                                RPV_result['Sim_power'] = rpv_simulation.power * 100
+                                RPV_result['Sim_type_1_error'] = rpv_simulation.type_1_error * 100
                             # Output display container Cont
                             with st.container():
                                 st.subheader('Your result:')
@@ -318,39 +420,291 @@ def main():
                                         , value = f"{round(RPV_std, 2)} €"
                                         )
                                     
-                                st.dataframe(
-                                    data = RPV_result
-                                    , hide_index = 1
-                                    , column_order = (
-                                        "Runtime"
-                                        , "RPV_MDE_perc"
-                                        , "RPV_MDE_PP"
-                                        , "new_RPV"
-                                        , "RPV_Sample_size"
-                                        )
-                                    , column_config = {
-                                                'Runtime' : '''Time (weeks)''',
-                                                'RPV_MDE_perc': st.column_config.NumberColumn(
-                                                    'MDE (%)',
-                                                    help = 'Minimal detectable effect in percent',
-                                                    format = "%.2f %%"),
-                                                'RPV_MDE_PP': st.column_config.NumberColumn(
-                                                    'MDE (€)',
-                                                    help = 'Minimal detectable effect in Euro',
-                                                    format = "%.3f €"),
-                                                'new_RPV' : st.column_config.NumberColumn(
-                                                    'Potential RPV',
-                                                    format = "%.2f %% €"),
-                                                'RPV_Sample_size' : 'Sample size per variant'
-                                                })
+                                with span('render MDE table RPV'):
+                                    st.dataframe(
+                                        data = RPV_result
+                                        , hide_index = 1
+                                        , column_order = (
+                                            "Runtime"
+                                            , "RPV_MDE_perc"
+                                            , "RPV_MDE_PP"
+                                            , "new_RPV"
+                                            , "RPV_Sample_size"
+                                            , "Sim_power"
+                                            , "Sim_type_1_error"
+                                            )
+                                        , column_config = {
+                                                    'Runtime' : '''Time (weeks)''',
+                                                    'RPV_MDE_perc': st.column_config.NumberColumn(
+                                                        'MDE (%)',
+                                                        help = 'Minimal detectable effect in percent',
+                                                        format = "%.2f %%"),
+                                                    'RPV_MDE_PP': st.column_config.NumberColumn(
+                                                        'MDE (€)',
+                                                        help = 'Minimal detectable effect in Euro',
+                                                        format = "%.3f €"),
+                                                    'new_RPV' : st.column_config.NumberColumn(
+                                                        'Potential RPV',
+                                                        format = "%.2f €"),
+                                                    'RPV_Sample_size' : 'Sample size per variant',
+                                                    'Sim_power' : st.column_config.NumberColumn(
+                                                        'Simulated power',
+                                                        help = 'Share of the simulated experiments with the MDE as true effect that are significant. Your orders are resampled and the effect is applied to every order value.',
+                                                        format = "%.1f %%"),
+                                                    'Sim_type_1_error' : st.column_config.NumberColumn(
+                                                        'Simulated false positives',
+                                                        help = 'Share of the simulated experiments without an effect that are significant',
+                                                        format = "%.1f %%")
+                                                    })
+                                if simulate:
+                                    st.caption(f"Simulated with {rpv_simulation.num_runs:,} experiments per runtime in {round(rpv_simulation.seconds, 1)} s on {rpv_simulation.num_workers} process(es).")
                                 if hypo == 'One-sided':
                                     st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(RPV_result.loc[0, 'RPV_MDE_perc'], 2)} %. This could mean an increase of your Revenue per Visitor from {round(RPV_mean, 2)} € to {round(RPV_mean * (1 + RPV_result.loc[0, 'RPV_MDE_perc']/100), 2)} €")
                                 else:
                                     st.caption(f"Reading example: After 1 week of runtime you would be able to statistically reliably detect an effect of {round(RPV_result.loc[0, 'RPV_MDE_perc'], 2)} %. This could mean a Conversion rate between {round((RPV_mean) * (1 - RPV_result.loc[0, 'RPV_MDE_perc']/100), 2)} % and {round((RPV_mean) * (1 + RPV_result.loc[0, 'RPV_MDE_perc']/100), 2)} €")
-                            if RPV_result.loc[5, 'RPV_MDE_perc'] >= 5.00:
+                            if RPV_result['RPV_MDE_perc'].iloc[-1] >= 5.00:
                                 st.warning('💡 Your MDE is quite high. Consider if the contrast of you A/B test is high enough.')
 
+                            # Required runtime for the target MDEs
+                            RPV_runtime_result = runtime_curve(
+                                visitors = RPV_num_visitors / 28 # per day
+                                , target = Targets
+                                , baseline = RPV_mean
+                                , std_dev = RPV_std
+                                , num_variants = num_variants
+                                , alpha = alpha_corrected
+                                , power = power
+                                , test_type = hypo
+                                )
+                            RPV_runtime_result['Runtime_days'] = np.ceil(RPV_runtime_result['Runtime']).astype(int)
+                            RPV_runtime_result['Runtime_weeks'] = RPV_runtime_result['Runtime'] / 7
+                            with st.container():
+                                st.subheader('Runtime for your target MDE:')
+                                with span('render runtime table RPV'):
+                                    st.dataframe(
+                                        data = RPV_runtime_result
+                                        , hide_index = 1
+                                        , column_order = (
+                                            "MDE_perc"
+                                            , "MDE"
+                                            , "Sample_size"
+                                            , "Runtime_days"
+                                            , "Runtime_weeks"
+                                            )
+                                        , column_config = {
+                                            'MDE_perc': st.column_config.NumberColumn(
+                                                'Target MDE (%)',
+                                                format = "%.1f %%"),
+                                            'MDE': st.column_config.NumberColumn(
+                                                'MDE (€)',
+                                                format = "%.3f €"),
+                                            'Sample_size' : 'Sample size per variant',
+                                            'Runtime_days' : 'Runtime (days)',
+                                            'Runtime_weeks' : st.column_config.NumberColumn(
+                                                'Runtime (weeks)',
+                                                format = "%.1f")
+                                            })
+
+
+    # Input container CUPED
+    with st.container():
+        st.header('Variance reduction (CUPED)')
+        st.caption('''If you will adjust your results with the behaviour of your visitors before the experiment (CUPED), the variance of your metric shrinks and so does your MDE.  
+        Upload historic visitor level data to see how much.''')
+
+        if st.toggle('I will use CUPED in my analysis'):
+            st.subheader('Input your data:')
+            col_CUPED_A1, col_CUPED_A2 = st.columns([2, 1])
+            with col_CUPED_A1:
+                cuped_file = st.file_uploader(
+                    'Visitor level data'
+                    , key = 'cuped_file'
+                    , type = ['csv']
+                    , help = '''Upload a .csv file with a header row and one row per visitor of a past period (e.g. the last 4 weeks). It needs a column with the metric in this period (revenue, or 1 / 0 for a conversion) and a column with the same metric in the period before. Empty values count as 0.'''
+                    )
+            with col_CUPED_A2:
+                cuped_weeks = st.number_input(
+                    'Weeks covered by the file'
+                    , min_value = 1
+                    , max_value = 52
+                    , value = 4
+                    , step = 1
+                    )
+            if cuped_file is not None:
+                cuped_columns = read_csv_columns(cuped_file)
+                col_CUPED_B1, col_CUPED_B2 = st.columns(2)
+                with col_CUPED_B1:
+                    cuped_metric = st.selectbox('Metric column', cuped_columns, index = 0)
+                with col_CUPED_B2:
+                    cuped_covariate = st.selectbox('Pre-period column', cuped_columns, index = min(1, len(cuped_columns) - 1))
+                try:
+                    if cuped_metric == cuped_covariate:
+                        raise ValueError("Please choose two different columns.")
+                    cuped_stats = load_cuped_stats(cuped_file, cuped_metric, cuped_covariate)
+                    if cuped_stats['visitors'].iloc[0] < 2:
+                        raise ValueError("The file needs at least 2 visitors.")
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    cuped_mean, cuped_var, cuped_mean_adj, cuped_var_adj, cuped_theta, cuped_rho = cuped_moments(cuped_stats)
+                    CUPED_result = mde_curve(
+                        visitors = cuped_stats['visitors'].iloc[0] / cuped_weeks
+                        , runtime = Num_of_weeks
+                        , baseline = cuped_mean[0]
+                        , std_dev = np.sqrt(cuped_var[0])
+                        , num_variants = num_variants
+                        , alpha = alpha_corrected
+                        , power = power
+                        , test_type = hypo
+                        )
+                    # Same runtimes with the standard deviation that is left after the CUPED adjustment
+                    CUPED_result['CUPED_MDE_perc'] = mde_curve(
+                        visitors = cuped_stats['visitors'].iloc[0] / cuped_weeks
+                        , runtime = Num_of_weeks
+                        , baseline = cuped_mean[0]
+                        , std_dev = np.sqrt(cuped_var_adj[0])
+                        , num_variants = num_variants
+                        , alpha = alpha_corrected
+                        , power = power
+                        , test_type = hypo
+                        )['MDE_perc']
+                    with st.container():
+                        st.subheader('Your result:')
+                        col_CUPED_C1, col_CUPED_C2, col_CUPED_C3 = st.columns(3)
+                        with col_CUPED_C1:
+                            st.metric(
+                                'Mean'
+                                , value = f"{round(float(cuped_mean[0]), 4)}"
+                                )
+                        with col_CUPED_C2:
+                            st.metric(
+                                'Correlation with the pre-period'
+                                , value = f"{round(float(cuped_rho), 2)}"
+                                )
+                        with col_CUPED_C3:
+                            st.metric(
+                                'Variance reduction'
+                                , value = f"{round(float(cuped_rho) ** 2 * 100, 1)} %"
+                                )
+                        with span('render MDE table CUPED'):
+                            st.dataframe(
+                                data = CUPED_result
+                                , hide_index = 1
+                                , column_order = (
+                                    "Runtime"
+                                    , "MDE_perc"
+                                    , "CUPED_MDE_perc"
+                                    , "Sample_size"
+                                    )
+                                , column_config = {
+                                    'Runtime' : '''Time (weeks)''',
+                                    'MDE_perc': st.column_config.NumberColumn(
+                                        'MDE (%)',
+                                        help = 'Minimal detectable effect in percent without CUPED',
+                                        format = "%.2f %%"),
+                                    'CUPED_MDE_perc': st.column_config.NumberColumn(
+                                        'MDE with CUPED (%)',
+                                        help = 'Minimal detectable effect in percent with CUPED',
+                                        format = "%.2f %%"),
+                                    'Sample_size' : 'Sample size per variant'
+                                    })
+                        st.caption(f"With CUPED you need {round((1 - float(cuped_rho) ** 2) * 100, 1)} % of the visitors to detect the same effect.")
+
+    # Input container ratio metrics
+    with st.container():
+        st.header('Ratio metrics')
+        st.caption('''Metrics like the average order value (revenue / orders) or the items per session divide two sums over the same users. The orders of a user are not independent, so their variance is calculated per user with the delta method.
+        Upload historic user level data to get the MDE of your ratio metric.''')
+
+        if st.toggle('I want to test a ratio metric'):
+            st.subheader('Input your data:')
+            col_ratio_A1, col_ratio_A2 = st.columns([2, 1])
+            with col_ratio_A1:
+                ratio_file = st.file_uploader(
+                    'User level data'
+                    , key = 'ratio_file'
+                    , type = ['csv']
+                    , help = '''Upload a .csv file with a header row and one row per user of a past period (e.g. the last 4 weeks). It needs a column with the numerator of the user in this period (e.g. the revenue) and a column with the denominator (e.g. the number of orders). Users without an order count, too. Empty values count as 0.'''
+                    )
+            with col_ratio_A2:
+                ratio_weeks = st.number_input(
+                    'Weeks covered by the file'
+                    , key = 'ratio_weeks'
+                    , min_value = 1
+                    , max_value = 52
+                    , value = 4
+                    , step = 1
+                    )
+            if ratio_file is not None:
+                ratio_columns = read_csv_columns(ratio_file)
+                col_ratio_B1, col_ratio_B2 = st.columns(2)
+                with col_ratio_B1:
+                    ratio_numerator = st.selectbox('Numerator column', ratio_columns, index = 0)
+                with col_ratio_B2:
+                    ratio_denominator = st.selectbox('Denominator column', ratio_columns, index = min(1, len(ratio_columns) - 1))
+                try:
+                    if ratio_numerator == ratio_denominator:
+                        raise ValueError("Please choose two different columns.")
+                    ratio_stats = load_ratio_stats(ratio_file, ratio_numerator, ratio_denominator)
+                    if ratio_stats['users'].iloc[0] < 2:
+                        raise ValueError("The file needs at least 2 users.")
+                    if ratio_stats['denominator_sum'].iloc[0] <= 0:
+                        raise ValueError("The denominator has to sum up to more than 0.")
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    ratio_value, ratio_var = ratio_moments(ratio_stats)
+                    # The users are the sample, the delta method gives the standard deviation of the ratio per user
+                    ratio_result = mde_curve(
+                        visitors = ratio_stats['users'].iloc[0] / ratio_weeks
+                        , runtime = Num_of_weeks
+                        , baseline = ratio_value[0]
+                        , std_dev = np.sqrt(ratio_var[0])
+                        , num_variants = num_variants
+                        , alpha = alpha_corrected
+                        , power = power
+                        , test_type = hypo
+                        )
+                    with st.container():
+                        st.subheader('Your result:')
+                        col_ratio_C1, col_ratio_C2, col_ratio_C3 = st.columns(3)
+                        with col_ratio_C1:
+                            st.metric(
+                                'Ratio'
+                                , value = f"{round(float(ratio_value[0]), 4)}"
+                                )
+                        with col_ratio_C2:
+                            st.metric(
+                                'Denominator per user'
+                                , value = f"{round(float(ratio_stats['denominator_sum'].iloc[0] / ratio_stats['users'].iloc[0]), 4)}"
+                                )
+                        with col_ratio_C3:
+                            st.metric(
+                                'Standard deviation per user'
+                                , value = f"{round(float(np.sqrt(ratio_var[0])), 4)}"
+                                )
+                        with span('render MDE table ratio'):
+                            st.dataframe(
+                                data = ratio_result
+                                , hide_index = 1
+                                , column_order = (
+                                    "Runtime"
+                                    , "MDE_perc"
+                                    , "MDE"
+                                    , "Sample_size"
+                                    )
+                                , column_config = {
+                                    'Runtime' : '''Time (weeks)''',
+                                    'MDE_perc': st.column_config.NumberColumn(
+                                        'MDE (%)',
+                                        help = 'Minimal detectable effect in percent of the ratio',
+                                        format = "%.2f %%"),
+                                    'MDE': st.column_config.NumberColumn(
+                                        'MDE (absolute)',
+                                        help = 'Minimal detectable effect in the unit of the ratio',
+                                        format = "%.4f"),
+                                    'Sample_size' : 'Users per variant'
+                                    })
 
 if __name__ == '__main__':
-    main()
-    footer()
\ No newline at end of file
+    run_page('MDE', main)
\ No newline at end of file
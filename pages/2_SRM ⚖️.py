@@ -1,8 +1,10 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
+from modules.functions import run_page
+from modules.srm_functions import SRM_THRESHOLD
+from modules.srm_functions import monitor_srm
+from modules.srm_functions import srm_test
 import numpy as np
-from scipy.stats import chisquare
 
 # set tab title and Favicon
 st.set_page_config(
@@ -42,6 +44,14 @@ def main():
                 , ['Equal', 'Unequal']
                 , help = 'Choose Equal when you expect the same number of visitors in all your variants.'
                 )
+        srm_method = st.radio(
+            'Statistical test'
+            , ['Automatic', 'Chi-square', 'G-test', 'Exact (simulation)']
+            , horizontal = True
+            , help = '''Automatic uses the chi-square test and switches to the exact test when a sample is expected to get fewer than 5 visitors.  
+            The exact test simulates the visitor split many times and does not rely on the chi-square approximation. It is the better choice for many samples with small expected frequencies.'''
+            )
+        srm_method = {'Automatic' : 'auto', 'Chi-square' : 'chisquare', 'G-test' : 'gtest', 'Exact (simulation)' : 'exact'}[srm_method]
 
     # Variable input container
     # depending on the input of the initial input container
@@ -107,12 +117,10 @@ def main():
                         exp_freq.append(exp_frequency)
 
     if np.all(exp_freq) and distribution == 'Unequal':
-        if sum(exp_freq) != 1.00:
+        if not np.isclose(sum(exp_freq), 1.00):
             st.warning(f"""Your expected frequencies should sum up to 1.00""")
-        else:
-            total_sample = sum(sample_sizes)
-            exp_freq = [freq * total_sample for freq in exp_freq]
-            test_result = chisquare(sample_sizes, f_exp=exp_freq)
+        elif np.all(sample_sizes):
+            test_result = srm_test(sample_sizes, expected_share = exp_freq, method = srm_method)
             if test_result.pvalue < 0.1:
                 st.warning(f"""The p-value is smaller than 0.1 ({round(test_result.pvalue, 3)}). A possible SRM is detected. Please contact your AB test experts before analysing the test results.""")
             else:
@@ -120,16 +128,41 @@ def main():
                 st.success(f"""The p-value is greater than 0.1 ({round(test_result.pvalue, 3)}). No SRM is detected. Happy analysing your test results.""")
 
     if np.all(sample_sizes) and distribution == 'Equal':
-        test_result = chisquare(sample_sizes, f_exp=None)
+        test_result = srm_test(sample_sizes, method = srm_method)
         if test_result.pvalue < 0.1:
             st.warning(f"""The p-value is smaller than 0.1 ({round(test_result.pvalue, 3)}). A possible SRM is detected. Please double check your data generating process before applying statistical analysis.""")
         else:
             st.balloons()
             st.success(f"""The p-value is greater than 0.1 ({round(test_result.pvalue, 3)}). No SRM is detected. Happy analysing your test results.""")
 
+    # Sequential SRM check over time buckets
+    with st.container():
+        st.subheader('SRM over time')
+        st.caption('''Upload your visitors per time bucket (e.g. per hour) to find out when a mismatch started. The sequential test can be checked after every bucket without raising more false alarms.''')
+        assignment_log = st.file_uploader(
+            label = "Visitors per time bucket"
+            , key = "assignment_log"
+            , type = ['csv']
+            , help = '''Upload a csv file with the columns bucket, variant and visitors, with one row per time bucket and variant in time order.  
+            Optional columns: experiment (to check many experiments at once) and expected_share (for unequal distributions).'''
+            )
+        if assignment_log != None:
+            try:
+                srm_monitoring = monitor_srm(assignment_log, threshold = SRM_THRESHOLD)
+            except ValueError as error:
+                st.error(f"{error}", icon = '🚨')
+            else:
+                srm_experiments = srm_monitoring.drop_duplicates('experiment')
+                for experiment, bucket, pvalue in zip(srm_experiments['experiment'], srm_experiments['detected_bucket'], srm_experiments['pvalue']):
+                    name = '' if experiment == 'experiment' else f' in {experiment}'
+                    if bucket is not None:
+                        st.warning(f"""A possible SRM{name} is detected since bucket {bucket} (always-valid p-value {round(pvalue, 3)}). Please check what changed in your experiment setup at that time.""")
+                    else:
+                        st.success(f"""No SRM{name} is detected (always-valid p-value {round(pvalue, 3)}).""")
+                st.dataframe(srm_monitoring, hide_index = True)
+
 if __name__ == '__main__':
-    main()
-    footer()
+    run_page('SRM', main)
 
 
 
@@ -1,9 +1,14 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
+from modules.functions import run_page
+from modules.timing_functions import span
+from modules.correction_functions import CORRECTION_METHODS
+from modules.interaction_functions import INTERACTION_THRESHOLD
+from modules.data_functions import load_interactions
+from modules.data_functions import load_metric_interactions
+from modules.data_functions import read_csv_columns
 import numpy as np
 import pandas as pd
-from scipy.stats import chi2_contingency
 
 st.set_page_config(
     page_title="CRO Calculators"
@@ -38,37 +43,110 @@ def main():
         , columns=['A', 'B']
         )
 
-    input_data = st.data_editor(
-        data = df
-        , num_rows = 'fixed'
-        , column_config = {
-            'A' : st.column_config.NumberColumn(
-                label = "Visitors in Control of Experiment 1"
-                , required = True
-                , default = "int"
-                , min_value = 1
-            ),
-            'B' : st.column_config.NumberColumn(
-                label = "Visitors in Variant of Experiment 1"
-                , required = True
-                , default = "int"
-                , min_value = 1
-            ),
-            }
-            )
-
-    print(input_data)
-    print(chi2_contingency(input_data))
+    with span('render data_editor traffic'):
+        input_data = st.data_editor(
+            data = df
+            , num_rows = 'fixed'
+            , column_config = {
+                'A' : st.column_config.NumberColumn(
+                    label = "Visitors in Control of Experiment 1"
+                    , required = True
+                    , default = "int"
+                    , min_value = 1
+                ),
+                'B' : st.column_config.NumberColumn(
+                    label = "Visitors in Variant of Experiment 1"
+                    , required = True
+                    , default = "int"
+                    , min_value = 1
+                ),
+                }
+                )
 
     if input_data is not None and input_data.values.sum() > 0:
-        stat, pvalue, dof, exp_freq = chi2_contingency(input_data)
+        with span('chi2_contingency'):
+            from scipy.stats import chi2_contingency
+            stat, pvalue, dof, exp_freq = chi2_contingency(input_data)
         if pvalue < 0.1:
             st.warning(f"""The p-value is smaller than 0.1 ({round(pvalue, 3)}). A possible traffic interaction in between your experiments was detected.""")
         else:
             st.balloons()
             st.success(f"""The p-value is greater than 0.1 ({round(pvalue, 3)}). No traffic interaction in between your experiments was detected. Happy analysing your test results.""")
 
+    # Many experiments
+    with st.container():
+        st.header("Many concurrent experiments")
+        st.caption('''Upload the assignments of all your concurrent experiments to test every pair of experiments for a traffic interaction. The p-values are corrected for the number of pairs you test.''')
+        assignments_file = st.file_uploader(
+            label = "Assignment data"
+            , key = "assignments"
+            , type = ['csv']
+            , help = '''Upload a csv file with one column per experiment that contains the variant of the visitor (empty if the visitor is not in the experiment).  
+            Use one row per visitor, or one row per combination of variants with the number of visitors in a column named visitors.  
+            Add a conversions column and a revenue column (or revenue_sum and revenue_sum_sq) to also test for metric interactions.'''
+            )
+        if assignments_file != None:
+            col1, col2 = st.columns(2)
+            with col1:
+                interaction_order = st.radio(
+                    'Experiments per test'
+                    , [2, 3]
+                    , horizontal = True
+                    , help = 'Test every pair (2) or every triple (3) of experiments. Triples take longer with many experiments.'
+                    )
+            with col2:
+                correction_method = st.selectbox(
+                    'Multiple testing correction'
+                    , list(CORRECTION_METHODS)
+                    , index = 1
+                    , format_func = CORRECTION_METHODS.get
+                    , help = 'Bonferroni, Holm, Hochberg and Šidák control the probability of any false alarm. Benjamini-Hochberg controls the share of false alarms among the detected interactions.'
+                    )
+            try:
+                interactions = load_interactions(
+                    assignments_file
+                    , order = interaction_order
+                    , correction_method = correction_method
+                    )
+            except ValueError as error:
+                st.error(f"{error}", icon = '🚨')
+            else:
+                num_detected = int(interactions['interaction_detected'].sum())
+                if num_detected > 0:
+                    st.warning(f"""A possible traffic interaction was detected in {num_detected} of {len(interactions)} tests (corrected p-value smaller than {INTERACTION_THRESHOLD}).""")
+                else:
+                    st.success(f"""No traffic interaction was detected in {len(interactions)} tests. Happy analysing your test results.""")
+                st.dataframe(interactions, hide_index = True)
+
+            # Metric interactions
+            try:
+                assignment_columns = read_csv_columns(assignments_file)
+            except ValueError:
+                assignment_columns = []
+            if any(col in assignment_columns for col in ['conversions', 'revenue', 'revenue_sum']):
+                st.subheader("Metric interactions")
+                st.caption('''A metric interaction means that the effect of one experiment on your conversion rate or revenue per visitor depends on the variant of the other experiment.''')
+                control_name = st.text_input(
+                    'Name of your control variant'
+                    , value = ''
+                    , help = 'The same name has to be used in all experiments. If left empty, the first variant in alphabetical order is used as control.'
+                    )
+                try:
+                    metric_interactions = load_metric_interactions(
+                        assignments_file
+                        , control = control_name if control_name != '' else None
+                        , correction_method = correction_method
+                        )
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    num_detected = int(metric_interactions['interaction_detected'].sum())
+                    if num_detected > 0:
+                        st.warning(f"""A possible metric interaction was detected in {num_detected} of {len(metric_interactions)} tests (corrected p-value smaller than {INTERACTION_THRESHOLD}).""")
+                    else:
+                        st.success(f"""No metric interaction was detected in {len(metric_interactions)} tests.""")
+                    st.dataframe(metric_interactions, hide_index = True)
+
 if __name__ == '__main__':
-    main()
-    footer()
+    run_page('Interaction detector', main)
 
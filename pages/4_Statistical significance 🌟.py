@@ -1,13 +1,30 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
-from scipy.stats import chisquare
-import statsmodels.stats.proportion as pp
-import statsmodels.stats.power as pw
-import pandas as pd
-from modules.stat_functions import check_numeric_columns
-from modules.stat_functions import check_value_size
-from statsmodels.stats.weightstats import ttest_ind
+from modules.functions import run_page
+from modules.timing_functions import span
+from modules.data_functions import PARSE_MAX_BYTES
+from modules.data_functions import load_revenue_csv
+from modules.data_functions import load_revenue_summary
+from modules.data_functions import describe_rows
+from modules.data_functions import load_bootstrap_rpv
+from modules.data_functions import load_bootstrap_estimate
+from modules.data_functions import load_cuped_stats
+from modules.data_functions import load_revenue_sketch
+from modules.data_functions import read_csv_columns
+from modules.bootstrap_functions import BOOTSTRAP_RESAMPLES
+from modules.bootstrap_functions import BOOTSTRAP_RESAMPLE_OPTIONS
+from modules.bayes_functions import bayes_test
+from modules.cuped_functions import cuped_test
+from modules.winsor_functions import WINSOR_PERCENTILES
+from modules.winsor_functions import sketch_quantile
+from modules.winsor_functions import winsorise
+from modules.sequential_functions import MSPRT_TAU
+from modules.sequential_functions import msprt_confidence_interval
+from modules.sequential_functions import msprt_update
+from modules.sequential_functions import sequential_start
+from modules.stat_functions import proportions_test
+from modules.stat_functions import rpv_stats
+from modules.stat_functions import ttest_ind_from_stats
 
 st.set_page_config(
     page_title="CRO Calculators"
@@ -201,6 +218,7 @@ def main():
             ## SRM check of input data
                 if Visitors_control != None and Visitors_variant != None:
                     sample_sizes = [Visitors_control, Visitors_variant]
+                    from scipy.stats import chisquare
                     SRM_result = chisquare(
                         sample_sizes
                         , f_exp = None
@@ -222,10 +240,13 @@ def main():
                             change = diff / CR_control_perc * 100
                             changes.append(change)
 
-                            # Statistical hypothesis test
-                        stat, pval = pp.proportions_ztest(
-                            count = [Orders_control, Orders_variant]
-                            , nobs = sample_sizes
+                            # Statistical hypothesis test, effect size and post-hoc power in one vectorised call
+                        stat, pval, effect, posthoc_power = proportions_test(
+                            count1 = Orders_control
+                            , nobs1 = Visitors_control
+                            , count2 = Orders_variant
+                            , nobs2 = Visitors_variant
+                            , alpha = alpha
                             , alternative = hypo_type
                             )
                         
@@ -252,19 +273,7 @@ def main():
                         else:
                             st.success(f"""With a p-value of {round(pval, 3)} your result is statistically significant.""")
 
-                        # Determine post-hoc power. Careful! This should not be your default wy to judge if your user reached their sample size. Just use it as a nudge
-                        effect = pp.proportion_effectsize (
-                            CR_control
-                            , CR_variant
-                            , method = "normal"
-                            )
-
-                        posthoc_power = pw.zt_ind_solve_power(
-                            effect_size = effect
-                            , nobs1 = Visitors_control
-                            , alpha = alpha
-                            , alternative = hypo_type
-                            )
+                        # Post-hoc power. Careful! This should not be your default wy to judge if your user reached their sample size. Just use it as a nudge
                         if posthoc_power < 0.8:
                             st.warning('''Did you reach your pre-calculated sample size?''')
 
@@ -327,6 +336,14 @@ def main():
             Please upload one csv file for the control and each variant. The csv files should contain one column with the revenue data per order and one header cell.   
             """
         )
+        rpv_cap_percentile = st.selectbox(
+            'Cap large orders'
+            , [None] + WINSOR_PERCENTILES
+            , format_func = lambda percentile: 'No capping' if percentile is None else f'At the {percentile:g}th percentile of the control'
+            , help = '''Orders above this percentile of the control's order values are set to the percentile, in the control and in all variants. A few very large orders (e.g. B2B orders) can dominate the variance, capping them makes the test more sensitive.  
+            Decide on the capping before you look at the results.'''
+            )
+        rpv_cap = None
 
         # Control
         with st.container():
@@ -341,28 +358,31 @@ def main():
                     , type = ['csv']
                     , help = '''Upload your test results (revenue data per order) for your control as a csv file.'''
                     )
+            rpv_num_orders_control = None
+            rpv_control = None
             if rpv_control_revenue != None:
-                rpv_control_revenue_df = pd.read_csv(
-                    rpv_control_revenue
-                    , header = 0
-                    )
+                rpv_control_summary = load_revenue_summary(rpv_control_revenue)
                 # Sanity checks
                 ## The column should only contain numeric values
-                san_num = check_numeric_columns (rpv_control_revenue_df, [0])
-                if san_num == False:
+                if rpv_control_summary.num_non_numeric > 0:
                     st.warning(
-                        'It looks like your revenue data contains non-numeric values.'
+                        f'It looks like your revenue data contains non-numeric values{describe_rows(rpv_control_revenue, "non_numeric")}.'
                         , icon = '⚠️')
                 else:
                     ## All values should be > 0    
-                    san_zero = check_value_size(rpv_control_revenue_df, 0) 
-                    if san_zero == False:
+                    if rpv_control_summary.num_non_positive > 0:
                         st.warning(
-                            'It looks like you have orders with 0 € revenue or less.'
+                            f'It looks like you have orders with 0 € revenue or less{describe_rows(rpv_control_revenue, "non_positive")}.'
                             , icon = '⚠️'
                             )
                     else:
-                        rpv_num_orders_control = len(rpv_control_revenue_df)
+                        rpv_num_orders_control = rpv_control_summary.num_orders
+                        ## Unusually large orders are only reported, they stay in the data
+                        rpv_outlier_rows = describe_rows(rpv_control_revenue, "outlier")
+                        if rpv_outlier_rows != '':
+                            st.info(
+                                f'Your revenue data contains unusually large orders{rpv_outlier_rows}. They increase the variance of the revenue per visitor.'
+                                , icon = '💡')
 
             with col2:
                 rpv_control_visitors = st.number_input(
@@ -377,7 +397,7 @@ def main():
                                 
             # Output
             with st.container():
-                if rpv_control_revenue != None and rpv_control_visitors != None:
+                if rpv_num_orders_control != None and rpv_control_visitors != None:
                     if rpv_num_orders_control > rpv_control_visitors:
                         st.error(
                             "You shouldn't have more conversions than visitors."
@@ -388,17 +408,30 @@ def main():
                         rpv_cr_control = rpv_num_orders_control / rpv_control_visitors
                         rpv_cr_control_perc = rpv_cr_control * 100
 
-                        rpv_null_order_control = rpv_control_visitors - rpv_num_orders_control
-                        rpv_control_full = pd.concat([rpv_control_revenue_df.squeeze(), pd.Series([0] * rpv_null_order_control)]).reset_index(drop=True)
-
-                        rpv_control = rpv_control_full.mean(skipna = False)
+                        # Visitors without an order are accounted for in the sufficient statistics instead of adding one 0 per visitor
+                        rpv_control, rpv_var_control = rpv_stats(rpv_control_visitors, rpv_control_summary.revenue_sum, rpv_control_summary.revenue_sum_sq, rpv_num_orders_control)
+                        if rpv_cap_percentile is not None:
+                            # The cap is taken from the control and used for all variants
+                            rpv_control_sketch = load_revenue_sketch(rpv_control_revenue)
+                            rpv_cap = float(sketch_quantile(rpv_control_sketch, rpv_cap_percentile))
+                            rpv_control_capped = winsorise(rpv_control_sketch, rpv_cap)
+                            rpv_control_capped_mean, rpv_var_control_capped = rpv_stats(rpv_control_visitors, rpv_control_capped.revenue_sum, rpv_control_capped.revenue_sum_sq, rpv_num_orders_control)
+                            st.info(
+                                f'{rpv_control_capped.num_capped} orders of the control are capped at {round(rpv_cap, 2)} €. This removes {round((1 - rpv_var_control_capped / rpv_var_control) * 100, 1)} % of the variance of the revenue per visitor.'
+                                , icon = '✂️')
+                            rpv_control, rpv_var_control = rpv_control_capped_mean, rpv_var_control_capped
 
                         col1, col2, col3 = st.columns(3)            
                         with col1:
-                            st.data_editor(
-                                data = rpv_control_revenue_df
-                                , disabled = True
-                            )
+                            # Large files are only summarised in chunks and not loaded for the preview
+                            if rpv_control_revenue.size <= PARSE_MAX_BYTES:
+                                with span('render data_editor control revenue'):
+                                    st.data_editor(
+                                        data = load_revenue_csv(rpv_control_revenue)[0]
+                                        , disabled = True
+                                    )
+                            else:
+                                st.caption('The preview is not shown for large files.')
                         with col2:
                             st.metric(
                                 "Control conversion rate"
@@ -425,28 +458,31 @@ def main():
                         , type = ['csv']
                         , help = f'''Upload your test results (revenue data per order) for your variant {i} as a csv file.'''
                         )
+                rpv_num_orders_variant = None
+                rpv_variant = None
                 if rpv_variant_revenue != None:
-                    rpv_variant_revenue_df = pd.read_csv(
-                        rpv_variant_revenue
-                        , header = 0
-                        )
+                    rpv_variant_summary = load_revenue_summary(rpv_variant_revenue)
                     # Sanity checks
                     ## The column should only contain numeric values
-                    san_num = check_numeric_columns (rpv_variant_revenue_df, [0])
-                    if san_num == False:
+                    if rpv_variant_summary.num_non_numeric > 0:
                         st.warning(
-                            'It looks like your revenue data contains non-numeric values.'
+                            f'It looks like your revenue data contains non-numeric values{describe_rows(rpv_variant_revenue, "non_numeric")}.'
                             , icon = '⚠️')
                     else:
                         ## All values should be > 0  
-                        san_zero = check_value_size(rpv_variant_revenue_df, 0) 
-                        if san_zero == False:
+                        if rpv_variant_summary.num_non_positive > 0:
                             st.warning(
-                                'It looks like you have orders with 0 € revenue or less.'
+                                f'It looks like you have orders with 0 € revenue or less{describe_rows(rpv_variant_revenue, "non_positive")}.'
                                 , icon = '⚠️'
                                 )
                         else:
-                            rpv_num_orders_variant = len(rpv_variant_revenue_df)
+                            rpv_num_orders_variant = rpv_variant_summary.num_orders
+                            ## Unusually large orders are only reported, they stay in the data
+                            rpv_outlier_rows = describe_rows(rpv_variant_revenue, "outlier")
+                            if rpv_outlier_rows != '':
+                                st.info(
+                                    f'Your revenue data contains unusually large orders{rpv_outlier_rows}. They increase the variance of the revenue per visitor.'
+                                    , icon = '💡')
 
                 with col2:
                     rpv_variant_visitors = st.number_input(
@@ -462,6 +498,7 @@ def main():
                 ## SRM check of input data
                 if rpv_control_visitors != None and rpv_variant_visitors != None:
                     rpv_sample_sizes = [rpv_control_visitors, rpv_variant_visitors]
+                    from scipy.stats import chisquare
                     rpv_SRM_result = chisquare(
                         rpv_sample_sizes
                         , f_exp = None
@@ -471,7 +508,7 @@ def main():
                 
             # Output                    
             with st.container():
-                if rpv_variant_revenue != None and rpv_variant_visitors != None:
+                if rpv_num_orders_variant != None and rpv_variant_visitors != None:
                     if rpv_num_orders_variant > rpv_variant_visitors:
                         st.error(
                             "You shouldn't have more conversions than visitors."
@@ -482,18 +519,28 @@ def main():
                         rpv_cr_variant = rpv_num_orders_variant / rpv_variant_visitors
                         rpv_cr_variant_perc = rpv_cr_variant * 100
 
-                        rpv_null_order_variant = rpv_variant_visitors - rpv_num_orders_variant
-                        rpv_variant_full = pd.concat([rpv_variant_revenue_df.squeeze(), pd.Series([0] * rpv_null_order_variant)]).reset_index(drop=True)
-
-                        rpv_variant = rpv_variant_full.mean(skipna = False)
+                        # Visitors without an order are accounted for in the sufficient statistics instead of adding one 0 per visitor
+                        rpv_variant, rpv_var_variant = rpv_stats(rpv_variant_visitors, rpv_variant_summary.revenue_sum, rpv_variant_summary.revenue_sum_sq, rpv_num_orders_variant)
+                        if rpv_cap is not None:
+                            rpv_variant_capped = winsorise(load_revenue_sketch(rpv_variant_revenue), rpv_cap)
+                            rpv_variant_capped_mean, rpv_var_variant_capped = rpv_stats(rpv_variant_visitors, rpv_variant_capped.revenue_sum, rpv_variant_capped.revenue_sum_sq, rpv_num_orders_variant)
+                            st.info(
+                                f'{rpv_variant_capped.num_capped} orders of variant {i} are capped at {round(rpv_cap, 2)} €. This removes {round((1 - rpv_var_variant_capped / rpv_var_variant) * 100, 1)} % of the variance of the revenue per visitor.'
+                                , icon = '✂️')
+                            rpv_variant, rpv_var_variant = rpv_variant_capped_mean, rpv_var_variant_capped
 
                         col1, col2, col3 = st.columns(3)            
                         with col1:
-                            st.data_editor(
-                                data = rpv_variant_revenue_df
-                                , key = f"rpv_data_variant_{i+1}"
-                                , disabled = True
-                            )
+                            # Large files are only summarised in chunks and not loaded for the preview
+                            if rpv_variant_revenue.size <= PARSE_MAX_BYTES:
+                                with span('render data_editor variant revenue'):
+                                    st.data_editor(
+                                        data = load_revenue_csv(rpv_variant_revenue)[0]
+                                        , key = f"rpv_data_variant_{i+1}"
+                                        , disabled = True
+                                    )
+                            else:
+                                st.caption('The preview is not shown for large files.')
                         with col2:
                             st.metric(
                                 f'''Variant {i} conversion rate'''
@@ -507,18 +554,20 @@ def main():
                 
             # Result Output
             with st.container():
-                if rpv_control_visitors != None and rpv_control_revenue != None and rpv_variant_visitors != None and rpv_variant_revenue != None:
+                if rpv_control != None and rpv_variant != None:
                     rpv_diff = rpv_variant - rpv_control
                     rpv_change = rpv_diff / rpv_control * 100
 
                     #Statistical hypothesis test
-                    tstat, pvalue, degf = ttest_ind(
-                        rpv_control_full
-                        , rpv_variant_full
+                    tstat, pvalue, degf = ttest_ind_from_stats(
+                        rpv_control
+                        , rpv_var_control
+                        , rpv_control_visitors
+                        , rpv_variant
+                        , rpv_var_variant
+                        , rpv_variant_visitors
                         , alternative = hypo_type
                         , usevar = 'pooled'
-                        , weights = (None, None)
-                        , value = 0
                     )
                     col1, col2, col3 = st.columns(3) 
                     # Output
@@ -542,6 +591,246 @@ def main():
                     else:
                         st.success(f"""With a p-value of {round(pvalue, 3)} your result is statistically significant.""")
 
+                    # Bootstrap
+                    if st.toggle(
+                        'Bootstrap confidence interval'
+                        , help = f'''Revenue data is usually skewed by a few large orders. The bootstrap resamples your visitors {BOOTSTRAP_RESAMPLES:,} times (or as often as you choose) and does not assume normally distributed means.  
+                        The confidence level is 1 - \u03B1 with Bonferroni correction.'''
+                        ):
+                        # A few resamples are timed first, the runtime grows with the number of different order values
+                        bootstrap_seconds = load_bootstrap_estimate(
+                            rpv_control_revenue
+                            , rpv_control_visitors
+                            , rpv_variant_revenue
+                            , rpv_variant_visitors
+                            , cap = rpv_cap
+                            )
+                        bootstrap_resamples = st.selectbox(
+                            'Number of resamples'
+                            , BOOTSTRAP_RESAMPLE_OPTIONS
+                            , index = BOOTSTRAP_RESAMPLE_OPTIONS.index(BOOTSTRAP_RESAMPLES)
+                            , format_func = lambda num_resamples: f"{num_resamples:,} (about {max(1, round(bootstrap_seconds[num_resamples])):,} s)"
+                            , help = 'More resamples give a more stable interval and p-value, but take longer. The time is estimated from a few resamples of your data.'
+                            )
+                        with st.spinner(f'Resampling your revenue data, this takes about {max(1, round(bootstrap_seconds[bootstrap_resamples])):,} s...'):
+                            bootstrap = load_bootstrap_rpv(
+                                rpv_control_revenue
+                                , rpv_control_visitors
+                                , rpv_variant_revenue
+                                , rpv_variant_visitors
+                                , confidence = 1 - alpha/num_of_variants
+                                , alternative = hypo_type
+                                , cap = rpv_cap
+                                , num_resamples = bootstrap_resamples
+                                )
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.metric(
+                                f"{round((1 - alpha/num_of_variants) * 100, 2)} % confidence interval of the difference"
+                                , value = f"{round(bootstrap.ci_low, 2)} € to {round(bootstrap.ci_high, 2)} €"
+                                )
+                        with col2:
+                            st.metric(
+                                "Bootstrap p-value"
+                                , value = f"{round(bootstrap.pvalue, 3)}"
+                                )
+                        st.caption(f"{bootstrap.num_resamples:,} resamples in {round(bootstrap.seconds, 1)} s on {bootstrap.num_workers} process(es).")
+
+# Bayesian analysis
+    with st.container():
+        st.header("Bayesian analysis")
+        st.caption('''Instead of a p-value, the Bayesian analysis tells you how likely it is that each variant is the best one, and how much conversion rate or revenue per visitor you can expect to lose if you pick it and it is not.''')
+
+        if st.toggle('Show the probability to be best'):
+            import pandas as pd
+            st.subheader("Please input your data:")
+            bayes_metric = st.radio(
+                'Metric'
+                , ['conversion_rate', 'revenue_per_visitor']
+                , format_func = {'conversion_rate' : 'Conversion rate', 'revenue_per_visitor' : 'Revenue per visitor'}.get
+                , horizontal = True
+                , help = '''The conversion rate uses a Beta-Binomial model.  
+                The revenue per visitor is modelled as conversion rate times average order value, with a log-normal average order value.'''
+                )
+            bayes_columns = ['visitors', 'conversions'] + (['revenue_sum', 'revenue_sum_sq'] if bayes_metric == 'revenue_per_visitor' else [])
+            with span('render data_editor Bayesian'):
+                bayes_data = st.data_editor(
+                    data = pd.DataFrame(
+                        {'variant' : ['Control'] + [f'Variant {i}' for i in range(1, num_of_variants + 1)]}
+                        | {col : [None] * (num_of_variants + 1) for col in bayes_columns}
+                        ).astype({col : 'float' for col in bayes_columns})
+                    , key = f'bayes_data_{bayes_metric}'
+                    , hide_index = True
+                    , column_config = {
+                        'variant' : st.column_config.TextColumn(label = "Variant", disabled = True)
+                        , 'visitors' : st.column_config.NumberColumn(label = "Visitors", required = True, min_value = 0, step = 1)
+                        , 'conversions' : st.column_config.NumberColumn(label = "Orders" if bayes_metric == 'revenue_per_visitor' else "Conversions", required = True, min_value = 0, step = 1)
+                        , 'revenue_sum' : st.column_config.NumberColumn(label = "Revenue", required = True, min_value = 0.0, help = 'Sum of the revenue of all orders')
+                        , 'revenue_sum_sq' : st.column_config.NumberColumn(label = "Revenue squared", required = True, min_value = 0.0, help = 'Sum of the squared revenue per order')
+                        }
+                    )
+            if bayes_data[bayes_columns].notna().all().all():
+                try:
+                    bayes_result = bayes_test(bayes_data, metric = bayes_metric)
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    bayes_best = bayes_result.loc[bayes_result['prob_best'].idxmax()]
+                    bayes_unit = 'PP' if bayes_metric == 'conversion_rate' else '€'
+                    bayes_scale = 100 if bayes_metric == 'conversion_rate' else 1
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.metric(
+                            f"Probability that {bayes_best['variant']} is the best"
+                            , value = f"{round(bayes_best['prob_best'] * 100, 1)} %"
+                            )
+                    with col2:
+                        st.metric(
+                            f"Expected loss when choosing {bayes_best['variant']}"
+                            , value = f"{round(bayes_best['expected_loss'] * bayes_scale, 4)} {bayes_unit}"
+                            , help = 'How much worse than the actually best variant your choice is on average.'
+                            )
+                    st.dataframe(
+                        data = bayes_result
+                        , hide_index = 1
+                        , column_order = ('variant', 'mean', 'prob_best', 'expected_loss', 'prob_beat_control', 'uplift_perc', 'uplift_ci_low', 'uplift_ci_high')
+                        , column_config = {
+                            'variant' : 'Variant',
+                            'mean' : st.column_config.NumberColumn('Posterior mean', format = "%.4f"),
+                            'prob_best' : st.column_config.NumberColumn('Probability to be best', format = "%.3f"),
+                            'expected_loss' : st.column_config.NumberColumn('Expected loss', format = "%.5f"),
+                            'prob_beat_control' : st.column_config.NumberColumn('Probability to beat control', format = "%.3f"),
+                            'uplift_perc' : st.column_config.NumberColumn('Uplift', format = "%.2f %%"),
+                            'uplift_ci_low' : st.column_config.NumberColumn('Uplift 2.5 %', format = "%.2f %%"),
+                            'uplift_ci_high' : st.column_config.NumberColumn('Uplift 97.5 %', format = "%.2f %%"),
+                            })
+                    st.caption('The uplift is relative to the control, with its 95 % credible interval.')
+
+# Variance reduction
+    with st.container():
+        st.header("Variance reduction (CUPED)")
+        st.caption('''If you know how your visitors behaved before the experiment, this calculator can remove the part of the variance that their earlier behaviour explains. The difference stays unbiased, but its p-value gets smaller, so you need fewer visitors to detect the same effect.''')
+
+        if st.toggle('I have visitor level data from before the experiment'):
+            st.markdown(
+                """
+                Upload one csv file with one row per visitor of the experiment and a header row. It needs a column with the variant, a column with the metric during the experiment (revenue, or 1 / 0 for a conversion) and a column with the same metric before the experiment (e.g. the revenue in the 4 weeks before).  
+                Empty values count as 0. The first variant in the file is used as control.
+                """
+            )
+            cuped_file = st.file_uploader(
+                label = "Visitor level data"
+                , key = "cuped_file"
+                , type = ['csv']
+                , help = '''Large files are read in chunks, only the sums per variant are kept.'''
+                )
+            if cuped_file is not None:
+                cuped_columns = read_csv_columns(cuped_file)
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    cuped_variant = st.selectbox('Variant column', cuped_columns, index = 0)
+                with col2:
+                    cuped_metric = st.selectbox('Metric column', cuped_columns, index = min(1, len(cuped_columns) - 1))
+                with col3:
+                    cuped_covariate = st.selectbox('Pre-experiment column', cuped_columns, index = min(2, len(cuped_columns) - 1))
+                try:
+                    if len({cuped_variant, cuped_metric, cuped_covariate}) < 3:
+                        raise ValueError("Please choose three different columns.")
+                    cuped_result = cuped_test(
+                        load_cuped_stats(cuped_file, cuped_metric, cuped_covariate, cuped_variant)
+                        , alpha = alpha
+                        , alternative = hypo_type
+                        )
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    st.metric(
+                        "Variance reduction"
+                        , value = f"{round(cuped_result['variance_reduction_perc'].iloc[0], 1)} %"
+                        , help = 'Share of the variance of the metric that is explained by the pre-experiment data.'
+                        )
+                    st.dataframe(
+                        data = cuped_result
+                        , hide_index = 1
+                        , column_order = ('variant', 'visitors', 'mean_control', 'mean', 'diff', 'diff_cuped', 'pvalue', 'pvalue_cuped', 'significant')
+                        , column_config = {
+                            'mean_control' : st.column_config.NumberColumn('Mean control', format = "%.4f"),
+                            'mean' : st.column_config.NumberColumn('Mean variant', format = "%.4f"),
+                            'diff' : st.column_config.NumberColumn('Difference', format = "%.4f"),
+                            'diff_cuped' : st.column_config.NumberColumn('Difference (CUPED)', format = "%.4f"),
+                            'pvalue' : st.column_config.NumberColumn('p-value', format = "%.3f"),
+                            'pvalue_cuped' : st.column_config.NumberColumn('p-value (CUPED)', format = "%.3f"),
+                            })
+                    st.caption('The variants are significant after Bonferroni correction of the CUPED p-values.')
+
+# Continuous monitoring
+    with st.container():
+        st.header("Continuous monitoring (Conversion rate)")
+        st.caption('''The p-values above are only valid at your pre-calculated sample size. If you check your results every day and stop as soon as they are significant, you will see far more false positives than \u03B1.  
+        The sequential test (mSPRT) gives an always-valid p-value, that you can check after every day without increasing the false positive rate.''')
+
+        if st.toggle('I check my results while the experiment is running'):
+            import pandas as pd
+            st.subheader("Please input your data:")
+            expected_diff = st.number_input(
+                'Expected difference (percentage points)'
+                , value = MSPRT_TAU * 100
+                , min_value = 0.01
+                , max_value = 100.0
+                , step = 0.1
+                , help = '''The size of the difference in conversion rates you expect. The test is most sensitive for differences of this size.  
+                Set it before the experiment starts and do not change it afterwards.'''
+                )
+            with span('render data_editor monitoring'):
+                daily_data = st.data_editor(
+                    data = pd.DataFrame(columns = ['visitors_control', 'conversions_control', 'visitors_variant', 'conversions_variant'], dtype = 'float')
+                    , num_rows = 'dynamic'
+                    , column_config = {
+                        'visitors_control' : st.column_config.NumberColumn(label = "Visitors control", required = True, min_value = 0, step = 1)
+                        , 'conversions_control' : st.column_config.NumberColumn(label = "Conversions control", required = True, min_value = 0, step = 1)
+                        , 'visitors_variant' : st.column_config.NumberColumn(label = "Visitors variant", required = True, min_value = 0, step = 1)
+                        , 'conversions_variant' : st.column_config.NumberColumn(label = "Conversions variant", required = True, min_value = 0, step = 1)
+                        }
+                    )
+            st.caption('Add one row per day with the new visitors and conversions of that day.')
+
+            daily_data = daily_data.dropna()
+            if len(daily_data) > 0:
+                # Every day updates the running state of the test, the earlier days are not recalculated
+                sequential_state = sequential_start()
+                sequential_pvalues = []
+                try:
+                    for day in daily_data.itertuples(index = False):
+                        sequential_state = msprt_update(sequential_state, *day, tau = expected_diff / 100)
+                        sequential_pvalues.append(float(sequential_state.pvalue))
+                except ValueError as error:
+                    st.error(f"{error}", icon = '🚨')
+                else:
+                    if sequential_state.visitors1 == 0 or sequential_state.visitors2 == 0:
+                        st.warning('⚠️ You need visitors in the control and the variant.')
+                    else:
+                        seq_diff, seq_ci_low, seq_ci_high = msprt_confidence_interval(sequential_state, alpha, tau = expected_diff / 100)
+                        st.line_chart(pd.DataFrame({'Always-valid p-value' : sequential_pvalues}, index = pd.RangeIndex(1, len(sequential_pvalues) + 1, name = 'Day')))
+                        col1, col2, col3 = st.columns(3)
+                        with col1:
+                            st.metric(
+                                "Difference"
+                                , value = f"{round(seq_diff * 100, 2)} PP"
+                                )
+                        with col2:
+                            st.metric(
+                                f"{round((1 - alpha) * 100, 2)} % confidence interval"
+                                , value = f"{round(seq_ci_low * 100, 2)} to {round(seq_ci_high * 100, 2)} PP"
+                                )
+                        with col3:
+                            st.metric(
+                                "Always-valid p-value"
+                                , value = f"{round(sequential_state.pvalue, 3)}"
+                                )
+                        if sequential_state.pvalue > alpha:
+                            st.warning(f"""With an always-valid p-value of {round(sequential_state.pvalue, 3)} your result is not statistically significant yet. You can keep collecting data.""")
+                        else:
+                            st.success(f"""With an always-valid p-value of {round(sequential_state.pvalue, 3)} your result is statistically significant. You can stop your experiment.""")
+
 if __name__ == '__main__':
-    main()
-    footer()
\ No newline at end of file
+    run_page('Statistical significance', main)
\ No newline at end of file
@@ -1,11 +1,10 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
+from modules.functions import run_page
 
 def main():
     Navbar()
 
 
 if __name__ == '__main__':
-    main()
-    footer()
\ No newline at end of file
+    run_page('FAQ', main)
\ No newline at end of file
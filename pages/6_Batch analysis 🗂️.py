@@ -0,0 +1,162 @@
+import streamlit as st
+from modules.functions import Navbar
+from modules.functions import run_page
+from modules.timing_functions import span
+from modules.correction_functions import CORRECTION_METHODS
+
+st.set_page_config(
+    page_title="CRO Calculators"
+    , page_icon="pictures\Favicon.png"
+    , layout="centered"
+    , initial_sidebar_state="auto"
+    , menu_items=None
+    )
+# hide burger menu
+hide_menu_style = """
+        <style>
+        #MainMenu {visibility: hidden;}
+        </style>
+        """
+st.markdown(hide_menu_style, unsafe_allow_html=True)
+
+def main():
+    Navbar()
+
+    st.title("Batch analysis")
+    st.caption(
+        '''Use this calculator to analyse many experiments at once.  
+        Every variant is compared with the control of its experiment (z-test for the conversion rate and, if you provide revenue data, t-test for the revenue per visitor). For experiments with multiple variants the p-values are corrected for multiple comparisons. Every experiment is also checked for a sample ratio mismatch (SRM).'''
+        )
+
+    # Statistical parameter
+    with st.container():
+        st.header('Statistical parameter')
+
+        col1, col2 = st.columns(2, gap="small", vertical_alignment="bottom")
+
+        with col1:
+            alpha = st.number_input(
+                'Statistical significance level'
+                , value = 0.05
+                , min_value = 0.05
+                , max_value = 1.00
+                , step = 0.05
+                , help = '\u03B1: The probability of rejecting a null hypothesis, given that it is true.'
+                )
+            if alpha >= 0.1:
+                st.warning('⚠️ This statistical significance level is considered high!')
+
+        with col2:
+            test_type = st.radio(
+                "Hypothesis type"
+                , ["Two-sided", "One-sided"]
+                , help = '''Use one-sided when you want to detect an effect in a specific direction (increase or decrease).  
+                Use two-sided when you want to detect an effect in either direction. ''')
+            if test_type == 'One-sided':
+                test_type = st.radio(
+                    "Hypothesis direction"
+                    , ["Larger", "Smaller"]
+                    , help = '''Choose "Larger" when you want to detect an uplift in the conversion rate.  
+                    Choose "Smaller" when you want to detect a downlift in the conversion rate.''')
+            hypo_type = test_type.lower()
+
+        col3, col4 = st.columns(2, gap="small", vertical_alignment="bottom")
+
+        with col3:
+            correction_method = st.selectbox(
+                'Multiple comparison correction'
+                , list(CORRECTION_METHODS)
+                , format_func = CORRECTION_METHODS.get
+                , help = '''Bonferroni, Holm, Hochberg and Šidák control the probability of any false positive. Holm and Hochberg are more powerful than Bonferroni.  
+                Benjamini-Hochberg controls the share of false positives among the significant variants.'''
+                )
+        with col4:
+            family = st.radio(
+                'Correct'
+                , ['experiment', 'all']
+                , format_func = {'experiment' : 'per experiment', 'all' : 'over all experiments'}.get
+                , help = 'Correct the variants of every experiment on their own, or all variants of all experiments as one portfolio.'
+                )
+
+    # Input
+    with st.container():
+        st.header('Please input your data:')
+        st.markdown(
+            """
+            Upload one csv file with one row per experiment and variant and the columns `experiment`, `variant`, `visitors` and `conversions`.  
+            The first row of every experiment is used as control.  
+            Optional columns: `revenue_sum` and `revenue_sum_sq` (sum of the revenue and sum of the squared revenue per order) for the revenue per visitor, `expected_share` for an unequal traffic split.
+            """
+        )
+        batch_file = st.file_uploader(
+            label = "Experiment data"
+            , type = ['csv']
+            , help = '''Upload the aggregated results of your experiments as a csv file.'''
+            )
+
+    # Output
+    if batch_file is not None:
+        from modules.data_functions import load_batch_analysis
+        try:
+            result = load_batch_analysis(
+                batch_file
+                , alpha = alpha
+                , alternative = hypo_type
+                , correction_method = correction_method
+                , family = family
+                )
+        except ValueError as error:
+            st.error(
+                f"{error}"
+                , icon = '🚨')
+        else:
+            with st.container():
+                st.subheader('Your result:')
+
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric(
+                        "Experiments"
+                        , value = result['experiment'].nunique()
+                        )
+                with col2:
+                    st.metric(
+                        "Significant variants"
+                        , value = int(result['cr_significant'].sum())
+                        , help = f"Conversion rate, after {CORRECTION_METHODS[correction_method]} correction {'per experiment' if family == 'experiment' else 'over all experiments'}"
+                        )
+                with col3:
+                    st.metric(
+                        "Experiments with SRM"
+                        , value = result.loc[result['srm_detected'], 'experiment'].nunique()
+                        )
+
+                if result['srm_detected'].any():
+                    st.warning(f"""A possible SRM (p-value smaller than 0.1) is detected in {result.loc[result['srm_detected'], 'experiment'].nunique()} experiment(s). Please check your data collection process before analysing their results.""")
+
+                with span('render results table'):
+                    st.dataframe(
+                        data = result
+                        , hide_index = 1
+                        , column_config = {
+                            'cr_control' : st.column_config.NumberColumn('CR control', format = "%.4f"),
+                            'cr' : st.column_config.NumberColumn('CR', format = "%.4f"),
+                            'cr_change_perc' : st.column_config.NumberColumn('Change CR', format = "%.2f %%"),
+                            'cr_pvalue' : st.column_config.NumberColumn('p-value CR', format = "%.3f"),
+                            'cr_pvalue_adjusted' : st.column_config.NumberColumn('Adjusted p-value CR', format = "%.3f"),
+                            'posthoc_power' : st.column_config.NumberColumn('Post-hoc power', format = "%.2f"),
+                            'srm_pvalue' : st.column_config.NumberColumn('p-value SRM', format = "%.3f"),
+                            'rpv_change_perc' : st.column_config.NumberColumn('Change RPV', format = "%.2f %%"),
+                            'rpv_pvalue' : st.column_config.NumberColumn('p-value RPV', format = "%.3f"),
+                            'rpv_pvalue_adjusted' : st.column_config.NumberColumn('Adjusted p-value RPV', format = "%.3f"),
+                            })
+
+                st.download_button(
+                    "Download results"
+                    , data = result.to_csv(index = False)
+                    , file_name = 'batch_analysis.csv'
+                    , mime = 'text/csv'
+                    )
+
+if __name__ == '__main__':
+    run_page('Batch analysis', main)
@@ -0,0 +1,5 @@
+"""
+Headless command-line interface of the CRO calculators.
+
+Run it from the repository root with `python -m pivotpoint --help`.
+"""
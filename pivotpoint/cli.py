@@ -0,0 +1,421 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+import pandas as pd
+from modules.ratio_functions import RATIO_COLUMNS
+from modules.sequential_functions import MSPRT_TAU
+from modules.srm_functions import SRM_METHODS
+from modules.srm_functions import SRM_THRESHOLD
+from modules.correction_functions import CORRECTION_METHODS
+from modules.correction_functions import correct_alpha
+from modules.stat_functions import mde_curve
+from modules.stat_functions import runtime_curve
+from modules.stat_functions import rpv_stats
+from modules.stat_functions import stream_revenue_csv
+from modules.stat_functions import summarise_revenue
+from modules.stat_functions import validate_revenue
+from modules.timing_functions import finish_run
+from modules.timing_functions import start_run
+from modules.timing_functions import timing_configured
+
+## Command-line interface
+### Runs the calculators of the Streamlit pages on the functions in modules/, without importing Streamlit,
+### htbuilder or matplotlib. Input files can be csv or Parquet, '-' reads from stdin. Results are written as json or csv.
+
+def read_table(path, input_format = None):
+    """
+    Read a csv or Parquet table from disk or stdin.
+
+    Parameters:
+    path (str): File path, or '-' for stdin
+    input_format (str or None): 'csv' or 'parquet'. None uses the file extension, stdin defaults to csv (default: None)
+
+    Returns:
+    pd.DataFrame: The table
+    """
+    if input_format is None:
+        input_format = 'parquet' if path.endswith('.parquet') else 'csv'
+    source = sys.stdin.buffer if path == '-' else path
+    if input_format == 'parquet':
+        return pd.read_parquet(source)
+
+    return pd.read_csv(source)
+
+def write_result(result, output_format = 'json', output = '-'):
+    """
+    Write a result as json or csv to a file or stdout.
+
+    Parameters:
+    result (pd.DataFrame or dict): The result
+    output_format (str): 'json' or 'csv' (default: 'json')
+    output (str): File path, or '-' for stdout (default: '-')
+    """
+    if isinstance(result, dict):
+        result = pd.DataFrame([result])
+    if output_format == 'csv':
+        text = result.to_csv(index = False)
+    else:
+        text = json.dumps(json.loads(result.to_json(orient = 'records')), indent = 2) + '\n'
+
+    if output == '-':
+        sys.stdout.write(text)
+    else:
+        with open(output, 'w', encoding = 'utf-8') as file:
+            file.write(text)
+
+def summarise_revenue_file(path, input_format = None):
+    # csv files are streamed in chunks, Parquet files are read column-wise
+    if input_format is None:
+        input_format = 'parquet' if path.endswith('.parquet') else 'csv'
+    if input_format == 'parquet':
+        return summarise_revenue(validate_revenue(read_table(path, input_format).iloc[:, 0], outlier_factor = None))
+
+    return stream_revenue_csv(sys.stdin.buffer if path == '-' else path)
+
+def cap_revenue_file(path, percentile, input_format = None):
+    # The sketch needs a second pass over the file, which stdin does not allow
+    from modules.winsor_functions import revenue_sketch
+    from modules.winsor_functions import sketch_quantile
+    from modules.winsor_functions import stream_revenue_sketch
+    from modules.winsor_functions import winsorise
+    if path == '-':
+        raise ValueError("--cap needs a revenue file, not stdin.")
+    if input_format == 'parquet' or (input_format is None and path.endswith('.parquet')):
+        sketch = revenue_sketch(validate_revenue(read_table(path, 'parquet').iloc[:, 0], outlier_factor = None).values)
+    else:
+        sketch = stream_revenue_sketch(path)
+
+    return winsorise(sketch, sketch_quantile(sketch, percentile))
+
+def ratio_stats_file(path, numerator, denominator, variant = None, input_format = None):
+    # csv files are streamed in chunks, Parquet files are read column-wise
+    from modules.ratio_functions import ratio_sufficient_stats
+    from modules.ratio_functions import stream_ratio_csv
+    if input_format == 'parquet' or (input_format is None and path.endswith('.parquet')):
+        return ratio_sufficient_stats(read_table(path, 'parquet'), numerator, denominator, variant)
+
+    return stream_ratio_csv(sys.stdin.buffer if path == '-' else path, numerator, denominator, variant)
+
+def mde_or_runtime(args, baseline, std_dev = None, alpha = 0.05):
+    # With --target the runtime per target MDE is solved for, otherwise the MDE per week of runtime
+    if args.target is not None:
+        result = runtime_curve(args.visitors / 7, np.asarray(args.target) / 100, baseline, std_dev = std_dev, num_variants = args.variants, alpha = alpha, power = args.power, test_type = args.test_type)
+        result['Runtime'] = np.ceil(result['Runtime']).astype(np.int64)
+        return result.rename(columns = {'Runtime' : 'Runtime_days'})
+
+    return mde_curve(args.visitors, np.arange(1, args.weeks + 1), baseline, std_dev = std_dev, num_variants = args.variants, alpha = alpha, power = args.power, test_type = args.test_type)
+
+def run_mde(args):
+    alpha = float(correct_alpha(args.alpha, args.variants, args.correction))
+    results = []
+
+    if args.conversions is not None:
+        if args.conversions >= args.visitors:
+            raise ValueError("You need fewer conversions than visitors.")
+        cr = args.conversions / args.visitors
+        result = mde_or_runtime(args, cr, alpha = alpha)
+        result.insert(0, 'metric', 'conversion_rate')
+        results.append(result)
+
+    if args.revenue is not None:
+        summary = summarise_revenue_file(args.revenue, args.input_format)
+        if summary.num_non_numeric > 0:
+            raise ValueError("The revenue data contains non-numeric values.")
+        if summary.num_non_positive > 0:
+            raise ValueError("The revenue data contains orders with 0 revenue or less.")
+        visitors_in_data = args.visitors * args.data_weeks
+        if summary.num_orders >= visitors_in_data:
+            raise ValueError("You need fewer orders than visitors.")
+        if args.cap is not None:
+            summary = cap_revenue_file(args.revenue, args.cap, args.input_format)
+        rpv_mean, rpv_var = rpv_stats(visitors_in_data, summary.revenue_sum, summary.revenue_sum_sq, summary.num_orders)
+        result = mde_or_runtime(args, rpv_mean, std_dev = np.sqrt(rpv_var), alpha = alpha)
+        result.insert(0, 'metric', 'revenue_per_visitor')
+        results.append(result)
+
+    if args.ratio is not None:
+        from modules.ratio_functions import ratio_moments
+        if args.numerator is None or args.denominator is None:
+            raise ValueError("--ratio needs --numerator and --denominator.")
+        stats = ratio_stats_file(args.ratio, args.numerator, args.denominator, input_format = args.input_format)
+        if stats['users'].iloc[0] < 2:
+            raise ValueError("The ratio data needs at least 2 users.")
+        if stats['denominator_sum'].iloc[0] <= 0:
+            raise ValueError("The denominator has to sum up to more than 0.")
+        ratio, ratio_var = ratio_moments(stats)
+        # --visitors counts users here, the delta method gives the standard deviation of the ratio per user
+        result = mde_or_runtime(args, ratio[0], std_dev = np.sqrt(ratio_var[0]), alpha = alpha)
+        result.insert(0, 'metric', 'ratio')
+        results.append(result)
+
+    if not results:
+        raise ValueError("Provide --conversions, --revenue and/or --ratio.")
+
+    return pd.concat(results, ignore_index = True)
+
+def run_srm(args):
+    from modules.srm_functions import srm_test
+    test_result = srm_test(args.counts, expected_share = args.expected, method = args.method, threshold = SRM_THRESHOLD)
+
+    return {
+        'statistic' : test_result.statistic
+        , 'pvalue' : test_result.pvalue
+        , 'method' : test_result.method
+        , 'num_simulations' : test_result.num_simulations
+        , 'srm_detected' : test_result.pvalue < SRM_THRESHOLD
+        }
+
+def assignments_file(path, input_format = None):
+    # csv files are streamed in chunks and aggregated into the combinations of variants, Parquet files are read column-wise
+    from modules.interaction_functions import stream_assignments_csv
+    if input_format == 'parquet' or (input_format is None and path.endswith('.parquet')):
+        return read_table(path, 'parquet')
+
+    return stream_assignments_csv(sys.stdin.buffer if path == '-' else path)
+
+def run_srm_monitor(args):
+    from modules.srm_functions import monitor_srm
+    if args.input_format == 'parquet' or args.input.endswith('.parquet'):
+        source = read_table(args.input, 'parquet')
+    else:
+        source = sys.stdin.buffer if args.input == '-' else args.input
+    state = read_table(args.state, 'csv') if os.path.exists(args.state) else None
+    result = monitor_srm(source, state, threshold = SRM_THRESHOLD)
+    result.to_csv(args.state, index = False)
+
+    return result
+
+def run_interaction(args):
+    if args.assignments is not None:
+        from modules.interaction_functions import detect_interactions
+        from modules.interaction_functions import detect_metric_interactions
+        assignments = assignments_file(args.assignments, args.input_format)
+        if args.metrics:
+            return detect_metric_interactions(assignments, control = args.control, alpha = SRM_THRESHOLD, correction_method = args.correction)
+        return detect_interactions(assignments, order = args.order, alpha = SRM_THRESHOLD, correction_method = args.correction)
+    if args.table is None:
+        raise ValueError("Provide --table or --assignments.")
+
+    from scipy.stats import chi2_contingency
+    table = np.asarray(args.table, dtype = np.float64).reshape(2, 2)
+    stat, pvalue, dof, exp_freq = chi2_contingency(table)
+
+    return {
+        'statistic' : float(stat)
+        , 'pvalue' : float(pvalue)
+        , 'dof' : int(dof)
+        , 'interaction_detected' : bool(pvalue < SRM_THRESHOLD)
+        }
+
+def run_significance(args):
+    from modules.batch_functions import analyse_experiments
+    df = read_table(args.input, args.input_format)
+
+    return analyse_experiments(df, alpha = args.alpha, alternative = args.alternative, srm_threshold = SRM_THRESHOLD, control = args.control, correction_method = args.correction, family = args.family)
+
+def run_bayes(args):
+    from modules.bayes_functions import bayes_test
+    df = read_table(args.input, args.input_format)
+    if 'experiment' not in df.columns:
+        return bayes_test(df, metric = args.metric, control = args.control, credible = args.credible)
+
+    return pd.concat(
+        [pd.concat([pd.Series(experiment, index = range(len(group)), name = 'experiment'), bayes_test(group, metric = args.metric, control = args.control, credible = args.credible)], axis = 1)
+        for experiment, group in df.groupby('experiment', sort = False)]
+        , ignore_index = True
+        )
+
+def run_cuped(args):
+    from modules.cuped_functions import cuped_sufficient_stats
+    from modules.cuped_functions import cuped_test
+    from modules.cuped_functions import stream_cuped_csv
+    # csv files are streamed in chunks, Parquet files are read column-wise
+    if args.input_format == 'parquet' or args.input.endswith('.parquet'):
+        stats = cuped_sufficient_stats(read_table(args.input, 'parquet'), args.metric, args.covariate, args.variant_column)
+    else:
+        stats = stream_cuped_csv(sys.stdin.buffer if args.input == '-' else args.input, args.metric, args.covariate, args.variant_column)
+
+    return cuped_test(stats, alpha = args.alpha, alternative = args.alternative, control = args.control, correction_method = args.correction)
+
+def run_ratio(args):
+    from modules.ratio_functions import ratio_test
+    if args.numerator is None and args.denominator is None:
+        # Sufficient statistics that were already summed up, e.g. in the database, optionally for many experiments
+        stats = read_table(args.input, args.input_format)
+        if 'experiment' in stats.columns:
+            return pd.concat(
+                [pd.concat([pd.Series(experiment, index = range(len(group) - 1), name = 'experiment'), ratio_test(group, alpha = args.alpha, alternative = args.alternative, control = args.control, correction_method = args.correction)], axis = 1)
+                for experiment, group in stats.groupby('experiment', sort = False)]
+                , ignore_index = True
+                )
+    elif args.numerator is None or args.denominator is None:
+        raise ValueError("Provide both --numerator and --denominator, or neither for a table of sufficient statistics.")
+    else:
+        stats = ratio_stats_file(args.input, args.numerator, args.denominator, args.variant_column, args.input_format)
+
+    return ratio_test(stats, alpha = args.alpha, alternative = args.alternative, control = args.control, correction_method = args.correction)
+
+def run_sequential(args):
+    from modules.sequential_functions import monitor_experiments
+    batch = read_table(args.input, args.input_format)
+    state = read_table(args.state, 'csv') if os.path.exists(args.state) else None
+    result = monitor_experiments(batch, state, alpha = args.alpha, tau = args.tau, control = args.control)
+    result.to_csv(args.state, index = False)
+
+    return result
+
+def run_store(args):
+    from modules.store_functions import analyse_store
+    from modules.store_functions import append_days
+    from modules.store_functions import open_store
+    from modules.store_functions import store_mde
+    connection = open_store(args.store)
+    try:
+        if args.action == 'append':
+            return {'stored_rows' : append_days(connection, read_table(args.input, args.input_format))}
+        if args.action == 'significance':
+            return analyse_store(connection, args.experiment, args.since, args.until, alpha = args.alpha, alternative = args.alternative, srm_threshold = SRM_THRESHOLD, correction_method = args.correction, family = args.family)
+        runtime = np.arange(1, args.weeks + 1)
+        return store_mde(connection, args.experiment, runtime, num_variants = args.variants, alpha = float(correct_alpha(args.alpha, args.variants, args.correction)), power = args.power, test_type = args.test_type, since = args.since, until = args.until)
+    finally:
+        connection.close()
+
+def add_correction_arguments(parser, family = False):
+    parser.add_argument('--correction', choices = CORRECTION_METHODS, default = 'bonferroni', help = 'Correction for multiple variants (default: bonferroni)')
+    if family:
+        parser.add_argument('--family', choices = ['experiment', 'all'], default = 'experiment', help = 'Correct the variants per experiment or all tests as one portfolio (default: experiment)')
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog = 'python -m pivotpoint'
+        , description = 'Headless CRO calculators: MDE, SRM, interaction, significance, sequential testing and a store of daily aggregates.'
+        )
+    parser.add_argument('--format', dest = 'output_format', choices = ['json', 'csv'], default = 'json', help = 'Output format (default: json)')
+    parser.add_argument('--output', default = '-', help = "Output file, '-' for stdout (default: -)")
+    parser.add_argument('--input-format', choices = ['csv', 'parquet'], default = None, help = 'Input format (default: from the file extension, csv for stdin)')
+    parser.add_argument('--timing', action = 'store_true', help = 'Write the time spent in every stage as one json line to stderr')
+    subparsers = parser.add_subparsers(dest = 'command', required = True)
+
+    mde = subparsers.add_parser('mde', help = 'Minimum detectable effect per week of runtime')
+    mde.add_argument('--visitors', type = float, required = True, help = 'Average weekly visitors across control and variants')
+    mde.add_argument('--conversions', type = float, default = None, help = 'Average weekly conversions')
+    mde.add_argument('--revenue', default = None, help = "csv or Parquet file with the revenue per order, '-' for stdin")
+    mde.add_argument('--ratio', default = None, help = "csv or Parquet file with one row per user and the numerator and denominator of a ratio metric, e.g. revenue and orders for the average order value. --visitors then counts users")
+    mde.add_argument('--numerator', default = None, help = 'With --ratio: column of the numerator, e.g. revenue')
+    mde.add_argument('--denominator', default = None, help = 'With --ratio: column of the denominator, e.g. orders')
+    mde.add_argument('--cap', type = float, default = None, help = 'Cap the revenue per order at this percentile, e.g. 99 (default: no capping)')
+    mde.add_argument('--data-weeks', type = float, default = 4, help = 'Number of weeks covered by the revenue file (default: 4)')
+    mde.add_argument('--weeks', type = int, default = 6, help = 'Maximum runtime in weeks (default: 6)')
+    mde.add_argument('--target', type = float, nargs = '+', default = None, help = 'Target MDEs in %% relative to the baseline. Reports the sample size and the runtime in days needed for each instead of the MDE per week')
+    mde.add_argument('--variants', type = int, default = 1, help = 'Number of variants besides the control (default: 1)')
+    mde.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    mde.add_argument('--power', type = float, default = 0.8, help = 'Statistical power (default: 0.8)')
+    mde.add_argument('--test-type', choices = ['Two-sided', 'One-sided'], default = 'Two-sided', help = 'Hypothesis type (default: Two-sided)')
+    add_correction_arguments(mde)
+    mde.set_defaults(func = run_mde)
+
+    srm = subparsers.add_parser('srm', help = 'Sample ratio mismatch check')
+    srm.add_argument('counts', type = int, nargs = '+', help = 'Visitors per sample')
+    srm.add_argument('--expected', type = float, nargs = '+', default = None, help = 'Expected frequency per sample, summing up to 1 (default: equal)')
+    srm.add_argument('--method', choices = SRM_METHODS, default = 'auto', help = 'auto uses the exact test when an expected count is below 5, else chi-square (default: auto)')
+    srm.set_defaults(func = run_srm)
+
+    srm_monitor = subparsers.add_parser('srm-monitor', help = 'Sequential SRM check over time buckets, e.g. hourly assignment counts')
+    srm_monitor.add_argument('input', help = "Table with bucket, experiment, variant, visitors (and optionally expected_share) in time order, '-' for stdin")
+    srm_monitor.add_argument('--state', required = True, help = 'csv file with the running state, created on the first run and overwritten on every run')
+    srm_monitor.set_defaults(func = run_srm_monitor)
+
+    interaction = subparsers.add_parser('interaction', help = 'Traffic interaction between two or many experiments (chi-square)')
+    interaction.add_argument('--table', type = int, nargs = 4, default = None, metavar = ('A1', 'B1', 'A2', 'B2'),
+                             help = 'Visitors in control (A) / variant (B) of experiment 1, for control (1) and variant (2) of experiment 2')
+    interaction.add_argument('--assignments', default = None, help = "Assignment table with one column per experiment, tests every pair of experiments, '-' for stdin")
+    interaction.add_argument('--order', type = int, default = 2, help = 'Experiments per test with --assignments, 2 for pairs (default: 2)')
+    interaction.add_argument('--metrics', action = 'store_true', help = 'With --assignments: test metric interactions (conversion rate, revenue per visitor) instead of traffic interactions')
+    interaction.add_argument('--control', default = None, help = 'With --metrics: name of the control variant in all experiments (default: first variant in sort order)')
+    interaction.add_argument('--correction', choices = CORRECTION_METHODS, default = 'holm', help = 'Multiple testing correction with --assignments (default: holm)')
+    interaction.set_defaults(func = run_interaction)
+
+    significance = subparsers.add_parser('significance', help = 'Hypothesis tests for one or many experiments')
+    significance.add_argument('input', help = "Table with experiment, variant, visitors, conversions (and optionally revenue_sum, revenue_sum_sq), '-' for stdin")
+    significance.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    significance.add_argument('--alternative', choices = ['two-sided', 'larger', 'smaller'], default = 'two-sided', help = 'Alternative hypothesis (default: two-sided)')
+    significance.add_argument('--control', default = None, help = 'Name of the control variant (default: first row of every experiment)')
+    add_correction_arguments(significance, family = True)
+    significance.set_defaults(func = run_significance)
+
+    bayes = subparsers.add_parser('bayes', help = 'Bayesian analysis: probability to be best and expected loss of every variant')
+    bayes.add_argument('input', help = "Table with variant, visitors, conversions (and revenue_sum, revenue_sum_sq for the revenue per visitor), optionally experiment, '-' for stdin")
+    bayes.add_argument('--metric', choices = ['conversion_rate', 'revenue_per_visitor'], default = 'conversion_rate', help = 'Metric to compare (default: conversion_rate)')
+    bayes.add_argument('--control', default = None, help = 'Name of the control variant (default: first row of every experiment)')
+    bayes.add_argument('--credible', type = float, default = 0.95, help = 'Probability of the credible intervals (default: 0.95)')
+    bayes.set_defaults(func = run_bayes)
+
+    cuped = subparsers.add_parser('cuped', help = 'Hypothesis test with variance reduction by a pre-experiment covariate (CUPED)')
+    cuped.add_argument('input', help = "Table with one row per visitor: variant, metric and pre-experiment covariate, '-' for stdin")
+    cuped.add_argument('--metric', required = True, help = 'Column of the metric, e.g. the revenue or 0/1 for a conversion')
+    cuped.add_argument('--covariate', required = True, help = 'Column of the same metric before the experiment')
+    cuped.add_argument('--variant-column', default = 'variant', help = 'Column of the variant (default: variant)')
+    cuped.add_argument('--control', default = None, help = 'Name of the control variant (default: first variant in the table)')
+    cuped.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    cuped.add_argument('--alternative', choices = ['two-sided', 'larger', 'smaller'], default = 'two-sided', help = 'Alternative hypothesis (default: two-sided)')
+    add_correction_arguments(cuped)
+    cuped.set_defaults(func = run_cuped)
+
+    ratio = subparsers.add_parser('ratio', help = 'Hypothesis test of a ratio metric (e.g. average order value) with the delta method')
+    ratio.add_argument('input', help = "Table with one row per user: variant, numerator and denominator, '-' for stdin. Without --numerator and --denominator: sufficient statistics per variant (and optionally experiment) with the columns " + ', '.join(RATIO_COLUMNS))
+    ratio.add_argument('--numerator', default = None, help = 'Column of the numerator, e.g. revenue')
+    ratio.add_argument('--denominator', default = None, help = 'Column of the denominator, e.g. orders')
+    ratio.add_argument('--variant-column', default = 'variant', help = 'Column of the variant (default: variant)')
+    ratio.add_argument('--control', default = None, help = 'Name of the control variant (default: first variant in the table)')
+    ratio.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    ratio.add_argument('--alternative', choices = ['two-sided', 'larger', 'smaller'], default = 'two-sided', help = 'Alternative hypothesis (default: two-sided)')
+    add_correction_arguments(ratio)
+    ratio.set_defaults(func = run_ratio)
+
+    sequential = subparsers.add_parser('sequential', help = 'Always-valid sequential test (mSPRT) of the conversion rate, updated with every new batch')
+    sequential.add_argument('input', help = "Table with the new data since the last update: experiment, variant, visitors, conversions, '-' for stdin")
+    sequential.add_argument('--state', required = True, help = 'csv file with the running state, created on the first update and overwritten on every update')
+    sequential.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    sequential.add_argument('--tau', type = float, default = MSPRT_TAU, help = f'Mixture standard deviation of the difference of the conversion rates, keep it fixed for an experiment (default: {MSPRT_TAU})')
+    sequential.add_argument('--control', default = None, help = 'Name of the control variant (default: first row of every experiment)')
+    sequential.set_defaults(func = run_sequential)
+
+    store = subparsers.add_parser('store', help = 'Daily aggregates of experiments in a SQLite file')
+    store.add_argument('store', help = 'SQLite file, created if it does not exist')
+    store_actions = store.add_subparsers(dest = 'action', required = True)
+    store_append = store_actions.add_parser('append', help = 'Append days, a day that is appended again replaces the stored one')
+    store_append.add_argument('input', help = "Table with experiment, variant, day, visitors, conversions (and optionally revenue_sum, revenue_sum_sq), '-' for stdin")
+    store_significance = store_actions.add_parser('significance', help = 'Hypothesis tests and SRM checks on the stored totals')
+    store_significance.add_argument('--experiment', nargs = '+', default = None, help = 'Experiments to analyse (default: all)')
+    store_significance.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    store_significance.add_argument('--alternative', choices = ['two-sided', 'larger', 'smaller'], default = 'two-sided', help = 'Alternative hypothesis (default: two-sided)')
+    store_mde = store_actions.add_parser('mde', help = 'Minimum detectable effect from the stored baseline of an experiment or pre-period')
+    store_mde.add_argument('experiment', help = 'Experiment (or pre-period) that gives the baseline')
+    store_mde.add_argument('--weeks', type = int, default = 6, help = 'Maximum runtime in weeks (default: 6)')
+    store_mde.add_argument('--variants', type = int, default = 1, help = 'Number of variants besides the control (default: 1)')
+    store_mde.add_argument('--alpha', type = float, default = 0.05, help = 'Significance level (default: 0.05)')
+    store_mde.add_argument('--power', type = float, default = 0.8, help = 'Statistical power (default: 0.8)')
+    store_mde.add_argument('--test-type', choices = ['Two-sided', 'One-sided'], default = 'Two-sided', help = 'Hypothesis type (default: Two-sided)')
+    add_correction_arguments(store_significance, family = True)
+    add_correction_arguments(store_mde)
+    for action in [store_significance, store_mde]:
+        action.add_argument('--since', default = None, help = 'First day to include, e.g. 2024-05-01 (default: all)')
+        action.add_argument('--until', default = None, help = 'Last day to include (default: all)')
+    store.set_defaults(func = run_store)
+
+    return parser
+
+def main(argv = None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    start_run(enabled = args.timing or timing_configured())
+    try:
+        result = args.func(args)
+    except ValueError as error:
+        parser.exit(2, f'error: {error}\n')
+    write_result(result, args.output_format, args.output)
+    record = finish_run(args.command)
+    if args.timing and record is not None:
+        print(json.dumps(record), file = sys.stderr)
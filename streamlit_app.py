@@ -1,6 +1,6 @@
 import streamlit as st
 from modules.functions import Navbar
-from modules.functions import footer
+from modules.functions import run_page
 
 # set tab title and Favicon
 st.set_page_config(
@@ -29,8 +29,8 @@ def main():
     st.page_link("pages/2_SRM ⚖️.py", label="Sample ratio mismatch (SRM) detector", icon="⚖️")
     st.page_link("pages/3_Interaction detector 🕵️‍♀️.py", label="Interaction detector", icon="🕵️‍♀️")
     st.page_link("pages/4_Statistical significance 🌟.py", label="Statistical hypothesis tester", icon="🌟")
+    st.page_link("pages/6_Batch analysis 🗂️.py", label="Batch analysis", icon="🗂️")
     st.page_link("https://www.conversion-stash.com/cro-glossary", label = "Conversion Stash CRO Glossary", icon = ":material/open_in_new:")
 
 if __name__ == '__main__':
-    main()
-    footer()
+    run_page('Home', main)
@@ -0,0 +1,44 @@
+"""
+The runtime estimate of the bootstrap with a fixed number of worker processes.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+from modules import bootstrap_functions
+from modules.bootstrap_functions import BOOTSTRAP_TASK_SIZE
+from modules.bootstrap_functions import estimate_bootstrap_seconds
+
+SECONDS_PER_RESAMPLE = 0.001
+
+@pytest.fixture
+def fixed_probe(monkeypatch):
+    # The timed resamples are replaced by a fixed time, so the estimates can be compared exactly
+    monkeypatch.setattr(bootstrap_functions, '_seconds_per_resample', lambda group1, group2: SECONDS_PER_RESAMPLE)
+
+def estimate(num_resamples, num_workers):
+    values = np.array([10.0, 25.5, 99.9])
+    counts = np.array([5, 3, 1])
+    return estimate_bootstrap_seconds(values, counts, 1000, values, counts, 1200, num_resamples = num_resamples, num_workers = num_workers)
+
+@pytest.mark.parametrize('num_resamples, num_workers, expected_workers', [
+    (2_000, 1, 1)
+    , (2_000, 4, 4)
+    , (2_000, 8, 4) # only 4 tasks of BOOTSTRAP_TASK_SIZE resamples
+    , (BOOTSTRAP_TASK_SIZE, 8, 1)
+    , (10_000, 8, 8)
+    ])
+def test_estimate_is_split_over_the_workers(fixed_probe, num_resamples, num_workers, expected_workers):
+    assert estimate(num_resamples, num_workers) == pytest.approx(SECONDS_PER_RESAMPLE * num_resamples / expected_workers)
+
+def test_estimate_of_many_options_matches_single_estimates(fixed_probe):
+    options = [1_000, 2_000, 5_000, 10_000]
+    expected = [estimate(num_resamples, 8) for num_resamples in options]
+
+    np.testing.assert_allclose(estimate(options, 8), expected)
+
+def test_estimate_uses_all_cpus_by_default(fixed_probe, monkeypatch):
+    monkeypatch.setattr(bootstrap_functions.os, 'cpu_count', lambda: 8)
+
+    assert estimate(2_000, None) == pytest.approx(estimate(2_000, 4))
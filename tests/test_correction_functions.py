@@ -0,0 +1,73 @@
+"""
+The vectorised multiple comparison corrections of correction_functions against statsmodels' multipletests.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+from modules.correction_functions import CORRECTION_METHODS
+from modules.correction_functions import adjust_pvalues
+
+statsmodels_multitest = pytest.importorskip('statsmodels.stats.multitest')
+
+STATSMODELS_METHODS = {'hochberg' : 'simes-hochberg'}
+
+def expected_pvalues(pvalues, method, groups = None):
+    # One multipletests call per family, NaN p-values are left out and stay NaN
+    pvalues = np.asarray(pvalues, dtype = np.float64)
+    groups = np.zeros(pvalues.size) if groups is None else np.asarray(groups)
+    expected = np.full(pvalues.size, np.nan)
+    for group in np.unique(groups):
+        family = (groups == group) & ~np.isnan(pvalues)
+        if family.any():
+            expected[family] = statsmodels_multitest.multipletests(pvalues[family], method = STATSMODELS_METHODS.get(method, method))[1]
+
+    return expected
+
+def random_pvalues(num_tests, seed = 0):
+    # Mostly large p-values, some tiny ones and ties, as in a real portfolio
+    rng = np.random.default_rng(seed)
+    pvalues = rng.uniform(0, 1, num_tests)
+    tiny = rng.random(num_tests) < 0.2
+    pvalues[tiny] = 10.0 ** -rng.uniform(3, 300, tiny.sum())
+    pvalues[rng.random(num_tests) < 0.1] = 0.05
+
+    return pvalues
+
+@pytest.mark.parametrize('method', CORRECTION_METHODS)
+def test_adjust_pvalues_matches_statsmodels(method):
+    pvalues = random_pvalues(500)
+
+    np.testing.assert_allclose(adjust_pvalues(pvalues, method), expected_pvalues(pvalues, method), rtol = 1e-12)
+
+@pytest.mark.parametrize('method', CORRECTION_METHODS)
+def test_adjust_pvalues_matches_statsmodels_per_family(method):
+    # Families of different sizes in mixed order, with tiny p-values next to large ones of other families
+    rng = np.random.default_rng(1)
+    pvalues = random_pvalues(200, seed = 2)
+    groups = rng.choice([f'experiment_{i}' for i in range(20)], pvalues.size, p = np.arange(1, 21) / np.arange(1, 21).sum())
+
+    np.testing.assert_allclose(adjust_pvalues(pvalues, method, groups), expected_pvalues(pvalues, method, groups), rtol = 1e-12)
+
+@pytest.mark.parametrize('method', CORRECTION_METHODS)
+def test_adjust_pvalues_keeps_nan_out_of_the_family(method):
+    pvalues = random_pvalues(60, seed = 3)
+    pvalues[::7] = np.nan
+    groups = np.arange(pvalues.size) % 4
+    adjusted = adjust_pvalues(pvalues, method, groups)
+
+    assert np.array_equal(np.isnan(adjusted), np.isnan(pvalues))
+    np.testing.assert_allclose(adjusted, expected_pvalues(pvalues, method, groups), rtol = 1e-12)
+
+@pytest.mark.parametrize('method', CORRECTION_METHODS)
+def test_adjust_pvalues_of_empty_and_all_nan_input(method):
+    assert adjust_pvalues([], method).shape == (0,)
+    assert adjust_pvalues([], method, groups = []).shape == (0,)
+    assert np.isnan(adjust_pvalues([np.nan, np.nan], method, groups = ['a', 'b'])).all()
+
+def test_adjust_pvalues_rejects_unknown_methods_and_groups():
+    with pytest.raises(ValueError):
+        adjust_pvalues([0.01, 0.02], method = 'fdr_by')
+    with pytest.raises(ValueError):
+        adjust_pvalues([0.01, 0.02], groups = ['a'])
@@ -0,0 +1,41 @@
+"""
+The chunked aggregation of visitor level assignment files against the aggregation of the whole table.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from modules.interaction_functions import detect_interactions
+from modules.interaction_functions import detect_metric_interactions
+from modules.interaction_functions import stream_assignments_csv
+
+@pytest.fixture(scope = 'module')
+def assignments_csv():
+    # Visitors of 4 overlapping experiments, 20 % of the visitors are not in an experiment
+    rng = np.random.default_rng(0)
+    num_visitors = 5_000
+    df = pd.DataFrame({
+        f'experiment_{i}' : np.where(rng.random(num_visitors) < 0.8, rng.choice(['control', 'variant_a', 'variant_b'][:2 + i % 2], num_visitors), None)
+        for i in range(4)
+        })
+    df.insert(0, 'visitor_id', np.arange(num_visitors))
+    df['conversions'] = rng.binomial(1, 0.05, num_visitors)
+    df['revenue'] = df['conversions'] * rng.gamma(2, 30, num_visitors)
+
+    return df.to_csv(index = False)
+
+@pytest.mark.parametrize('chunksize', [499, 1_000_000])
+def test_stream_assignments_csv_matches_the_whole_table(assignments_csv, chunksize):
+    whole = pd.read_csv(io.StringIO(assignments_csv))
+    cells = stream_assignments_csv(io.StringIO(assignments_csv), chunksize = chunksize)
+
+    assert cells['visitors'].sum() == len(whole)
+    pd.testing.assert_frame_equal(detect_interactions(cells), detect_interactions(whole))
+    pd.testing.assert_frame_equal(detect_metric_interactions(cells), detect_metric_interactions(whole), rtol = 1e-9)
+
+def test_stream_assignments_csv_rejects_empty_files():
+    with pytest.raises(ValueError):
+        stream_assignments_csv(io.StringIO('experiment_1,experiment_2\n'))
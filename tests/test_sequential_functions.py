@@ -0,0 +1,40 @@
+"""
+The always-valid confidence interval of the sequential test at the edges: arms without visitors or without variance.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from modules.sequential_functions import SequentialState
+from modules.sequential_functions import monitor_experiments
+from modules.sequential_functions import msprt_confidence_interval
+
+def state(visitors1, conversions1, visitors2, conversions2):
+    return SequentialState(*(np.asarray(values, dtype = np.float64) for values in [visitors1, conversions1, visitors2, conversions2]), np.ones(np.shape(visitors1)), np.ones(np.shape(visitors1), dtype = np.int64))
+
+@pytest.mark.filterwarnings('error')
+def test_confidence_interval_without_visitors_or_variance():
+    # Regular, control without visitors, variant without visitors, no conversions, only conversions
+    diff, ci_low, ci_high = msprt_confidence_interval(state([1000, 0, 1000, 1000, 50], [100, 0, 100, 0, 50], [1000, 1000, 0, 1200, 60], [120, 120, 0, 0, 60]))
+
+    assert np.isfinite([diff, ci_low, ci_high]).all()
+    assert diff[0] == pytest.approx(0.02)
+    assert ci_low[0] < diff[0] < ci_high[0]
+    np.testing.assert_array_equal(diff[1:], 0.0)
+    np.testing.assert_array_equal(ci_low[1:], -1.0)
+    np.testing.assert_array_equal(ci_high[1:], 1.0)
+
+@pytest.mark.filterwarnings('error')
+def test_monitor_experiments_with_an_empty_arm():
+    batch = pd.DataFrame({
+        'experiment' : ['a', 'a', 'b', 'b']
+        , 'variant' : ['control', 'variant', 'control', 'variant']
+        , 'visitors' : [1000, 0, 500, 520]
+        , 'conversions' : [50, 0, 0, 0]
+        })
+    result = monitor_experiments(batch)
+
+    assert result[['diff', 'ci_low', 'ci_high', 'pvalue']].notna().all().all()
+    assert not result['significant'].any()
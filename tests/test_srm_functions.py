@@ -0,0 +1,42 @@
+"""
+The SRM check of many experiments and the sequential SRM monitor over csv files read in chunks of different sizes.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from modules.batch_functions import analyse_experiments
+from modules.srm_functions import check_srm
+from modules.srm_functions import monitor_srm
+
+@pytest.fixture(scope = 'module')
+def buckets_csv():
+    # Hourly buckets of 3 experiments with 2 or 3 arms, the last one drifts into a SRM
+    rng = np.random.default_rng(0)
+    rows = []
+    for bucket in range(24):
+        for experiment, variants, shares in [('a', ['control', 'variant'], [0.5, 0.5]), ('b', ['control', 'v1', 'v2'], [1 / 3] * 3), ('c', ['control', 'variant'], [0.5 + 0.004 * bucket, 0.5 - 0.004 * bucket])]:
+            visitors = rng.multinomial(rng.integers(200, 400), shares)
+            rows += [(f'2024-05-01 {bucket:02d}:00', experiment, variant, count) for variant, count in zip(variants, visitors)]
+
+    return pd.DataFrame(rows, columns = ['bucket', 'experiment', 'variant', 'visitors']).to_csv(index = False)
+
+@pytest.mark.parametrize('chunksize', [1, 3])
+def test_monitor_srm_does_not_depend_on_the_chunks(buckets_csv, chunksize):
+    # Buckets of 7 rows are split across chunks of 1 and 3 rows
+    expected = monitor_srm(io.StringIO(buckets_csv))
+    result = monitor_srm(io.StringIO(buckets_csv), chunksize = chunksize)
+
+    assert expected['detected_bucket'].notna().any()
+    assert (expected['num_updates'] == 24).all()
+    pd.testing.assert_frame_equal(result[['pvalue', 'num_updates', 'detected_bucket']], expected[['pvalue', 'num_updates', 'detected_bucket']])
+
+def test_check_srm_rejects_empty_tables():
+    empty = pd.DataFrame({'experiment' : [], 'variant' : [], 'visitors' : [], 'conversions' : []})
+    with pytest.raises(ValueError, match = 'The table contains no experiments.'):
+        check_srm(empty)
+    with pytest.raises(ValueError, match = 'The table contains no experiments.'):
+        analyse_experiments(empty)
@@ -0,0 +1,135 @@
+"""
+The vectorised two-proportion z-test and the MDE of continuous metrics of stat_functions against the statsmodels functions they replace.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import numpy as np
+import pytest
+from modules.stat_functions import mde_cont
+from modules.stat_functions import proportion_effectsize
+from modules.stat_functions import proportions_test
+from modules.stat_functions import proportions_ztest
+from modules.stat_functions import sample_size_cont
+from modules.stat_functions import ztest_power
+
+statsmodels_proportion = pytest.importorskip('statsmodels.stats.proportion')
+statsmodels_power = pytest.importorskip('statsmodels.stats.power')
+
+ALTERNATIVES = ['two-sided', 'larger', 'smaller']
+
+def random_pairs(num_pairs, seed = 0):
+    # Control and variant visitors and conversions, from tiny to large experiments
+    rng = np.random.default_rng(seed)
+    nobs1 = rng.integers(20, 200_000, num_pairs)
+    nobs2 = rng.integers(20, 200_000, num_pairs)
+    rate = rng.uniform(0.001, 0.5, num_pairs)
+    count1 = rng.binomial(nobs1, rate)
+    count2 = rng.binomial(nobs2, rate * rng.uniform(0.8, 1.2, num_pairs))
+
+    return count1, nobs1, count2, nobs2
+
+@pytest.mark.parametrize('alternative', ALTERNATIVES)
+def test_proportions_ztest_matches_statsmodels_for_many_pairs(alternative):
+    count1, nobs1, count2, nobs2 = random_pairs(200)
+    zstat, pvalue = proportions_ztest(count1, nobs1, count2, nobs2, alternative)
+    expected = np.array([
+        statsmodels_proportion.proportions_ztest([c1, c2], [n1, n2], alternative = alternative)
+        for c1, n1, c2, n2 in zip(count1, nobs1, count2, nobs2)
+        ])
+
+    np.testing.assert_allclose(zstat, expected[:, 0], rtol = 1e-10)
+    np.testing.assert_allclose(pvalue, expected[:, 1], rtol = 1e-10, atol = 1e-300)
+
+@pytest.mark.parametrize('alternative', ALTERNATIVES)
+@pytest.mark.parametrize('count1, nobs1, count2, nobs2', [
+    (0, 1000, 5, 1000) # no conversions in the control
+    , (5, 1000, 0, 1000) # no conversions in the variant
+    , (1000, 1000, 990, 1000) # every visitor of the control converted
+    , (0, 1000, 0, 1200) # no conversions at all
+    , (1000, 1000, 1200, 1200) # every visitor converted
+    , (1, 1, 0, 1) # single visitors
+    ])
+def test_proportions_ztest_matches_statsmodels_at_the_edges(count1, nobs1, count2, nobs2, alternative):
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        zstat, pvalue = proportions_ztest(count1, nobs1, count2, nobs2, alternative)
+        expected_zstat, expected_pvalue = statsmodels_proportion.proportions_ztest([count1, count2], [nobs1, nobs2], alternative = alternative)
+
+    np.testing.assert_allclose(zstat, expected_zstat, rtol = 1e-10, equal_nan = True)
+    np.testing.assert_allclose(pvalue, expected_pvalue, rtol = 1e-10, equal_nan = True)
+
+def test_proportion_effectsize_matches_statsmodels():
+    prop1 = np.r_[0.0, 1.0, np.random.default_rng(1).uniform(0, 1, 100)]
+    prop2 = np.r_[1.0, 0.0, np.random.default_rng(2).uniform(0, 1, 100)]
+    expected = [statsmodels_proportion.proportion_effectsize(p1, p2) for p1, p2 in zip(prop1, prop2)]
+
+    np.testing.assert_allclose(proportion_effectsize(prop1, prop2), expected, rtol = 1e-12)
+
+@pytest.mark.parametrize('alternative', ALTERNATIVES)
+def test_ztest_power_matches_statsmodels(alternative):
+    rng = np.random.default_rng(3)
+    effect_size = np.r_[0.0, rng.uniform(-0.1, 0.1, 50)]
+    nobs1 = rng.integers(100, 100_000, effect_size.size)
+    ratio = rng.uniform(0.5, 2.0, effect_size.size)
+    alpha = rng.uniform(0.01, 0.1, effect_size.size)
+    expected = [
+        statsmodels_power.zt_ind_solve_power(effect_size = e, nobs1 = n, alpha = a, ratio = r, alternative = alternative)
+        for e, n, a, r in zip(effect_size, nobs1, alpha, ratio)
+        ]
+
+    np.testing.assert_allclose(ztest_power(effect_size, nobs1, alpha, ratio = ratio, alternative = alternative), expected, rtol = 1e-9)
+
+@pytest.mark.parametrize('alternative', ALTERNATIVES)
+def test_proportions_test_matches_statsmodels_per_pair(alternative):
+    count1, nobs1, count2, nobs2 = random_pairs(50, seed = 4)
+    zstat, pvalue, effect_size, power = proportions_test(count1, nobs1, count2, nobs2, alpha = 0.05, alternative = alternative)
+
+    for i in range(count1.size):
+        expected_effect_size = statsmodels_proportion.proportion_effectsize(count1[i] / nobs1[i], count2[i] / nobs2[i])
+        expected_power = statsmodels_power.zt_ind_solve_power(effect_size = expected_effect_size, nobs1 = nobs1[i], alpha = 0.05, ratio = 1, alternative = alternative)
+        assert zstat[i] == pytest.approx(statsmodels_proportion.proportions_ztest([count1[i], count2[i]], [nobs1[i], nobs2[i]], alternative = alternative)[0], rel = 1e-10)
+        assert effect_size[i] == pytest.approx(expected_effect_size, rel = 1e-12)
+        assert power[i] == pytest.approx(expected_power, rel = 1e-9)
+
+TEST_TYPES = {'Two-sided' : 'two-sided', 'One-sided' : 'larger'}
+
+@pytest.mark.parametrize('test_type', TEST_TYPES)
+def test_mde_cont_matches_the_closed_form(test_type):
+    # Two groups of n visitors: the standard error of the difference of the means is std_dev * sqrt(2 / n)
+    sample_size = np.array([50, 1_000, 100_000])
+    z_alpha = {'Two-sided' : 1.959963984540054, 'One-sided' : 1.6448536269514722}[test_type]
+    z_beta = 0.8416212335729143
+
+    np.testing.assert_allclose(mde_cont(sample_size, 3.0, alpha = 0.05, power = 0.8, test_type = test_type), (z_alpha + z_beta) * 3.0 * np.sqrt(2 / sample_size), rtol = 1e-12)
+
+@pytest.mark.parametrize('test_type', TEST_TYPES)
+def test_mde_cont_has_the_power_of_statsmodels(test_type):
+    # A difference of one MDE is detected with the chosen power by statsmodels' two-sample z-test.
+    # Two-sided, statsmodels also counts the tiny probability of a significant result in the wrong direction.
+    rng = np.random.default_rng(5)
+    sample_size = rng.integers(20, 1_000_000, 50)
+    std_dev = rng.uniform(0.1, 200, sample_size.size)
+    alpha = rng.uniform(0.01, 0.1, sample_size.size)
+    power = rng.uniform(0.5, 0.95, sample_size.size)
+    mde = mde_cont(sample_size, std_dev, alpha = alpha, power = power, test_type = test_type)
+    expected = [
+        statsmodels_power.zt_ind_solve_power(effect_size = m / s, nobs1 = n, alpha = a, ratio = 1, alternative = TEST_TYPES[test_type])
+        for m, s, n, a in zip(mde, std_dev, sample_size, alpha)
+        ]
+
+    np.testing.assert_allclose(expected, power, rtol = 1e-3 if test_type == 'Two-sided' else 1e-9)
+
+@pytest.mark.parametrize('test_type', TEST_TYPES)
+def test_sample_size_cont_inverts_mde_cont(test_type):
+    sample_size = np.array([20.0, 333.0, 12_345.0, 2_000_000.0])
+    std_dev = np.array([0.5, 12.0, 80.0, 150.0])
+    mde = mde_cont(sample_size, std_dev, alpha = 0.01, power = 0.9, test_type = test_type)
+
+    np.testing.assert_allclose(sample_size_cont(mde, std_dev, alpha = 0.01, power = 0.9, test_type = test_type), sample_size, rtol = 1e-12)
+    np.testing.assert_allclose(sample_size_cont(mde / 40.0, std_dev, alpha = 0.01, power = 0.9, test_type = test_type, mean = 40.0), sample_size, rtol = 1e-12)
+
+def test_unknown_alternative_is_rejected():
+    with pytest.raises(ValueError):
+        proportions_ztest(10, 100, 12, 100, alternative = 'bigger')
+    with pytest.raises(ValueError):
+        ztest_power(0.1, 100, alternative = 'bigger')
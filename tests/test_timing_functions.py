@@ -0,0 +1,46 @@
+"""
+The counter of active timing runs, which switches the no-op fast path of span and timed.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import gc
+import threading
+from modules import timing_functions
+from modules.timing_functions import finish_run
+from modules.timing_functions import start_run
+
+def run_in_thread(target):
+    thread = threading.Thread(target = target)
+    thread.start()
+    thread.join()
+    gc.collect()
+
+def test_finished_runs_release_the_counter():
+    def page():
+        start_run()
+        start_run() # a second start in the same thread counts once
+        finish_run('page')
+
+    run_in_thread(page)
+
+    assert timing_functions._active_runs == 0
+
+def test_runs_of_ended_threads_release_the_counter():
+    def page():
+        # e.g. the page raised, or the session ended before finish_run
+        start_run()
+
+    run_in_thread(page)
+
+    assert timing_functions._active_runs == 0
+
+def test_disabled_runs_release_the_counter():
+    def page():
+        start_run()
+        start_run(enabled = False)
+        assert timing_functions._active_runs == 0
+
+    run_in_thread(page)
+
+    assert timing_functions._active_runs == 0
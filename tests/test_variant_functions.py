@@ -0,0 +1,43 @@
+"""
+The per-variant sufficient statistics shared by CUPED and the ratio metrics, and the lookup of the control.
+
+Run it from the repository root:
+    python -m pytest tests
+"""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from modules.cuped_functions import CUPED_COLUMNS
+from modules.variant_functions import control_index
+from modules.variant_functions import stream_variant_csv
+from modules.variant_functions import variant_sufficient_stats
+
+def test_stream_variant_csv_matches_the_whole_table():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'variant' : rng.choice(['control', 'variant'], 1_000), 'metric' : rng.gamma(1, 10, 1_000), 'covariate' : rng.gamma(1, 10, 1_000)})
+    df.loc[::7, 'metric'] = np.nan
+    expected = variant_sufficient_stats(df, 'metric', 'covariate', 'variant', CUPED_COLUMNS)
+    result = stream_variant_csv(io.StringIO(df.to_csv(index = False)), 'metric', 'covariate', 'variant', CUPED_COLUMNS, chunksize = 97)
+
+    assert list(result.columns) == CUPED_COLUMNS
+    assert result['visitors'].sum() == len(df)
+    pd.testing.assert_frame_equal(result, expected, rtol = 1e-12)
+
+def test_variant_sufficient_stats_rejects_text():
+    df = pd.DataFrame({'metric' : [1.0, 'a'], 'covariate' : [1.0, 2.0]})
+    with pytest.raises(ValueError):
+        variant_sufficient_stats(df, 'metric', 'covariate', None, CUPED_COLUMNS)
+
+@pytest.mark.parametrize('names, control, expected', [
+    (['A', 'B', 'C'], None, 0)
+    , (['A', 'B', 'C'], 'C', 2)
+    , ([1, 2, 3], '2', 1) # names are compared as text
+    ])
+def test_control_index(names, control, expected):
+    assert control_index(names, control) == expected
+
+@pytest.mark.parametrize('names, control', [(['A', 'B'], 'Z'), (['A', 'A', 'B'], 'A')])
+def test_control_index_rejects_missing_and_duplicate_controls(names, control):
+    with pytest.raises(ValueError):
+        control_index(names, control)